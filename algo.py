@@ -1,41 +1,26 @@
-from dotenv import load_dotenv
-load_dotenv()
-
+if __name__ == "__main__":   # CLI run; the app loads .env in main.py
+    from dotenv import load_dotenv
+    load_dotenv()
 
 # algo.py — Improved semantic pipeline with detailed logging
-import json, uuid, textwrap
+import hashlib, json, os, time, uuid, textwrap
 from datetime import datetime, timezone
-from typing import List, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
 
-import openai
-from neo4j import GraphDatabase, basic_auth
+import numpy as np
 
-# ──────────────────────────  HELPERS  ──────────────────────────────────
-def _ts() -> str:
-    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+from json_stream import iter_array
+from logs import debug, debug_enabled, log
+from metrics import BYTES, ITEMS, STAGE_SECONDS, counter, external
 
-def log(section: str, msg: str) -> None:
-    print(f"[{_ts()}] [{section.upper():7}] {msg}")
+CHUNK_ROUTES = counter("mindmap_chunk_route_total", "Entries per chunking path", ["route"])
 
+# ──────────────────────────  HELPERS  ──────────────────────────────────
 def truncate(s: str, n: int = 120) -> str:
     return (s[: n - 3] + "...") if len(s) > n else s
 
 # ───────────────────────────  CONFIG  ──────────────────────────────────
-
-
-import os
-
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-
-NEO4J = GraphDatabase.driver(
-    os.getenv("NEO4J_URI"),
-    auth=basic_auth(
-        os.getenv("NEO4J_USER"),
-        os.getenv("NEO4J_PASSWORD")
-    )
-)
-
 EMBED_MODEL = "text-embedding-3-large"
 CHUNK_MODEL = "gpt-4o"
 
@@ -43,11 +28,33 @@ AUTO_LINK_T = 0.65
 FUZZY_MIN_T = 0.40
 FUZZY_MAX_T = 0.65
 
+# a new node this close to an existing one is the same thought again: it is
+# folded into that node instead of being stored beside it
+MERGE_T = float(os.getenv("MERGE_T", "0.92"))
+MERGE_ON_INGEST = os.getenv("MERGE_ON_INGEST", "1") == "1"
+MERGE_MAX_CHARS = int(os.getenv("MERGE_MAX_CHARS", "4000"))   # merged content stops growing here
+
+# GPT-chunked entries stream the function call and store nodes while the rest is generated
+CHUNK_STREAM = os.getenv("CHUNK_STREAM", "1") == "1"
+STREAM_BATCH = int(os.getenv("STREAM_BATCH", "8"))   # most nodes handed to the store worker at once
+
+# outbox: ingest logs its writes and returns, background appliers fill both stores | direct: inline writes
+WRITE_MODE = os.getenv("WRITE_MODE", "outbox")
+
+# one /embeddings request carries at most this many inputs / estimated tokens
+EMBED_BATCH_INPUTS = int(os.getenv("EMBED_BATCH_INPUTS", "2048"))
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "250000"))
 
-log("INIT", f"chunk={CHUNK_MODEL}, embed={EMBED_MODEL}")
 
 # ────────────────────────  CHROMA HELPERS  ─────────────────────────────
-from db.chroma import add_to_chroma, query_chroma
+from vector_store import add_many, query_many
+from graph_store import fetch_nodes, get_driver, write_thoughts
+from outbox import OutboxLagging, get_outbox, settle
+from embed_cache import get_cache
+from local_chunker import chunk_local, route
+from long_chunker import WINDOW_WORDS, map_reduce_chunk
+from llm_gateway import estimate_tokens, get_gateway
+from embed_repr import api_dims, reduce
 
 # ─────────────────────────  GPT SCHEMA  ────────────────────────────────
 gpt_schema = {
@@ -74,9 +81,37 @@ gpt_schema = {
 }
 
 # ───────────────────── 1. CHUNK WITH GPT-4o ────────────────────────────
+def chunk_route(raw_text: str) -> str:
+    """local | map_reduce | gpt"""
+    if route(raw_text) == "local":
+        return "local"
+    return "map_reduce" if len(raw_text.split()) > WINDOW_WORDS else "gpt"
+
 def chunk_raw_text(raw_text: str) -> List[Dict]:
-    log("CHUNK", f"Sending {len(raw_text):,} characters to GPT-4o")
-    resp = openai.chat.completions.create(
+    # short, clean inputs take the millisecond local path (local_chunker.route)
+    path = chunk_route(raw_text)
+    if path == "local":
+        CHUNK_ROUTES.inc(route="local")
+        nodes = chunk_local(raw_text)
+        log("CHUNK", f"Local chunker returned {len(nodes)} nodes for {len(raw_text):,} characters")
+        _debug_nodes(nodes)
+        return nodes
+    if path == "map_reduce":
+        # long transcripts: overlapping windows chunked in parallel, seams deduped
+        CHUNK_ROUTES.inc(route="map_reduce")
+        nodes = map_reduce_chunk(raw_text, chunk_with_gpt)
+        log("CHUNK", f"Map-reduce over {len(raw_text.split()):,} words → {len(nodes)} nodes")
+        return nodes
+    CHUNK_ROUTES.inc(route="gpt")
+    return chunk_with_gpt(raw_text)
+
+def _debug_nodes(nodes: List[Dict]) -> None:
+    if debug_enabled():
+        for i, n in enumerate(nodes, 1):
+            debug("CHUNK", f"  {i:02}. {truncate(n['title'])} ({len(n['content'].split()):3} words)")
+
+def _chunk_request(raw_text: str) -> Dict:
+    return dict(
         model=CHUNK_MODEL,
         temperature=0.2,
         messages=[
@@ -93,78 +128,360 @@ def chunk_raw_text(raw_text: str) -> List[Dict]:
         functions=[gpt_schema],
         function_call={"name": "CreateThoughtNodes"},
     )
+
+def chunk_with_gpt(raw_text: str) -> List[Dict]:
+    log("CHUNK", f"Sending {len(raw_text):,} characters to GPT-4o")
+    resp = get_gateway().chat(**_chunk_request(raw_text))
     nodes = json.loads(resp.choices[0].message.function_call.arguments)["nodes"]
     log("CHUNK", f"GPT returned {len(nodes)} nodes")
-    for i, n in enumerate(nodes, 1):
-        log("CHUNK", f"  {i:02}. {truncate(n['title'])} ({len(n['content'].split()):3} words)")
+    _debug_nodes(nodes)
     return nodes
 
-# ────────────────────── 2. EMBED ALL NODES ─────────────────────────────
-def batch_embed(nodes: List[Dict]) -> List[List[float]]:
-    texts = [
-    f"User Thought Log\nTopic: {n['title']}\nSummary: {n['content']}\nTagged With: {', '.join(n['tags'])}"
-    for n in nodes
-]
+def chunk_with_gpt_stream(raw_text: str) -> Iterator[Dict]:
+    """Same request, streamed: yields each node as soon as its JSON object is complete."""
+    log("CHUNK", f"Streaming {len(raw_text):,} characters through GPT-4o")
 
+    def fragments() -> Iterator[str]:
+        for chunk in get_gateway().chat_stream(**_chunk_request(raw_text)):
+            call = chunk.choices[0].delta.function_call if chunk.choices else None
+            if call is not None and call.arguments:
+                yield call.arguments
 
-    log("EMBED", f"Requesting {len(texts)} embeddings from {EMBED_MODEL}")
-    resp = openai.embeddings.create(model=EMBED_MODEL, input=texts)
-    dim = len(resp.data[0].embedding)
-    log("EMBED", f"Received {len(resp.data)} vectors (dim={dim})")
-    return [v.embedding for v in resp.data]
+    n = 0
+    for node in iter_array(fragments(), "nodes"):
+        node.setdefault("tags", [])
+        n += 1
+        yield node
+    log("CHUNK", f"GPT streamed {n} nodes")
+
+# ────────────────────── 2. EMBED ALL NODES ─────────────────────────────
+def embed_text(n: Dict) -> str:
+    return f"User Thought Log\nTopic: {n['title']}\nSummary: {n['content']}\nTagged With: {', '.join(n['tags'])}"
+
+def content_hash(n: Dict) -> str:
+    """Changes exactly when the embedded text does (relink.py re-embeds on change)."""
+    return hashlib.sha256(embed_text(n).encode("utf-8")).hexdigest()[:16]
+
+def pack_requests(texts: List[str], max_inputs: int = EMBED_BATCH_INPUTS,
+                  max_tokens: int = EMBED_BATCH_TOKENS) -> List[List[str]]:
+    """Splits texts into as few embedding requests as the API limits allow."""
+    out: List[List[str]] = [[]]
+    tokens = 0
+    for t in texts:
+        n = estimate_tokens(t)
+        if out[-1] and (len(out[-1]) >= max_inputs or tokens + n > max_tokens):
+            out.append([])
+            tokens = 0
+        out[-1].append(t)
+        tokens += n
+    return out if out[0] else []
+
+def batch_embed(nodes: List[Dict]) -> List[List[float]]:
+    return embed_texts([embed_text(n) for n in nodes])
+
+def embed_model_key() -> str:
+    """What a cached (or snapshotted) vector was produced by: model, plus API-side dims if any."""
+    dims = api_dims()
+    return f"{EMBED_MODEL}@{dims}" if dims else EMBED_MODEL
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embeddings for raw strings, through the content-addressed cache."""
+    # EMBED_DIMS_MODE=api asks for reduced vectors; otherwise full width is
+    # cached and embed_repr.reduce() trims at index time
+    dims = api_dims()
+    extra = {"dimensions": dims} if dims else {}
+
+    def fetch(missing: List[str]) -> List[List[float]]:
+        out: List[List[float]] = []
+        for part in pack_requests(missing):
+            debug("EMBED", f"Requesting {len(part)} embeddings from {EMBED_MODEL}")
+            resp = get_gateway().embed(EMBED_MODEL, part, **extra)
+            debug("EMBED", f"Received {len(resp.data)} vectors (dim={len(resp.data[0].embedding)})")
+            out += [v.embedding for v in sorted(resp.data, key=lambda v: v.index)]
+        return out
+
+    vectors, n_miss = get_cache().embed(embed_model_key(), texts, fetch)
+    log("EMBED", f"{len(texts) - n_miss}/{len(texts)} served from cache")
+    return vectors
+
+def vector_meta(node: Dict) -> Dict:
+    return {"title": node["title"], "content": node["content"], "tags": ", ".join(node["tags"]),
+            "origin_input": node.get("origin_input") or "", "created_at": node["created_at"],
+            "updated_at": node["updated_at"], "embedding_source": node.get("embedding_source", "openai"),
+            "embedding_used": node.get("embedding_used", EMBED_MODEL),
+            "related_ids": json.dumps(node.get("related_ids", []))}
 
 # ──────────────── 3. SIMILARITY SEARCH / LINKING ───────────────────────
+def _split_links(ids: List[str], sims: np.ndarray) -> Tuple[List[str], List[str]]:
+    direct = sims >= AUTO_LINK_T
+    fuzzy = (sims >= FUZZY_MIN_T) & (sims < FUZZY_MAX_T)
+    return [ids[i] for i in np.flatnonzero(direct)], [ids[i] for i in np.flatnonzero(fuzzy)]
+
+def neighbours(vectors: List[List[float]], user_id: str, k: int = 10) -> Dict:
+    """ONE multi-query: the top-k existing nodes for every vector."""
+    V = np.asarray(vectors, dtype=np.float32)
+    return query_many(reduce(V).tolist(), user_id=user_id, top_k=k, full=V)
+
+def decide_links_batch(vectors: List[List[float]], ids: List[str], user_id: str,
+                       k: int = 10, q: Optional[Dict] = None) -> List[Tuple[List[str], List[str]]]:
+    """
+    Link a whole entry at once: ONE multi-query against the store for the
+    existing graph (or `q`, its result if already fetched), plus one matrix
+    product for sibling nodes of the same entry (symmetric, so a↔b
+    regardless of order).
+    """
+    V = np.asarray(vectors, dtype=np.float32)
+    if q is None:
+        q = neighbours(V, user_id, k)
+
+    U = V / np.maximum(np.linalg.norm(V, axis=1, keepdims=True), 1e-12)
+    S = U @ U.T
+    np.fill_diagonal(S, -1.0)   # never self-link
+
+    out = []
+    for row, (hit_ids, dists) in enumerate(zip(q["ids"], q["distances"])):
+        sims = 1.0 - np.asarray(dists, dtype=np.float32)
+        direct, fuzzy = _split_links(hit_ids, sims)
+        sib_direct, sib_fuzzy = _split_links(ids, S[row])
+        out.append((direct + sib_direct, fuzzy + sib_fuzzy))
+        if debug_enabled():
+            debug("LINK", f"top-{k}: " + ", ".join(f"{truncate(i,8)}={s:.3f}" for i, s in zip(hit_ids, sims)))
+            debug("LINK", f"direct={len(direct)}+{len(sib_direct)} sib, fuzzy={len(fuzzy)}+{len(sib_fuzzy)} sib")
+    return out
+
 def decide_links(vec: List[float], user_id: str, k: int = 10) -> Tuple[List[str], List[str]]:
-    q = query_chroma(vec, user_id=user_id, top_k=k)
-    ids, dists = q["ids"][0], q["distances"][0]
-    sims = [(i, 1 - d) for i, d in zip(ids, dists)]
-    direct = [nid for nid, s in sims if s >= AUTO_LINK_T]
-    fuzzy = [nid for nid, s in sims if FUZZY_MIN_T <= s < FUZZY_MAX_T]
-    log("LINK", f"top-{k}: " + ", ".join(f"{truncate(i,8)}={s:.3f}" for i, s in sims))
-    log("LINK", f"direct={len(direct)}, fuzzy={len(fuzzy)}")
-    return direct, fuzzy
+    return decide_links_batch([vec], [""], user_id, k)[0]
+
+# ─────────────────────── 3b. MERGE DUPLICATES ──────────────────────────
+def merge_targets(q: Dict, merge_t: float = MERGE_T) -> List[Optional[str]]:
+    """Per query row: the closest existing node at or above merge_t, else None."""
+    out: List[Optional[str]] = []
+    for hit_ids, dists in zip(q["ids"], q["distances"]):
+        best = min(zip(hit_ids, dists), key=lambda h: h[1], default=None)
+        out.append(best[0] if best and 1.0 - best[1] >= merge_t else None)
+    return out
+
+def merge_thoughts(keep: Dict, others: List[Dict], now: str) -> Dict:
+    """
+    The properties `keep` has after absorbing `others`: the newest title
+    wins and the rest go to history_titles, contents are joined oldest
+    first (skipping any already contained, up to MERGE_MAX_CHARS), tags
+    are unioned.
+    """
+    group = sorted([keep, *others], key=lambda n: n.get("created_at") or "")
+    title = group[-1]["title"]
+    history: List[str] = []
+    for n in group:
+        for t in [*(n.get("history_titles") or []), n["title"]]:
+            if t != title and t not in history:
+                history.append(t)
+    content = ""
+    for n in group:
+        c = (n.get("content") or "").strip()
+        if not c or c in content:
+            continue
+        if content in c:
+            content = c
+        elif len(content) + len(c) + 2 <= MERGE_MAX_CHARS:
+            content = f"{content}\n\n{c}"
+    tags = list(dict.fromkeys(t for n in group for t in n.get("tags") or []))
+    return {"title": title, "content": content, "tags": tags, "history_titles": history, "updated_at": now}
+
+def absorb_duplicates(nodes: List[Dict], targets: List[Optional[str]],
+                      user_id: str) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Folds every new node with a merge target into that existing node.
+    Returns (nodes still to create, updated existing nodes); links that
+    pointed at a folded node are re-pointed to its target.
+    """
+    alias = {n["id"]: t for n, t in zip(nodes, targets) if t}
+    if not alias:
+        return nodes, []
+    # the targets came from the vector index; their graph rows may still be in the outbox
+    if not settle(("neo4j",)):
+        raise OutboxLagging("graph writes are still being applied; merge targets can't be read yet")
+    existing = {n["id"]: n for n in fetch_nodes(get_driver(user_id), user_id, sorted(set(alias.values())))}
+    alias = {i: t for i, t in alias.items() if t in existing}   # target deleted since the query
+    groups: Dict[str, List[Dict]] = {}
+    kept = []
+    for n in nodes:
+        if n["id"] in alias:
+            groups.setdefault(alias[n["id"]], []).append(n)
+        else:
+            kept.append(n)
+
+    def repoint(ids: List[str], self_id: str) -> List[str]:
+        return [i for i in dict.fromkeys(alias.get(i, i) for i in ids) if i != self_id]
+
+    for n in kept:
+        n["related_ids"] = repoint(n["related_ids"], n["id"])
+    nowiso = datetime.now(timezone.utc).isoformat()
+    updated = []
+    for tid, group in groups.items():
+        old = existing[tid]
+        n = {"id": tid, "user_id": user_id, **merge_thoughts(old, group, nowiso)}
+        n["related_ids"] = repoint([*(old.get("related_ids") or []), *(i for g in group for i in g["related_ids"])], tid)
+        n["content_hash"] = content_hash(n)
+        updated.append({**old, **n})
+    log("MERGE", f"Folded {len(alias)} new nodes into {len(updated)} existing")
+    return kept, updated
 
 # ────────────────────── 4. STORE IN NEO4J ──────────────────────────────
-def store_in_neo4j(node: Dict):
-    with NEO4J.session() as s:
-        s.run("MERGE (t:Thought {id:$id}) SET t += $props", id=node["id"], props=node)
-        for rid in node["related_ids"]:
-            s.run("MATCH (a:Thought {id:$a}), (b:Thought {id:$b}) MERGE (a)-[:RELATED_TO]->(b)", a=node["id"], b=rid)
-    log("NEO4J", f"Stored {node['id']} (+{len(node['related_ids'])} edges)")
+def store_in_neo4j(nodes: List[Dict]) -> None:
+    # one user's nodes: routed to that user's shard
+    with external("neo4j", "write_thoughts"):
+        n_edges = write_thoughts(get_driver(nodes[0]["user_id"] if nodes else None), nodes)
+    log("NEO4J", f"Stored {len(nodes)} nodes (+{n_edges} edges) in 1 tx")
+
+def persist_nodes(user_id: str, nodes: List[Dict], vectors: List[List[float]], visible: bool = False) -> None:
+    """
+    The vector + graph writes for linked nodes. WRITE_MODE=outbox logs
+    them durably and returns (outbox.py applies them in the background);
+    visible=True also waits until both stores hold them, for callers whose
+    next batch links against (and may merge into) this one, and raises
+    OutboxLagging if they don't within OUTBOX_WAIT_S — the write is logged
+    and still lands. direct writes both stores inline.
+    """
+    metas = [vector_meta(n) for n in nodes]
+    if WRITE_MODE == "outbox":
+        with STAGE_SECONDS.time(stage="outbox_append"):
+            box = get_outbox()
+            seq = box.append(user_id, nodes, vectors, metas)
+            if visible and not box.wait(seq):
+                raise OutboxLagging(f"outbox seq {seq} logged but not applied yet; later batches can't link to it")
+        return
+    with STAGE_SECONDS.time(stage="vector_write"):
+        add_many(user_id, [n["id"] for n in nodes], reduce(vectors).tolist(), metas, full=vectors)
+    log("CHROMA", f"Added {len(nodes)} vectors (total rels={sum(len(n['related_ids']) for n in nodes)})")
+    with STAGE_SECONDS.time(stage="neo4j_write"):
+        store_in_neo4j(nodes)
 
 # ───────────────────────── 5. PIPELINE ─────────────────────────────────
-def ingest_entry(raw_text: str, user_id: str) -> List[str]:
-    log("PIPE", f"Start ingest for user={user_id}")
-    nodes = chunk_raw_text(raw_text)
+def stamp_nodes(nodes: List[Dict], raw_text: str, user_id: str,
+                created_at: Optional[str] = None, ids: Optional[List[str]] = None) -> List[Dict]:
+    """Adds ids, owner and timestamps to freshly chunked nodes."""
     nowiso = datetime.now(timezone.utc).isoformat()
-
-    for n in nodes:
+    for i, n in enumerate(nodes):
         n.update({
-            "id": str(uuid.uuid4()),
+            "id": ids[i] if ids else str(uuid.uuid4()),
             "user_id": user_id,
             "origin_input": truncate(raw_text, 2000),
-            "created_at": nowiso,
+            "created_at": created_at or nowiso,
             "updated_at": nowiso,
             "embedding_source": "openai",
             "embedding_used": EMBED_MODEL,
             "related_ids": [],
         })
+    return nodes
 
-    vectors = batch_embed(nodes)
-
-    for node, vec in zip(nodes, vectors):
-        direct, fuzzy = decide_links(vec, user_id)
+def attach_links(nodes: List[Dict], links: List[Tuple[List[str], List[str]]]) -> None:
+    for node, (direct, fuzzy) in zip(nodes, links):
         node["related_ids"] = direct + fuzzy
-        meta = {"title": node["title"], "content": node["content"], "tags": ", ".join(node["tags"]),
-                "origin_input": node["origin_input"], "created_at": node["created_at"],
-                "updated_at": node["updated_at"], "embedding_source": node["embedding_source"],
-                "embedding_used": node["embedding_used"], "related_ids": json.dumps(node["related_ids"])}
-        add_to_chroma(user_id, node["id"], vec, meta)
-        log("CHROMA", f"Added {node['id']} (total rels={len(node['related_ids'])})")
-        store_in_neo4j(node)
-
-    log("PIPE", f"Done – {len(nodes)} nodes ingested")
-    return nodes  # full node dicts, already enriched
+        node["content_hash"] = content_hash(node)
+
+def store_nodes(nodes: List[Dict], user_id: str, stage: Callable[[str, Dict], None] = lambda name, info: None,
+                visible: bool = False) -> Tuple[List[Dict], int]:
+    """
+    embed → link (→ fold duplicates) → vector write → Neo4j write for
+    freshly stamped nodes. Returns (nodes written, how many of them are
+    existing nodes that absorbed a duplicate).
+    """
+    with STAGE_SECONDS.time(stage="embed"):
+        vectors = batch_embed(nodes)
+    stage("embedded", {"vectors": len(vectors)})
+
+    with STAGE_SECONDS.time(stage="link"):
+        q = neighbours(vectors, user_id)
+        links = decide_links_batch(vectors, [n["id"] for n in nodes], user_id, q=q)
+        attach_links(nodes, links)
+        merged: List[Dict] = []
+        if MERGE_ON_INGEST:
+            by_id = dict(zip((n["id"] for n in nodes), vectors))
+            nodes, merged = absorb_duplicates(nodes, merge_targets(q), user_id)
+            vectors = [by_id[n["id"]] for n in nodes]
+    stage("linked", {"edges": sum(len(d) + len(f) for d, f in links), "merged": len(merged)})
+
+    if merged:
+        # merged text is new text: re-embed now so the index matches what Neo4j holds
+        with STAGE_SECONDS.time(stage="embed"):
+            vectors = vectors + batch_embed(merged)
+    written = nodes + merged
+    persist_nodes(user_id, written, vectors, visible)
+    return written, len(merged)
+
+def ingest_streamed(raw_text: str, user_id: str,
+                    stage: Callable[[str, Dict], None] = lambda name, info: None) -> Tuple[List[Dict], int]:
+    """
+    Overlaps generation with everything after it: nodes are parsed out of
+    the streamed function call as they complete and handed to one store
+    worker (each batch is in the vector index before the next is linked).
+    Whatever has arrived is sent whenever the worker is idle, so the first
+    node is stored after ~one node of generation and batches grow, up to
+    STREAM_BATCH, only while the worker is the bottleneck.
+    """
+    t0 = time.perf_counter()
+    written: List[Dict] = []
+    merged = 0
+    first: List[float] = []
+
+    def work(batch: List[Dict]) -> None:
+        nonlocal merged
+        out, m = store_nodes(batch, user_id, visible=True)
+        written.extend(out)
+        merged += m
+        if not first:
+            first.append(time.perf_counter() - t0)
+            STAGE_SECONDS.observe(first[0], stage="first_stored")
+        stage("batch_stored", {"nodes": len(out), "total": len(written)})
+
+    with ThreadPoolExecutor(1, thread_name_prefix="ingest-store") as pool:
+        pending: List[Dict] = []
+        futures = []
+        n = 0
+        with STAGE_SECONDS.time(stage="chunk"):
+            for node in chunk_with_gpt_stream(raw_text):
+                pending.append(node)
+                n += 1
+                busy = futures and not futures[-1].done()
+                if futures and futures[-1].done() and futures[-1].exception():
+                    break
+                if not busy or len(pending) >= STREAM_BATCH:
+                    futures.append(pool.submit(work, stamp_nodes(pending, raw_text, user_id)))
+                    pending = []
+        if pending:
+            futures.append(pool.submit(work, stamp_nodes(pending, raw_text, user_id)))
+        stage("chunked", {"nodes": n})
+        for f in futures:
+            f.result()
+    if first:
+        log("PIPE", f"First node stored after {first[0] * 1e3:.0f} ms ({len(futures)} store batches)")
+    # an existing node can absorb duplicates from two batches; report its final state once
+    return list({n["id"]: n for n in written}.values()), merged
+
+def ingest_entry(raw_text: str, user_id: str,
+                 on_stage: Optional[Callable[[str, Dict], None]] = None) -> List[str]:
+    # on_stage(stage, info) is called after each stage (used by jobs.py for progress)
+    stage = on_stage or (lambda name, info: None)
+    log("PIPE", f"Start ingest for user={user_id}")
+    t0 = time.perf_counter()
+    BYTES.inc(len(raw_text.encode("utf-8")), kind="ingest_text")
+    if CHUNK_STREAM and chunk_route(raw_text) == "gpt":
+        CHUNK_ROUTES.inc(route="gpt_stream")
+        written, merged = ingest_streamed(raw_text, user_id, stage)
+    else:
+        with STAGE_SECONDS.time(stage="chunk"):
+            nodes = chunk_raw_text(raw_text)
+        stage("chunked", {"nodes": len(nodes)})
+        stamp_nodes(nodes, raw_text, user_id)
+        written, merged = store_nodes(nodes, user_id, stage)
+    stage("stored", {"nodes": written})
+
+    STAGE_SECONDS.observe(time.perf_counter() - t0, stage="ingest")
+    ITEMS.inc(len(written) - merged, kind="nodes")
+    ITEMS.inc(merged, kind="merged_nodes")
+    ITEMS.inc(sum(len(n["related_ids"]) for n in written), kind="edges")
+    log("PIPE", f"Done – {len(written) - merged} nodes ingested, {merged} existing updated")
+    return written  # full node dicts, already enriched; merged ones keep their existing id
 
     # return [n["id"] for n in nodes]
 
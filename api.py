@@ -90,19 +90,39 @@
 
 
 # api.py  (root level)
-from typing import List
+from datetime import datetime, timezone
+from typing import List, Optional
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
 from logic import process_text_into_graph
-from db.neo4j import ping_neo4j, get_all_thought_nodes
 from models import Thought          # ← use your existing model
+from idempotency import file_digest, get_store, key_from_digest, request_key
+from graph_store import all_thoughts, delete_thought, edge_rows, edit_thought, fetch_page, get_driver, shard_driver
+from relink import full_relink, relink_dirty, relink_nodes
+from dedupe import dedupe_user
+from rebalance import move_user, shard_stats
+from shards import SHARDS, get_shard_map, sharded
+from snapshot import export_snapshot, list_snapshots, load_snapshot, snapshot_dir, snapshot_path
+from layout import get_layout
+from outbox import OutboxLagging, fence
+from bulk_import import get_import_log, run_import, save_upload
+from search import SEARCH_BUDGET_MS, SEARCH_HOPS, SEARCH_LIMIT, SEARCH_TOP_K, search as search_graph
+from vector_store import delete_many
+from jobs import QueueFull, find_job, get_maintenance_queue, get_queue
+from resources import PREWARM, status as resource_status
+from transcribe_stream import AudioDecodeError, transcribe_incremental
+from whisper_pool import POOL, PoolBusy, WorkerFailed, get_pool
 
 # speech-to-text integration
-from fastapi import UploadFile, File
-import whisper
-import shutil
+from fastapi import UploadFile, File, Header, Query, Response
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+import json
 import os
+import shutil
+import tempfile
 
 router = APIRouter()
 
@@ -110,58 +130,408 @@ class UserTextInput(BaseModel):
     user_id: str
     raw_text: str
 
+class ThoughtEdit(BaseModel):
+    user_id: str
+    title: Optional[str] = None
+    content: Optional[str] = None
+    tags: Optional[List[str]] = None
+
+THOUGHT_FIELDS = list(Thought.model_fields)
+
+def created_graph(nodes) -> dict:
+    """Only what this ingest added – not the whole graph."""
+    return {"nodes": jsonable_encoder(nodes), "edges": edge_rows(nodes)}
+
+def _all_thoughts() -> List[dict]:
+    if not sharded():
+        return all_thoughts(get_driver())
+    nodes = {}   # shards may share a Neo4j database
+    for s in SHARDS:
+        for n in all_thoughts(shard_driver(s)):
+            nodes.setdefault(n["id"], n)
+    return list(nodes.values())
+
 @router.get("/health")
-def health_check():
-    return {"neo4j": "connected" if ping_neo4j() else "disconnected"}
+def health_check(response: Response, strict: bool = False):
+    # per-resource state; never builds anything. strict=true → 503 until PREWARM is ready
+    res = resource_status()
+    pending = [n for n in PREWARM if res.get(n, {}).get("state") != "ready"]
+    if strict and pending:
+        response.status_code = 503
+    return {
+        "status": "degraded" if any(r["state"] in ("failed", "unhealthy") for r in res.values()) else "ok",
+        "neo4j": "connected" if res.get("neo4j", {}).get("state") == "ready" else "disconnected",
+        "pending": pending,
+        "resources": res,
+    }
 
 @router.post("/process-text")
-def process_text(payload: UserTextInput):
-    try:
-        process_text_into_graph(
+def process_text(payload: UserTextInput, response: Response,
+                 idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+                 async_mode: bool = Query(False, alias="async")):
+    key = request_key(payload.user_id, payload.raw_text.encode("utf-8"), idempotency_key)
+
+    if async_mode:
+        # enqueue and return at once; progress via /jobs/{id} and /jobs/{id}/events.
+        # The job goes through the same idempotency store as the sync path, so a retry in
+        # either mode replays the stored result instead of ingesting the text again.
+        stored = get_store().get(key)
+        if stored is not None:
+            response.headers["Idempotent-Replayed"] = "true"
+            return stored
+
+        def job(publish):
+            run = lambda: created_graph(process_text_into_graph(payload.user_id, payload.raw_text, on_stage=publish))
+            return get_store().run(key, payload.user_id, run)[0]
+        try:
+            queued = get_queue().submit(payload.user_id, job, key=key)
+        except QueueFull as exc:
+            raise HTTPException(status_code=503, detail=str(exc)) from exc
+        response.status_code = 202
+        return {"job_id": queued.id, "stage": queued.stage}
+
+    def run():
+        nodes = process_text_into_graph(
             user_id=payload.user_id,
             raw_text=payload.raw_text
         )
-        # ⬇️ Instead of just returning node IDs, return all thoughts
-        return get_all_thought_nodes()
+        return created_graph(nodes)
+
+    try:
+        # a retry / double-submit replays the stored response instead of re-ingesting
+        result, replayed = get_store().run(key, payload.user_id, run)
+    except OutboxLagging as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+
+@router.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = find_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return jsonable_encoder(job.status())
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    job = find_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    async def stream():
+        q = job.subscribe()
+        try:
+            while True:
+                ev = await q.get()
+                yield f"event: {ev['stage']}\ndata: {json.dumps(jsonable_encoder(ev))}\n\n"
+                if ev["stage"] in ("done", "failed"):
+                    break
+        finally:
+            job.unsubscribe(q)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/thoughts")
+def fetch_thoughts(user_id: Optional[str] = None,
+                   cursor: Optional[str] = None,
+                   limit: int = Query(200, ge=1, le=1000),
+                   fields: Optional[str] = Query(None, description="comma-separated Thought fields to return"),
+                   exclude: Optional[str] = Query(None, description="comma-separated Thought fields to drop"),
+                   updated_since: Optional[datetime] = None):
+    if user_id is None:
+        # legacy full dump, kept for older clients
+        return jsonable_encoder([Thought.model_validate(n) for n in _all_thoughts()])
+
+    wanted = fields.split(",") if fields else list(THOUGHT_FIELDS)
+    dropped = set(exclude.split(",")) if exclude else set()
+    unknown = (set(wanted) | dropped) - set(THOUGHT_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    since = None
+    if updated_since is not None:
+        if updated_since.tzinfo is None:
+            updated_since = updated_since.replace(tzinfo=timezone.utc)
+        since = updated_since.astimezone(timezone.utc).isoformat()
 
+    try:
+        return fetch_page(get_driver(user_id), user_id, [f for f in wanted if f not in dropped],
+                          limit=limit, cursor=cursor, updated_since=since)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+@router.get("/search")
+def search_thoughts(user_id: str, q: str = Query(..., min_length=1, max_length=2000),
+                    top_k: int = Query(SEARCH_TOP_K, ge=1, le=50),
+                    hops: int = Query(SEARCH_HOPS, ge=0, le=3),
+                    limit: int = Query(SEARCH_LIMIT, ge=1, le=500),
+                    budget_ms: float = Query(SEARCH_BUDGET_MS, gt=0)):
+    """Top-k semantic matches plus their k-hop RELATED_TO neighbourhood, ranked, as a small subgraph."""
+    return search_graph(user_id, q, top_k=top_k, hops=hops, limit=limit, budget_ms=budget_ms)
+
+@router.get("/layout")
+def graph_layout(user_id: str, level: str = Query("nodes", pattern="^(nodes|clusters)$")):
+    """
+    Precomputed coordinates and communities for the user's mind map.
+    level=clusters drops the per-node list (zoomed-out view: one summary
+    node per community plus weighted edges between them).
+    """
+    out = get_layout(user_id)
+    return out if level == "nodes" else {k: v for k, v in out.items() if k != "nodes"}
+
+@router.patch("/thoughts/{thought_id}")
+def edit_thought_route(thought_id: str, edit: ThoughtEdit, relink: bool = True):
+    """Edits a thought; relink=false leaves it dirty for POST /thoughts/relink."""
+    now = datetime.now(timezone.utc).isoformat()
+    fence(edit.user_id, [thought_id])
+    node = edit_thought(get_driver(edit.user_id), edit.user_id, thought_id, now, edit.title, edit.content, edit.tags)
+    if node is None:
+        raise HTTPException(status_code=404, detail=f"Thought {thought_id} not found")
+    touched = relink_nodes(edit.user_id, [node])["touched"] if relink else []
+    return {"node": jsonable_encoder(node), "touched": touched}
+
+
+@router.delete("/thoughts/{thought_id}")
+def delete_thought_route(thought_id: str, user_id: str):
+    fence(user_id, [thought_id], gone=True)
+    neighbours = delete_thought(get_driver(user_id), user_id, thought_id)
+    if neighbours is None:
+        raise HTTPException(status_code=404, detail=f"Thought {thought_id} not found")
+    delete_many(user_id, [thought_id])
+    return {"deleted": thought_id, "touched": neighbours}
+
+
+@router.post("/thoughts/relink")
+def relink_thoughts(response: Response, user_id: str, full: bool = False, restart: bool = False):
+    """
+    full=false re-links the user's dirty (edited) nodes; full=true re-links
+    everything, resuming from the last checkpoint unless restart=true.
+    Runs as a background job.
+    """
+    if full:
+        job = lambda publish: full_relink(user_id, publish, restart=restart)
+    else:
+        job = lambda publish: relink_dirty(user_id)
+    try:
+        # one re-link per user at a time; a finished one doesn't block the next
+        queued = get_maintenance_queue().submit(user_id, job, key=f"relink:{user_id}", reuse_finished=False)
+    except QueueFull as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    response.status_code = 202
+    return {"job_id": queued.id, "stage": queued.stage}
+
+@router.post("/thoughts/dedupe")
+def dedupe_thoughts(response: Response, user_id: str):
+    """Merges the user's near-duplicate thoughts (cosine ≥ MERGE_T) as a background job."""
+    try:
+        queued = get_maintenance_queue().submit(user_id, lambda publish: dedupe_user(user_id, publish),
+                                                key=f"dedupe:{user_id}", reuse_finished=False)
+    except QueueFull as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    response.status_code = 202
+    return {"job_id": queued.id, "stage": queued.stage}
+
+def submit_move(user_id: str, shard: str):
+    # one move per user at a time; re-running an interrupted one is safe
+    return get_maintenance_queue().submit(user_id, lambda publish: move_user(user_id, shard, publish),
+                                          key=f"move:{user_id}", reuse_finished=False)
+
+@router.get("/shards")
+def shards():
+    """Users, backend size and per-op latency per shard."""
+    if not sharded():
+        return {"sharded": False}
+    return {"sharded": True, "shards": shard_stats()}
+
+@router.post("/shards/move")
+def move_to_shard(response: Response, user_id: str, shard: str):
+    """Moves the user's vectors and graph to `shard` as a background job; the user stays online."""
+    if not sharded():
+        raise HTTPException(status_code=409, detail="Storage is not sharded (SHARDS is unset)")
+    if shard not in SHARDS:
+        raise HTTPException(status_code=404, detail=f"Unknown shard {shard}")
+    smap = get_shard_map()
+    if smap.read_shard(user_id) == shard and smap.write_shards(user_id) == (shard,):
+        raise HTTPException(status_code=409, detail=f"User {user_id} is already on {shard}")
+    try:
+        queued = submit_move(user_id, shard)
+    except QueueFull as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    response.status_code = 202
+    return {"job_id": queued.id, "stage": queued.stage}
+
+@router.get("/snapshots")
+def snapshots():
+    return {"snapshots": list_snapshots()}
+
+@router.post("/snapshots")
+def create_snapshot(response: Response, user_id: Optional[str] = None, name: Optional[str] = None):
+    """Exports one user (or everyone) — nodes, edges, vectors — as a background job."""
+    if name is not None:
+        try:
+            snapshot_dir(name)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+    users = [user_id] if user_id else None
+    try:
+        queued = get_maintenance_queue().submit(user_id or "*", lambda publish: export_snapshot(users, name, publish),
+                                                key=f"snapshot:{user_id or '*'}", reuse_finished=False)
+    except QueueFull as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    response.status_code = 202
+    return {"job_id": queued.id, "stage": queued.stage}
+
+@router.post("/snapshots/{name}/load")
+def restore_snapshot(response: Response, name: str, user_id: Optional[str] = None,
+                     stores: str = Query("vectors,neo4j", pattern="^(vectors|neo4j)(,(vectors|neo4j))?$")):
+    """Bulk-loads a snapshot (or one user of it) into the stores as a background job."""
+    try:
+        found = os.path.exists(os.path.join(snapshot_path(name), "manifest.json"))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except FileNotFoundError:   # "latest" with nothing exported yet
+        found = False
+    if not found:
+        raise HTTPException(status_code=404, detail=f"Snapshot {name} not found")
+    users = [user_id] if user_id else None
+    try:
+        queued = get_maintenance_queue().submit(
+            user_id or "*", lambda publish: load_snapshot(name, stores.split(","), users, publish),
+            key=f"snapshot-load:{name}:{user_id or '*'}", reuse_finished=False)
+    except QueueFull as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    response.status_code = 202
+    return {"job_id": queued.id, "stage": queued.stage}
+
+def submit_import(import_id: str, user_id: str, path: str):
+    # one run per import at a time; a finished one can be resumed to retry failed items
+    return get_maintenance_queue().submit(user_id, lambda publish: run_import(import_id, user_id, path, publish),
+                                          key=f"import:{import_id}", reuse_finished=False)
+
+@router.post("/import")
+async def bulk_import(response: Response, user_id: str, file: UploadFile = File(...),
+                      import_id: Optional[str] = None):
+    """NDJSON (one entry per line) or a zip of .txt/.md notes; runs as a job, progress per item."""
+    digest = await run_in_threadpool(file_digest, file.file)
+    # same user + same file → same import, so re-uploading resumes instead of duplicating
+    import_id = import_id or key_from_digest(user_id, digest)[:24]
+    existing = get_import_log().get(import_id)
+    if existing and existing["user_id"] != user_id:
+        raise HTTPException(status_code=409, detail=f"Import {import_id} belongs to another user")
+    path = await run_in_threadpool(save_upload, file.file, import_id)
+    try:
+        queued = submit_import(import_id, user_id, path)
+    except QueueFull as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    response.status_code = 202
+    return {"import_id": import_id, "job_id": queued.id, "stage": queued.stage}
+
+@router.get("/import/{import_id}")
+def bulk_import_status(import_id: str, user_id: str,
+                       items: Optional[str] = Query(None, description="all, or one status: done / failed / skipped")):
+    info = get_import_log().get(import_id)
+    if info is None or info["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail=f"Import {import_id} not found")
+    info.pop("path")
+    if items:
+        info["item_list"] = get_import_log().items(import_id, None if items == "all" else items)
+    return info
+
+@router.post("/import/{import_id}/resume")
+def bulk_import_resume(response: Response, import_id: str, user_id: str):
+    info = get_import_log().get(import_id)
+    if info is None or info["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail=f"Import {import_id} not found")
+    if not os.path.exists(info["path"]):
+        raise HTTPException(status_code=410, detail="Upload no longer stored; every item already imported")
+    try:
+        queued = submit_import(import_id, user_id, info["path"])
+    except QueueFull as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    response.status_code = 202
+    return {"import_id": import_id, "job_id": queued.id, "stage": queued.stage}
 
-@router.get("/thoughts", response_model=List[Thought])
-def fetch_thoughts():
-    return get_all_thought_nodes()
+# Whisper runs in a separate pool of warm worker processes (whisper_pool.py);
+# this process never loads the model itself
 
-# Load Whisper once at the top-level
-whisper_model = whisper.load_model("tiny")
+# async uploads are copied to a private spool; past this size it rolls to an anonymous temp file
+SPOOL_MAX = 8 * 1024 * 1024
 
 @router.post("/transcribe-audio")
-async def transcribe_audio(file: UploadFile = File(...)):
+async def transcribe_audio(response: Response, file: UploadFile = File(...),
+                           idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+                           async_mode: bool = Query(False, alias="async"),
+                           user_id: str = Query("default_user")):
     try:
-        temp_path = f"temp_{file.filename}"
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        result = whisper_model.transcribe(temp_path)
-        os.remove(temp_path)
-
-        transcribed_text = result["text"]
-
-        # 👇 Call your node creation logic directly
-        process_text_into_graph(
-            user_id="default_user",  # You can adjust this if you want user tracking
-            raw_text=transcribed_text
-        )
-
-        # 👇 Return the thought nodes after processing
-        return {
-            "transcription": transcribed_text,
-            "nodes": get_all_thought_nodes()
-        }
-
+        digest = await run_in_threadpool(file_digest, file.file)
+        key = key_from_digest(user_id, digest, idempotency_key)
+
+        def run(src, publish=None):
+            nodes = []
+
+            # 👇 each finished stretch of transcript goes through node creation right away
+            def on_text(text):
+                nodes.extend(process_text_into_graph(user_id=user_id, raw_text=text, on_stage=publish))
+
+            transcribed_text = transcribe_incremental(get_pool(), src, on_text)
+
+            # 👇 Return only the thought nodes this upload created
+            return {"transcription": transcribed_text, **created_graph(nodes)}
+
+        if async_mode:
+            stored = await run_in_threadpool(get_store().get, key)
+            if stored is not None:
+                response.headers["Idempotent-Replayed"] = "true"
+                return stored
+            # the upload is closed when this request returns, so the job reads its own copy
+            spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX)
+            await run_in_threadpool(shutil.copyfileobj, file.file, spool)
+            spool.seek(0)
+
+            def job(publish):
+                with spool:
+                    return get_store().run(key, user_id, lambda: run(spool, publish))[0]
+            try:
+                queued = get_queue().submit(user_id, job, key=key)
+            except QueueFull as exc:
+                spool.close()
+                raise HTTPException(status_code=503, detail=str(exc)) from exc
+            if queued.fn is not job:
+                spool.close()   # identical upload already queued
+            response.status_code = 202
+            return {"job_id": queued.id, "stage": queued.stage}
+
+        result, replayed = await run_in_threadpool(get_store().run, key, user_id, lambda: run(file.file))
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        return result
+
+    except HTTPException:
+        raise
+    except AudioDecodeError as exc:
+        # raised out of the idempotency store / job, so nothing is cached for the key
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+    except (PoolBusy, WorkerFailed, OutboxLagging) as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
     except Exception as e:
         return {"error": str(e)}
 
 
+@router.get("/transcribe-audio/stats")
+def transcribe_stats():
+    pool = POOL.peek()   # a stats read must not spawn the workers
+    if pool is None:
+        return {"count": 0, "state": "not started"}
+    return pool.latency_stats()
+
+
 # @router.post("/transcribe-audio")
 # async def transcribe_audio(file: UploadFile = File(...)):
 #     try:
@@ -0,0 +1 @@
+# benchmarks — offline perf scripts; run from repo root: python -m benchmarks.<name>
@@ -0,0 +1,111 @@
+# benchmarks/bench_chunkers.py — local chunker vs GPT-4o: latency and segment quality
+#   python -m benchmarks.bench_chunkers            (local only)
+#   python -m benchmarks.bench_chunkers --gpt      (also calls algo.chunk_with_gpt; needs OPENAI_API_KEY)
+import argparse, os, statistics, time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from local_chunker import chunk_local, route, split_sentences, tfidf
+
+# Each document is a list of topic paragraphs; paragraph breaks are the gold boundaries.
+CORPUS: List[List[str]] = [
+    [
+        "I want to start running again before the half marathon in April. My plan is three easy runs a week "
+        "and one long run on Sundays. Last year my knees hurt after long runs, so I should buy new shoes and "
+        "stretch properly. Maybe I can join the running club that meets near the river on Tuesday mornings.",
+        "The budget for the apartment renovation is getting out of hand. The contractor quoted twice what we "
+        "expected for the kitchen cabinets. We could paint the cabinets ourselves and only replace the counters. "
+        "I need to compare three quotes before signing anything and ask about the timeline for permits.",
+        "For the machine learning course, the final project is due in six weeks. I am thinking about a model "
+        "that predicts bike rental demand from weather data. The dataset has hourly records, so I should start "
+        "with gradient boosting as a baseline and then try a small neural network.",
+    ],
+    [
+        "Our team meeting today covered the product launch. Marketing wants the landing page ready two weeks "
+        "early. Engineering says the signup flow still has bugs on mobile. We agreed to freeze features on "
+        "Friday and spend next week on testing the signup flow across devices.",
+        "My grandmother's recipe for lentil soup uses cumin, smoked paprika and a lot of lemon. The trick is to "
+        "fry the onions slowly until they are dark and sweet. She always served the soup with warm flatbread "
+        "and pickled turnips. I want to write the recipe down before I forget the details.",
+        "I keep waking up at three in the morning and cannot fall asleep again. Maybe it is the coffee after "
+        "lunch or the phone in bed. I will try no caffeine after noon, reading a paper book, and keeping the "
+        "bedroom cooler for two weeks to see whether my sleep improves.",
+        "Ideas for the garden this spring: tomatoes along the south fence, a herb bed by the kitchen door, and "
+        "a compost bin behind the shed. The soil is heavy clay, so I need to add compost and maybe build raised "
+        "beds for the tomatoes and peppers.",
+    ],
+    [
+        "Reading notes on the history of the printing press. Gutenberg combined movable metal type, oil based "
+        "ink and a screw press adapted from wine making. Printed books spread quickly across Europe and the "
+        "price of books fell sharply within a few decades.",
+        "The printing press changed religion and politics. Pamphlets let reformers reach ordinary readers, and "
+        "governments soon tried to license printers and censor presses. Literacy rose as cheap printed material "
+        "reached towns and villages.",
+        "Separately, I need to renew my passport before the trip to Portugal in July. The form needs a new photo "
+        "and the old passport. Processing takes up to eight weeks, so I should submit the application this month "
+        "and book the flights only after the passport arrives.",
+    ],
+]
+
+# ──────────────────────────  QUALITY  ──────────────────────────────────
+def _labels_from_nodes(sentences: List[str], nodes: List[Dict]) -> List[int]:
+    """Assign each source sentence to the node whose content it matches best (works for GPT rewrites)."""
+    if not nodes:
+        return [0] * len(sentences)
+    M, _, _ = tfidf(sentences + [n["content"] for n in nodes])
+    S, N = M[: len(sentences)], M[len(sentences):]
+    return (S @ N.T).argmax(axis=1).tolist()
+
+def pk(ref: List[int], hyp: List[int]) -> float:
+    """Beeferman's Pk: chance two sentences k apart are wrongly judged same/different segment."""
+    n_segs = len(set(ref))
+    k = max(1, round(len(ref) / n_segs / 2))
+    pairs = range(len(ref) - k)
+    if not pairs:
+        return 0.0
+    return sum((ref[i] == ref[i + k]) != (hyp[i] == hyp[i + k]) for i in pairs) / len(pairs)
+
+def evaluate(name: str, chunk: Callable[[str], List[Dict]], repeat: int, joiner: str) -> Dict:
+    lat, pks, counts = [], [], []
+    for paras in CORPUS:
+        text = joiner.join(paras)
+        sentences, ref = [], []
+        for p_i, p in enumerate(paras):
+            ss = split_sentences(p)
+            sentences += ss
+            ref += [p_i] * len(ss)
+        runs = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            nodes = chunk(text)
+            runs.append(time.perf_counter() - t0)
+        lat.append(statistics.median(runs))
+        pks.append(pk(ref, _labels_from_nodes(sentences, nodes)))
+        counts.append(f"{len(nodes)}/{len(paras)}")
+    return {"path": name, "median_ms": statistics.median(lat) * 1e3, "max_ms": max(lat) * 1e3,
+            "pk": float(np.mean(pks)), "nodes/gold": " ".join(counts)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--gpt", action="store_true", help="also benchmark the GPT-4o path")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    paths = [("local", chunk_local, args.repeat)]
+    if args.gpt:
+        if not os.getenv("OPENAI_API_KEY"):
+            raise SystemExit("--gpt needs OPENAI_API_KEY")
+        from algo import chunk_with_gpt
+        paths.append(("gpt-4o", chunk_with_gpt, 1))
+
+    # "typed" keeps paragraph breaks; "voice" is one run of text like a Whisper transcript
+    print(f"{'path':8} {'input':6} {'median':>10} {'max':>10} {'Pk↓':>6}  nodes/gold per doc")
+    for name, fn, repeat in paths:
+        for label, joiner in (("typed", "\n\n"), ("voice", " ")):
+            r = evaluate(name, fn, repeat, joiner)
+            print(f"{r['path']:8} {label:6} {r['median_ms']:8.2f}ms {r['max_ms']:8.2f}ms {r['pk']:6.3f}  {r['nodes/gold']}")
+    print("router:", ", ".join(route("\n\n".join(p)) for p in CORPUS))
+
+if __name__ == "__main__":
+    main()
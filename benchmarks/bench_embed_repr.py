@@ -0,0 +1,104 @@
+# benchmarks/bench_embed_repr.py — reduced / quantized embeddings vs full 3072-dim float32
+#   python -m benchmarks.bench_embed_repr [--n 5000] [--queries 200]
+#   python -m benchmarks.bench_embed_repr --from-cache embed_cache.sqlite3   (real text-embedding-3-large vectors)
+#
+# Reference decisions are algo.py's: exact top-10 at full width, then
+# AUTO_LINK_T / FUZZY_* thresholds. Each config reports how many of those
+# direct / fuzzy links it reproduces (Jaccard over all queries).
+import argparse, os, shutil, sqlite3, statistics, tempfile, time
+from typing import List, Set, Tuple
+
+import numpy as np
+
+from embed_repr import reduce
+from segment_store import SegmentStore, normalize
+
+AUTO_LINK_T, FUZZY_MIN_T, FUZZY_MAX_T = 0.65, 0.40, 0.65   # algo.py
+EMBED_MODEL, FULL_DIM, K = "text-embedding-3-large", 3072, 10
+
+def synthetic(n: int, rng) -> np.ndarray:
+    """
+    Topic / subtopic mixture whose signal decays along the dimensions the
+    way Matryoshka-trained embeddings do, so prefixes keep the structure.
+    Noise is flat, so truncation raises the signal share like the real model.
+    """
+    decay = (1 + np.arange(FULL_DIM) / 96.0) ** -1.0
+    topics = rng.standard_normal((60, FULL_DIM))
+    subs = np.repeat(topics, 8, axis=0) + 0.9 * rng.standard_normal((480, FULL_DIM))
+    pick = rng.integers(0, len(subs), n)
+    signal = normalize((subs[pick] + 0.6 * rng.standard_normal((n, FULL_DIM))) * decay)
+    return normalize(signal + 0.5 * rng.standard_normal((n, FULL_DIM)) / np.sqrt(FULL_DIM))
+
+def from_cache(path: str) -> np.ndarray:
+    db = sqlite3.connect(path)
+    rows = db.execute("SELECT vec FROM embeddings WHERE model = ? AND dim = ?", (EMBED_MODEL, FULL_DIM)).fetchall()
+    if len(rows) < 50:
+        raise SystemExit(f"only {len(rows)} {EMBED_MODEL} vectors in {path}")
+    return normalize(np.stack([np.frombuffer(r[0], dtype=np.float32) for r in rows]))
+
+def links(ids: List[str], dists: List[float]) -> Tuple[Set[str], Set[str]]:
+    sims = 1.0 - np.asarray(dists)
+    direct = {i for i, s in zip(ids, sims) if s >= AUTO_LINK_T}
+    fuzzy = {i for i, s in zip(ids, sims) if FUZZY_MIN_T <= s < FUZZY_MAX_T}
+    return direct, fuzzy
+
+def jaccard(ref: List[Set[str]], got: List[Set[str]]) -> float:
+    inter = sum(len(a & b) for a, b in zip(ref, got))
+    union = sum(len(a | b) for a, b in zip(ref, got))
+    return inter / union if union else 1.0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=5000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--from-cache", help="embed_cache.sqlite3 to read real vectors from")
+    ap.add_argument("--rerank", type=int, default=40, help="candidates rescored at full width")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(3)
+    V = from_cache(args.from_cache) if args.from_cache else synthetic(args.n + args.queries, rng)
+    nq = min(args.queries, len(V) // 5)
+    X, Q = V[:-nq], V[-nq:]
+    ids = [f"n{i}" for i in range(len(X))]
+
+    S = Q @ X.T
+    top = np.argsort(-S, axis=1)[:, :K]
+    ref = [links([ids[j] for j in row], (1 - S[qi, row]).tolist()) for qi, row in enumerate(top)]
+    ref_d, ref_f = [r[0] for r in ref], [r[1] for r in ref]
+    print(f"nodes={len(X)} queries={nq} ({'cache' if args.from_cache else 'synthetic'}); "
+          f"reference links/query: direct {np.mean([len(d) for d in ref_d]):.2f}, fuzzy {np.mean([len(f) for f in ref_f]):.2f}")
+    print(f"{'dims':>5} {'dtype':8} {'rerank':>6} {'B/node':>7} {'+disk':>7} {'p50':>8} {'p99':>8} {'direct':>7} {'fuzzy':>7}")
+
+    configs = [(FULL_DIM, "float32", 0)]
+    for dims in (1024, 512, 256):
+        for dtype in ("float16", "int8"):
+            configs += [(dims, dtype, 0), (dims, dtype, args.rerank)]
+    for dims, dtype, rerank in configs:
+        root = tempfile.mkdtemp(prefix="reprbench-")
+        try:
+            store = SegmentStore(root, dtype, rerank=rerank)
+            R = reduce(X, dims)
+            for a in range(0, len(X), 1000):
+                store.add_many("bench", ids[a:a + 1000], R[a:a + 1000], [{}] * len(ids[a:a + 1000]), full=X[a:a + 1000])
+            store.wait_trained()
+            RQ = reduce(Q, dims)
+            lat, got_d, got_f = [], [], []
+            for qi in range(nq):
+                t0 = time.perf_counter()
+                out = store.query_many(RQ[qi:qi + 1], "bench", K, full=Q[qi:qi + 1])
+                lat.append(time.perf_counter() - t0)
+                d, f = links(out["ids"][0], out["distances"][0])
+                got_d.append(d)
+                got_f.append(f)
+            size = lambda ext: sum(os.path.getsize(os.path.join(dp, x)) for dp, _, fs in os.walk(root)
+                                   for x in fs if x.endswith(ext))
+            hot, cold = size(".vec") + size(".scl"), size(".full")
+            lat.sort()
+            print(f"{dims:5} {dtype:8} {rerank or '-':>6} {hot // len(X):7} {cold // len(X):7} "
+                  f"{statistics.median(lat) * 1e3:6.2f}ms {lat[int(0.99 * (len(lat) - 1))] * 1e3:6.2f}ms "
+                  f"{jaccard(ref_d, got_d):7.3f} {jaccard(ref_f, got_f):7.3f}")
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
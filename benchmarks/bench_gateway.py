@@ -0,0 +1,67 @@
+# benchmarks/bench_gateway.py — fresh OpenAI client per call vs the shared gateway
+#   python -m benchmarks.bench_gateway [--calls 200] [--threads 8] [--latency 0.005]
+import argparse, asyncio, statistics, time
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI
+
+from benchmarks.fakes import FakeOpenAIServer
+from llm_gateway import LLMGateway, TokenBucket
+
+MODEL = "text-embedding-3-large"
+
+def run(label, server, embed_one, calls, threads):
+    server.stats.clear()
+    server.connections.clear()
+    lat = []
+
+    def one(i):
+        t0 = time.perf_counter()
+        embed_one(f"thought {i}")
+        lat.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(one, range(calls)))
+    wall = time.perf_counter() - t0
+    lat.sort()
+    print(f"{label:18} {wall * 1e3:9.1f}ms  p50 {statistics.median(lat) * 1e3:6.2f}ms  "
+          f"p99 {lat[int(0.99 * (len(lat) - 1))] * 1e3:6.2f}ms  connections {len(server.connections):4}  "
+          f"requests {server.stats['requests']}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=200)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--latency", type=float, default=0.005, help="server-side seconds per request")
+    args = ap.parse_args()
+
+    with FakeOpenAIServer(latency=args.latency) as server:
+        # the old openai_utils.get_openai_client(): new client (and TCP pool) every call
+        fresh = lambda text: OpenAI(api_key="x", base_url=server.base_url).embeddings.create(model=MODEL, input=[text])
+        gw = LLMGateway(api_key="x", base_url=server.base_url, rpm=10 ** 6, tpm=10 ** 9)
+
+        run("client per call", server, fresh, args.calls, args.threads)
+        run("shared gateway", server, lambda text: gw.embed(MODEL, [text]), args.calls, args.threads)
+
+        # 429s are retried (Retry-After: 0) and never reach the caller
+        server.fail_next = 3
+        gw.embed(MODEL, ["throttled"])
+        print(f"429 retry: throttled={server.stats['throttled']} gateway={gw.stats}")
+
+        async def burst():
+            await asyncio.gather(*(gw.aembed(MODEL, [f"async {i}"]) for i in range(args.calls)))
+        t0 = time.perf_counter()
+        asyncio.run(burst())
+        print(f"async gateway      {(time.perf_counter() - t0) * 1e3:9.1f}ms  ({args.calls} concurrent calls)")
+
+        # RPM bucket: capacity is one minute's budget, then acquisitions are paced
+        bucket = TokenBucket(600)
+        t0 = time.perf_counter()
+        for _ in range(620):
+            bucket.acquire()
+        print(f"rpm=600, 620 acquires {(time.perf_counter() - t0):6.2f}s  (last 20 paced at 10/s → ≈2s)")
+        print("latency histogram:", gw.metrics()["latency_ms"][MODEL]["counts"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# benchmarks/bench_ingest.py — end-to-end ingest throughput with every external service faked
+#   python -m benchmarks.bench_ingest                                   (default sweep)
+#   python -m benchmarks.bench_ingest --corpus 1000,1000000 --words 200,6000 --concurrency 1,16
+#   python -m benchmarks.bench_ingest --mode api --baseline old.json    (flag regressions vs. a previous run)
+#
+# OpenAI is FakeOpenAIServer (real HTTP through llm_gateway), the vector
+# store is MemoryVectorStore pre-seeded with `corpus` vectors, Neo4j is
+# FakeNeo4jDriver. Each case runs in a fresh process so peak RSS is its own.
+import argparse, itertools, json, os, platform, random, resource, subprocess, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List
+
+from benchmarks.fakes import FakeOpenAIServer
+
+USER = "bench"
+WORDS = ("garden budget project meeting running coffee passport kitchen model dataset team launch recipe "
+         "sleep printing history soup contractor permit flight course marathon quote schedule review "
+         "deadline design memory idea plan book shoes river morning network weather demand signup").split()
+
+def transcript(n_words: int, seed: int) -> str:
+    """Deterministic, unique-per-seed text of ~n_words in short sentences and paragraphs."""
+    rng = random.Random(seed)
+    out, left = [], n_words
+    while left > 0:
+        n = min(left, rng.randint(8, 16))
+        out.append(" ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + f" {seed}.")
+        left -= n
+        if rng.random() < 0.15:
+            out.append("\n\n")
+    return " ".join(out)
+
+def pct(xs: List[float], q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else 0.0
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024   # KiB on Linux
+
+# ───────────────────────────  ONE CASE  ────────────────────────────────
+def run_case(case: Dict) -> Dict:
+    """Runs in its own process; everything heavy is imported here."""
+    tmp = tempfile.mkdtemp(prefix="bench-ingest-")
+    for k, name in (("EMBED_CACHE_PATH", "embed.sqlite3"), ("IDEMPOTENCY_DB", "idem.sqlite3"),
+                    ("RELINK_DB", "relink.sqlite3"), ("OUTBOX_DB", "outbox.sqlite3")):
+        os.environ[k] = os.path.join(tmp, name)
+
+    import numpy as np
+    import graph_store, vector_store
+    from benchmarks.fakes import FakeNeo4jDriver, MemoryVectorStore
+    from embed_repr import reduce
+    from metrics import STAGE_SECONDS
+
+    store, driver = MemoryVectorStore(), FakeNeo4jDriver(case["neo4j_latency"])
+    vector_store.set_store(store)
+    graph_store.DRIVER.set(driver)
+    dim = reduce(np.ones((1, case["dim"]), np.float32)).shape[1]
+    t0 = time.perf_counter()
+    store.seed(USER, case["corpus"], dim)
+    seed_s = time.perf_counter() - t0
+    rss_seeded = rss_mb()
+
+    if case["mode"] == "api":
+        import main
+        from fastapi.testclient import TestClient
+        client = TestClient(main.app)
+
+        def ingest(text: str) -> int:
+            r = client.post("/api/v1/process-text", json={"user_id": USER, "raw_text": text})
+            r.raise_for_status()
+            return len(r.json()["nodes"])
+    else:
+        import algo
+
+        def ingest(text: str) -> int:
+            return len(algo.ingest_entry(text, USER))
+
+    # distinct texts per case, so --inline runs don't hit each other's embedding cache
+    base = case["seed"] * 10_000_000 + case["index"] * 10_000
+    for i in range(case["warmup"]):
+        ingest(transcript(case["words"], base - 1 - i))
+    stages0, trips0, queries0 = STAGE_SECONDS.totals(), driver.stats["round_trips"], store.stats["queries"]
+
+    def timed(i: int):
+        text = transcript(case["words"], base + i)
+        t = time.perf_counter()
+        n = ingest(text)
+        return time.perf_counter() - t, n
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=case["concurrency"]) as pool:
+        out = list(pool.map(timed, range(case["requests"])))
+    wall = time.perf_counter() - t0
+
+    lat = [s for s, _ in out]
+    nodes = sum(n for _, n in out)
+    stages = {}
+    for (stage,), (count, total) in STAGE_SECONDS.totals().items():
+        c0, s0 = stages0.get((stage,), (0, 0.0))
+        if count > c0:
+            stages[stage] = round((total - s0) / (count - c0) * 1e3, 3)
+    return {
+        **{k: case[k] for k in ("mode", "corpus", "words", "concurrency", "requests")},
+        "p50_ms": round(pct(lat, 0.50) * 1e3, 3),
+        "p99_ms": round(pct(lat, 0.99) * 1e3, 3),
+        "mean_ms": round(sum(lat) / len(lat) * 1e3, 3),
+        "throughput_rps": round(len(lat) / wall, 3),
+        "nodes_per_s": round(nodes / wall, 3),
+        "nodes": nodes,
+        "stage_mean_ms": stages,
+        "neo4j_round_trips": driver.stats["round_trips"] - trips0,
+        "vector_queries": store.stats["queries"] - queries0,
+        "seed_s": round(seed_s, 3),
+        "rss_seeded_mb": round(rss_seeded, 1),
+        "peak_rss_mb": round(rss_mb(), 1),
+    }
+
+# ──────────────────────────  REPORTING  ────────────────────────────────
+def case_key(r: Dict) -> tuple:
+    return r["mode"], r["corpus"], r["words"], r["concurrency"]
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> int:
+    old = {case_key(r): r for r in baseline}
+    worse = 0
+    print(f"\nvs. baseline (±{tolerance:.0%}):")
+    for r in results:
+        b = old.get(case_key(r))
+        if b is None:
+            continue
+        p99, tput = r["p99_ms"] / max(b["p99_ms"], 1e-9), r["throughput_rps"] / max(b["throughput_rps"], 1e-9)
+        bad = p99 > 1 + tolerance or tput < 1 - tolerance
+        worse += bad
+        print(f"  {r['mode']:6} corpus={r['corpus']:>8} words={r['words']:>6} conc={r['concurrency']:>3}  "
+              f"p99 ×{p99:5.2f}  throughput ×{tput:5.2f}{'  REGRESSION' if bad else ''}")
+    return worse
+
+def ints(s: str) -> List[int]:
+    return [int(float(x)) for x in s.split(",") if x]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", default="direct", help="direct (algo.ingest_entry), api (POST /process-text) or both")
+    ap.add_argument("--corpus", type=ints, default=ints("1000,100000"), help="existing thoughts per user")
+    ap.add_argument("--words", type=ints, default=ints("200,1500,6000"), help="transcript length")
+    ap.add_argument("--concurrency", type=ints, default=ints("1,8"))
+    ap.add_argument("--requests", type=int, default=32, help="ingests per case")
+    ap.add_argument("--warmup", type=int, default=2)
+    ap.add_argument("--dim", type=int, default=256, help="fake embedding width (EMBED_DIMS still applies)")
+    ap.add_argument("--openai-latency", type=float, default=0.02, help="seconds per fake OpenAI request")
+    ap.add_argument("--neo4j-latency", type=float, default=0.001, help="seconds per fake Bolt round trip")
+    ap.add_argument("--chunk-words", type=int, default=80, help="words per node from the fake chunker")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--inline", action="store_true", help="run cases in this process (no per-case RSS)")
+    ap.add_argument("--out", default="bench_ingest.json")
+    ap.add_argument("--baseline", help="previous --out file to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.10)
+    args = ap.parse_args()
+
+    modes = ["direct", "api"] if args.mode == "both" else [args.mode]
+    cases = [dict(index=i, mode=m, corpus=c, words=w, concurrency=n, requests=args.requests, warmup=args.warmup,
+                  dim=args.dim, neo4j_latency=args.neo4j_latency, seed=args.seed)
+             for i, (m, c, w, n) in enumerate(itertools.product(modes, args.corpus, args.words, args.concurrency))]
+
+    results = []
+    with FakeOpenAIServer(latency=args.openai_latency, dim=args.dim, chunk_words=args.chunk_words) as server:
+        os.environ.update(OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY="bench")
+        for k, v in (("OPENAI_RPM", "1000000"), ("OPENAI_TPM", "1000000000"), ("LOG_LEVEL", "WARNING"),
+                     ("PREWARM", "")):
+            os.environ.setdefault(k, v)
+        print(f"{len(cases)} cases, {args.requests} ingests each, OpenAI {args.openai_latency * 1e3:.0f} ms, "
+              f"Neo4j {args.neo4j_latency * 1e3:.1f} ms/trip")
+        for case in cases:
+            before = server.stats["requests"]
+            if args.inline:
+                r = run_case(case)
+            else:
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as ex:
+                    r = ex.submit(run_case, case).result()
+            r["openai_requests"] = server.stats["requests"] - before
+            results.append(r)
+            print(f"  {r['mode']:6} corpus={r['corpus']:>8} words={r['words']:>6} conc={r['concurrency']:>3}  "
+                  f"p50={r['p50_ms']:8.1f} ms  p99={r['p99_ms']:8.1f} ms  {r['throughput_rps']:7.2f} ingest/s  "
+                  f"{r['nodes_per_s']:8.1f} nodes/s  rss={r['peak_rss_mb']:7.1f} MB")
+
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        rev = ""
+    report = {
+        "meta": {"at": time.strftime("%Y-%m-%dT%H:%M:%S"), "git": rev, "python": sys.version.split()[0],
+                 "platform": platform.platform(), "cpus": os.cpu_count(), "args": vars(args)},
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            if compare(results, json.load(f)["results"], args.tolerance):
+                sys.exit(1)
+
+if __name__ == "__main__":
+    main()
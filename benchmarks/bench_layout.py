@@ -0,0 +1,79 @@
+# benchmarks/bench_layout.py — server-side layout: full vs incremental time, community quality
+#   python -m benchmarks.bench_layout [--n 1000,5000,20000] [--communities 40] [--added 0.01]
+import argparse, time
+
+import numpy as np
+
+import layout
+
+def planted(n: int, groups: int, deg_in: float, deg_out: float, rng):
+    """Graph with `groups` planted communities: ~deg_in edges per node inside, ~deg_out across."""
+    g = rng.integers(0, groups, n)
+    members = [np.flatnonzero(g == k) for k in range(groups)]
+    src, dst = [], []
+    for k, m in enumerate(members):
+        e = int(len(m) * deg_in / 2)
+        src.append(rng.choice(m, e)); dst.append(rng.choice(m, e))
+    e = int(n * deg_out / 2)
+    src.append(rng.integers(0, n, e)); dst.append(rng.integers(0, n, e))
+    src, dst = np.concatenate(src), np.concatenate(dst)
+    links = [[] for _ in range(n)]
+    for a, b in zip(src.tolist(), dst.tolist()):
+        if a != b:
+            links[a].append(f"n{b}"); links[b].append(f"n{a}")
+    rows = [{"id": f"n{i}", "title": f"thought {i}", "tags": [f"topic{g[i]}"], "links": links[i]} for i in range(n)]
+    return rows, g
+
+def modularity(labels: np.ndarray, src: np.ndarray, dst: np.ndarray) -> float:
+    m = len(src)
+    if not m:
+        return 0.0
+    deg = np.bincount(np.concatenate([src, dst]), minlength=len(labels))
+    inside = (labels[src] == labels[dst]).sum() / m
+    tot = np.bincount(labels, weights=deg)
+    return float(inside - ((tot / (2 * m)) ** 2).sum())
+
+def edge_stretch(P: np.ndarray, src: np.ndarray, dst: np.ndarray) -> float:
+    """Mean edge length / mean distance between random pairs (lower = tighter neighbourhoods)."""
+    rng = np.random.default_rng(0)
+    a, b = rng.integers(0, len(P), 5000), rng.integers(0, len(P), 5000)
+    e = np.linalg.norm(P[src] - P[dst], axis=1).mean()
+    return float(e / max(np.linalg.norm(P[a] - P[b], axis=1).mean(), 1e-9))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", default="1000,5000,20000")
+    ap.add_argument("--communities", type=int, default=40)
+    ap.add_argument("--deg-in", type=float, default=6.0)
+    ap.add_argument("--deg-out", type=float, default=0.5)
+    ap.add_argument("--added", type=float, default=0.01, help="fraction of nodes added before the incremental run")
+    args = ap.parse_args()
+    rng = np.random.default_rng(7)
+
+    for n in [int(x) for x in args.n.split(",")]:
+        total = int(n * (1 + args.added))
+        rows, truth = planted(total, args.communities, args.deg_in, args.deg_out, rng)
+        # the "before" graph: first n nodes, links to later ones dropped
+        keep = {f"n{i}" for i in range(n)}
+        before = [{**r, "links": [x for x in r["links"] if x in keep]} for r in rows[:n]]
+
+        t0 = time.perf_counter()
+        lay = layout.compute("bench", before, 1)
+        t_full = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        inc = layout.compute("bench", rows, 2, prev=lay)
+        t_inc = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        scratch = layout.compute("bench", rows, 2)
+        t_scratch = time.perf_counter() - t0
+
+        src, dst = layout._edges(rows, {r["id"]: i for i, r in enumerate(rows)})
+        print(f"n={n:6}  full={t_full * 1e3:8.0f} ms  incremental(+{total - n})={t_inc * 1e3:7.0f} ms "
+              f"({inc.result['mode']})  from scratch={t_scratch * 1e3:8.0f} ms")
+        for name, l in (("incremental", inc), ("scratch", scratch)):
+            print(f"    {name:11}  clusters={len(l.result['clusters']):5}  "
+                  f"modularity={modularity(l.labels, src, dst):.3f} (planted {modularity(truth, src, dst):.3f})  "
+                  f"edge stretch={edge_stretch(l.P, src, dst):.3f}")
+
+if __name__ == "__main__":
+    main()
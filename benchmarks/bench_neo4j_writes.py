@@ -0,0 +1,53 @@
+# benchmarks/bench_neo4j_writes.py — per-node sessions vs one UNWIND tx
+#   python -m benchmarks.bench_neo4j_writes [--latency 0.002]
+import argparse, time, uuid
+
+from graph_store import write_thoughts
+from benchmarks.fakes import FakeNeo4jDriver
+
+def make_batch(n_nodes: int, n_links: int):
+    ids = [str(uuid.uuid4()) for _ in range(n_nodes)]
+    return [
+        {"id": nid, "title": f"t{i}", "content": "x" * 600, "tags": ["a", "b"],
+         "user_id": "bench", "related_ids": [ids[(i + j + 1) % n_nodes] for j in range(n_links)]}
+        for i, nid in enumerate(ids)
+    ]
+
+def legacy_store(driver, nodes):
+    # the old algo.store_in_neo4j, called once per node
+    for node in nodes:
+        with driver.session() as s:
+            s.run("MERGE (t:Thought {id:$id}) SET t += $props", id=node["id"], props=node)
+            for rid in node["related_ids"]:
+                s.run("MATCH (a:Thought {id:$a}), (b:Thought {id:$b}) MERGE (a)-[:RELATED_TO]->(b)",
+                      a=node["id"], b=rid)
+
+def batched_store(driver, nodes):
+    write_thoughts(driver, nodes)
+
+def run(fn, nodes, latency: float, repeat: int):
+    walls, driver = [], None
+    for _ in range(repeat):
+        driver = FakeNeo4jDriver(latency)
+        t0 = time.perf_counter()
+        fn(driver, nodes)
+        walls.append(time.perf_counter() - t0)
+    return driver.stats, min(walls)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", type=int, default=40)
+    ap.add_argument("--links", type=int, default=10)
+    ap.add_argument("--latency", type=float, default=0.001, help="seconds per round trip")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    nodes = make_batch(args.nodes, args.links)
+    print(f"{args.nodes} nodes × {args.links} links, {args.latency * 1e3:.1f} ms/round trip")
+    for name, fn in (("legacy", legacy_store), ("batched", batched_store)):
+        stats, wall = run(fn, nodes, args.latency, args.repeat)
+        print(f"  {name:8} sessions={stats['sessions']:4}  round_trips={stats['round_trips']:4}  "
+              f"wall={wall * 1e3:8.2f} ms/ingest")
+
+if __name__ == "__main__":
+    main()
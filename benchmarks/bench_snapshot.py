@@ -0,0 +1,69 @@
+# benchmarks/bench_snapshot.py — warm start from a snapshot vs re-embedding everything
+#   python -m benchmarks.bench_snapshot [--n 10000,100000] [--dim 1536] [--embed-latency 0.3]
+#
+# write: SnapshotWriter throughput (the Neo4j scan that feeds it in production is not included)
+# load:  load_snapshot into MemoryVectorStore + FakeNeo4jDriver (per-round-trip latency)
+# embed: the same texts through embed_texts against FakeOpenAIServer, i.e. the rebuild a
+#        snapshot avoids; the fake has no rate limits, real OpenAI TPM makes this far slower
+import argparse, os, shutil, tempfile, time
+
+import numpy as np
+
+from benchmarks.bench_ingest import transcript
+from benchmarks.fakes import FakeNeo4jDriver, FakeOpenAIServer, MemoryVectorStore
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", default="10000,100000")
+    ap.add_argument("--dim", type=int, default=1536)
+    ap.add_argument("--users", type=int, default=10)
+    ap.add_argument("--embed-latency", type=float, default=0.3, help="fake OpenAI seconds per embeddings call")
+    ap.add_argument("--embed-max", type=int, default=20000, help="re-embed at most this many rows (time is linear)")
+    ap.add_argument("--neo4j-latency", type=float, default=0.005)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-snapshot-")
+    os.environ["EMBED_CACHE_PATH"] = os.path.join(tmp, "embed.sqlite3")
+    os.environ["SNAPSHOT_DIR"] = os.path.join(tmp, "snapshots")
+    with FakeOpenAIServer(latency=args.embed_latency, dim=args.dim) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+        import algo, graph_store, snapshot, vector_store
+        algo.embed_texts(["warmup"])   # SDK imports, connection pool
+        rng = np.random.default_rng(0)
+
+        print(f"{'rows':>7} {'MB':>6} {'write':>9} {'load':>9} {'load rows/s':>12} {'re-embed (est.)':>16}")
+        for n in [int(x) for x in args.n.split(",")]:
+            texts = [transcript(12, i) for i in range(n)]
+            now = "2026-01-01T00:00:00+00:00"
+            nodes = [{"id": f"n{i}", "user_id": f"u{i % args.users}", "title": t[:40], "content": t, "tags": ["t"],
+                      "related_ids": [f"n{i - 1}"] if i % args.users else [], "created_at": now, "updated_at": now}
+                     for i, t in enumerate(texts)]
+            nodes.sort(key=lambda x: x["user_id"])
+
+            t0 = time.perf_counter()
+            w = snapshot.SnapshotWriter(os.path.join(snapshot.SNAPSHOT_DIR, f"n{n}"))
+            for u in range(args.users):
+                part = [x for x in nodes if x["user_id"] == f"u{u}"]
+                for a in range(0, len(part), snapshot.SNAPSHOT_BATCH):
+                    page = part[a:a + snapshot.SNAPSHOT_BATCH]
+                    w.add(f"u{u}", page, rng.standard_normal((len(page), args.dim), dtype=np.float32))
+            w.close(algo.embed_model_key())
+            write_s = time.perf_counter() - t0
+            mb = sum(os.path.getsize(os.path.join(w.path, f)) for f in os.listdir(w.path)) / 1e6
+
+            graph_store.DRIVER.set(FakeNeo4jDriver(args.neo4j_latency))
+            vector_store.set_store(MemoryVectorStore())
+            t0 = time.perf_counter()
+            snapshot.load_snapshot(f"n{n}")
+            load_s = time.perf_counter() - t0
+
+            sample = texts[:min(n, args.embed_max)]
+            t0 = time.perf_counter()
+            algo.embed_texts([f"{s} #{n}" for s in sample])   # fresh text: no cache hits
+            embed_s = (time.perf_counter() - t0) * n / len(sample)
+            print(f"{n:7} {mb:6.0f} {write_s:8.2f}s {load_s:8.2f}s {n / load_s:12.0f} {embed_s:15.1f}s")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# benchmarks/bench_startup.py — cold-start cost of main:app
+#   python -m benchmarks.bench_startup [--runs 5] [--prewarm openai,vectors] [--out bench_startup.json]
+#
+# Reports, each in a fresh interpreter:
+#   • import time of `main` and the slowest modules under it (python -X importtime)
+#   • which heavy packages (torch, whisper, openai, neo4j, chromadb) are loaded
+#     after `import main` and after the lifespan has run
+#   • time from spawning uvicorn to the first `/` response, and to
+#     /api/v1/health?strict=true (every PREWARM resource ready)
+import argparse, json, os, socket, statistics, subprocess, sys, time, urllib.error, urllib.request
+from typing import Dict, List, Optional
+
+HEAVY = ("torch", "whisper", "openai", "httpx", "neo4j", "chromadb", "numpy", "fastapi")
+
+def _env(prewarm: Optional[str]) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "bench")   # the gateway only checks it's set; no request is made
+    env.setdefault("LOG_LEVEL", "WARNING")
+    if prewarm is not None:
+        env["PREWARM"] = prewarm
+    return env
+
+def import_times(env: Dict[str, str], top: int) -> Dict:
+    """Parses `-X importtime`; cumulative µs per module, repo modules plus the `top` slowest others."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                         env=env, capture_output=True, text=True, check=True).stderr
+    cum: Dict[str, int] = {}
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cum_us, name = [p.strip() for p in line.replace("import time:", "|", 1).split("|")]
+        cum[name] = int(cum_us)
+    repo = {f[:-3] for f in os.listdir(".") if f.endswith(".py")}
+    ours = {n: round(us / 1e3, 1) for n, us in cum.items() if n in repo}
+    others = sorted(((n, us) for n, us in cum.items() if n not in repo and "." not in n),
+                    key=lambda x: -x[1])[:top]
+    return {"main_ms": ours.get("main"), "repo_ms": dict(sorted(ours.items(), key=lambda x: -x[1])),
+            "slowest_packages_ms": {n: round(us / 1e3, 1) for n, us in others}}
+
+def loaded_modules(env: Dict[str, str]) -> Dict:
+    code = (
+        "import json, sys\n"
+        "import main\n"
+        f"heavy = {HEAVY!r}\n"
+        "after_import = [m for m in heavy if m in sys.modules]\n"
+        "from fastapi.testclient import TestClient\n"
+        "with TestClient(main.app) as c:\n"
+        "    c.get('/')\n"
+        "print(json.dumps({'after_import': after_import, 'after_lifespan': [m for m in heavy if m in sys.modules]}))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait(url: str, deadline: float) -> Optional[float]:
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as r:
+                if r.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.01)
+    return None
+
+def serve_once(env: Dict[str, str], timeout: float) -> Dict:
+    port = _free_port()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        first = _wait(f"http://127.0.0.1:{port}/", t0 + timeout)
+        ready = _wait(f"http://127.0.0.1:{port}/api/v1/health?strict=true", t0 + timeout) if first else None
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return {"first_response_s": round(first - t0, 3) if first else None,
+            "ready_s": round(ready - t0, 3) if ready else None}
+
+def median(xs: List[Optional[float]]) -> Optional[float]:
+    xs = [x for x in xs if x is not None]
+    return round(statistics.median(xs), 3) if xs else None
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--prewarm", default=None, help="override PREWARM for the measured server")
+    ap.add_argument("--top", type=int, default=8, help="slowest third-party packages to list")
+    ap.add_argument("--timeout", type=float, default=60.0)
+    ap.add_argument("--out", default="bench_startup.json")
+    args = ap.parse_args()
+    env = _env(args.prewarm)
+
+    imports = [import_times(env, args.top) for _ in range(args.runs)]
+    modules = loaded_modules(env)
+    serves = [serve_once(env, args.timeout) for _ in range(args.runs)]
+
+    result = {
+        "import_main_ms": median([r["main_ms"] for r in imports]),
+        "imports": imports[-1],
+        "modules": modules,
+        "first_response_s": median([s["first_response_s"] for s in serves]),
+        "ready_s": median([s["ready_s"] for s in serves]),
+        "runs": serves,
+    }
+    print(f"import main          {result['import_main_ms']} ms (median of {args.runs})")
+    for name, ms in list(result["imports"]["repo_ms"].items())[:10]:
+        print(f"  {name:20} {ms:8.1f} ms cumulative")
+    print("slowest packages     " + ", ".join(f"{n}={ms:.0f}ms" for n, ms in result["imports"]["slowest_packages_ms"].items()))
+    print(f"loaded after import  {modules['after_import']}")
+    print(f"loaded after startup {modules['after_lifespan']}")
+    print(f"first / response     {result['first_response_s']} s")
+    print(f"PREWARM ready        {result['ready_s']} s")
+
+    report = {"meta": {"at": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+                       "prewarm": env.get("PREWARM"), "args": vars(args)}, "result": result}
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# benchmarks/bench_stream.py — streamed vs buffered GPT chunking: time to first stored node, total latency
+#   python -m benchmarks.bench_stream [--words 600,1200,2000] [--node-latency 0.4] [--runs 3]
+#
+# FakeOpenAIServer spends `node_latency` "generating" each node, streamed as
+# SSE when asked; vector store and Neo4j are the in-memory fakes with a
+# per-round-trip latency, so the store side of the overlap is realistic.
+import argparse, os, statistics, tempfile, time
+
+from benchmarks.bench_ingest import transcript
+from benchmarks.fakes import FakeNeo4jDriver, FakeOpenAIServer, MemoryVectorStore
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--words", default="600,1200,2000")
+    ap.add_argument("--node-latency", type=float, default=0.4, help="seconds the fake model spends per node")
+    ap.add_argument("--chunk-words", type=int, default=120, help="words per node the fake model emits")
+    ap.add_argument("--latency", type=float, default=0.05, help="fake OpenAI time to first byte")
+    ap.add_argument("--neo4j-latency", type=float, default=0.01)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-stream-")
+    os.environ["EMBED_CACHE_PATH"] = os.path.join(tmp, "embed.sqlite3")
+    os.environ["OUTBOX_DB"] = os.path.join(tmp, "outbox.sqlite3")
+    with FakeOpenAIServer(latency=args.latency, node_latency=args.node_latency, chunk_words=args.chunk_words) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "bench")
+        import algo, graph_store, vector_store
+        graph_store.DRIVER.set(FakeNeo4jDriver(args.neo4j_latency))
+        vector_store.set_store(MemoryVectorStore())
+        algo.ingest_entry(transcript(200, -1), "warmup")   # SDK imports, connection pool
+
+        print(f"{'words':>6} {'nodes':>5} {'mode':9} {'first stored':>13} {'total':>9}")
+        seed = 0
+        for words in [int(w) for w in args.words.split(",")]:
+            for stream in (False, True):
+                algo.CHUNK_STREAM = stream
+                firsts, totals, nodes = [], [], 0
+                for _ in range(args.runs):
+                    seed += 1   # fresh text: no embedding-cache hits across runs
+                    text = transcript(words, seed)
+                    assert algo.chunk_route(text) == "gpt", "pick --words inside the single-call GPT route"
+                    t0 = time.perf_counter()
+                    first = []
+
+                    def on_stage(name, info):
+                        if name in ("batch_stored", "stored") and not first:
+                            first.append(time.perf_counter() - t0)
+
+                    nodes = len(algo.ingest_entry(text, f"u{seed}", on_stage=on_stage))
+                    totals.append(time.perf_counter() - t0)
+                    firsts.append(first[0])
+                print(f"{words:6} {nodes:5} {'streamed' if stream else 'buffered':9} "
+                      f"{statistics.median(firsts) * 1e3:10.0f} ms {statistics.median(totals) * 1e3:6.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_vector_index.py — segment store (IVF) vs brute force: recall, latency, footprint
+#   python -m benchmarks.bench_vector_index [--n 20000] [--dim 3072] [--queries 200]
+import argparse, os, shutil, statistics, tempfile, time
+
+import numpy as np
+
+import segment_store
+from segment_store import SegmentStore, normalize
+
+def clustered(n: int, dim: int, topics: int, rng) -> np.ndarray:
+    """Embedding-like data: a few hundred topic directions plus noise."""
+    centers = normalize(rng.standard_normal((topics, dim)))
+    X = centers[rng.integers(0, topics, n)] + 0.8 * rng.standard_normal((n, dim)) / np.sqrt(dim)
+    return normalize(X)
+
+def brute_force(X: np.ndarray, Q: np.ndarray, k: int) -> np.ndarray:
+    S = Q @ X.T
+    top = np.argpartition(-S, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(S, top, 1), axis=1), 1)
+
+def pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] * 1e3
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--dim", type=int, default=3072)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--batch", type=int, default=500, help="vectors per add_many call")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(7)
+    X = clustered(args.n + args.queries, args.dim, 300, rng)
+    X, Q = X[: args.n], X[args.n:]
+    ids = [f"n{i}" for i in range(args.n)]
+
+    truth = brute_force(X, Q, args.k)
+    bf = []
+    for q in Q:
+        t0 = time.perf_counter()
+        brute_force(X, q[None, :], args.k)
+        bf.append(time.perf_counter() - t0)
+    print(f"n={args.n} dim={args.dim} k={args.k} nprobe={segment_store.IVF_NPROBE}")
+    print(f"{'backend':12} {'build':>8} {'reload':>8} {'MB':>7} {'B/vec':>7} {'recall':>7} {'p50':>8} {'p99':>8}")
+    print(f"{'numpy brute':12} {'-':>8} {'-':>8} {X.nbytes / 2**20:7.1f} {X.nbytes // args.n:7} "
+          f"{1.0:7.3f} {pct(bf, .5):6.2f}ms {pct(bf, .99):6.2f}ms")
+
+    for dtype in ("float32", "float16", "int8"):
+        root = tempfile.mkdtemp(prefix="vecbench-")
+        try:
+            store = SegmentStore(root, dtype)
+            t0 = time.perf_counter()
+            for a in range(0, args.n, args.batch):
+                store.add_many("bench", ids[a:a + args.batch], X[a:a + args.batch], [{}] * len(ids[a:a + args.batch]))
+            store.wait_trained()                       # IVF training runs in the background
+            build = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            store = SegmentStore(root, dtype)          # cold open: mmap + ids + centroids
+            store.query_many(Q[:1], "bench", args.k)
+            reload_ms = (time.perf_counter() - t0) * 1e3
+
+            lat, hits = [], 0
+            for qi, q in enumerate(Q):
+                t0 = time.perf_counter()
+                got = store.query_many(q[None, :], "bench", args.k)["ids"][0]
+                lat.append(time.perf_counter() - t0)
+                hits += len(set(got) & {ids[j] for j in truth[qi]})
+            disk = sum(os.path.getsize(os.path.join(dp, f)) for dp, _, fs in os.walk(root) for f in fs
+                       if f.startswith("seg-"))
+            print(f"{'ivf ' + dtype:12} {build:7.2f}s {reload_ms:6.1f}ms {disk / 2**20:7.1f} {disk // args.n:7} "
+                  f"{hits / (len(Q) * args.k):7.3f} {pct(lat, .5):6.2f}ms {pct(lat, .99):6.2f}ms")
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+# benchmarks/fakes.py — local stand-ins for external services
+import hashlib, json, threading, time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import numpy as np
+
+from vector_store import VectorStore
+
+# ─────────────────────────  NEO4J DRIVER  ──────────────────────────────
+class FakeResult:
+    def consume(self):
+        return None
+
+    def data(self):
+        return []
+
+class FakeTx:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def run(self, query, **params):
+        return self.driver._round_trip(query, params)
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        self.driver.stats["sessions"] += 1
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        # auto-commit query: one round trip
+        return self.driver._round_trip(query, params)
+
+    def execute_write(self, fn, *args, **kwargs):
+        # BEGIN is pipelined with the first RUN; COMMIT is its own trip
+        out = fn(FakeTx(self.driver), *args, **kwargs)
+        self.driver._round_trip("COMMIT", {})
+        return out
+
+    execute_read = execute_write
+
+class FakeNeo4jDriver:
+    """
+    Counts Bolt round trips and sleeps `latency` seconds per trip so
+    wall time reflects network cost without a real server.
+    """
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.stats = Counter()
+
+    def _round_trip(self, query, params):
+        self.stats["round_trips"] += 1
+        self.stats["rows"] += max(1, len(params.get("rows", ())))
+        if self.latency:
+            time.sleep(self.latency)
+        return FakeResult()
+
+    def session(self, **kwargs):
+        return FakeSession(self)
+
+    def close(self):
+        pass
+
+# ─────────────────────────  OPENAI HTTP API  ───────────────────────────
+class _OpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, so connection reuse is observable
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: dict, headers: dict = None):
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_POST(self):
+        fake = self.server.fake
+        req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with fake.lock:
+            fake.stats["requests"] += 1
+            fake.connections.add(self.client_address)
+            fail = fake.fail_next > 0
+            fake.fail_next -= fail
+        if fake.latency:
+            time.sleep(fake.latency)
+        if fail:
+            fake.stats["throttled"] += 1
+            return self._reply(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                               {"retry-after": "0"})
+        if self.path.endswith("/embeddings"):
+            texts = req["input"] if isinstance(req["input"], list) else [req["input"]]
+            data = [{"object": "embedding", "index": i, "embedding": fake.vector(t)} for i, t in enumerate(texts)]
+            return self._reply(200, {"object": "list", "data": data, "model": req["model"],
+                                     "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+        if self.path.endswith("/chat/completions"):
+            # the input cut into chunk_words pieces, under whatever list key the function schema asks for
+            words = req["messages"][-1]["content"].split()
+            pieces = [" ".join(words[i:i + fake.chunk_words]) for i in range(0, len(words), fake.chunk_words)]
+            fn = req["functions"][0]
+            key = fn["parameters"]["required"][0]
+            items = [{"title": p[:40], "content": p, "text": p, "tags": []} for p in pieces or [""]]
+            if req.get("stream"):
+                return self._stream(req["model"], fn["name"], key, items)
+            time.sleep(fake.node_latency * len(items))   # the model "writing" every item
+            args = json.dumps({key: items})
+            msg = {"role": "assistant", "content": None, "function_call": {"name": fn["name"], "arguments": args}}
+            return self._reply(200, {"id": "fake", "object": "chat.completion", "created": 0, "model": req["model"],
+                                     "choices": [{"index": 0, "message": msg, "finish_reason": "function_call"}]})
+        self._reply(404, {"error": {"message": self.path}})
+
+    def _stream(self, model: str, name: str, key: str, items: list):
+        """SSE chat.completion.chunk events; the arguments arrive in small fragments, node_latency per item."""
+        fake = self.server.fake
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(delta=None, finish=None, usage=None):
+            body = {"id": "fake", "object": "chat.completion.chunk", "created": 0, "model": model,
+                    "choices": [] if usage else [{"index": 0, "delta": delta or {}, "finish_reason": finish}]}
+            if usage:
+                body["usage"] = usage
+            raw = f"data: {json.dumps(body)}\n\n".encode()
+            self.wfile.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+            self.wfile.flush()
+
+        send({"role": "assistant", "content": None, "function_call": {"name": name, "arguments": ""}})
+        parts = [f'{{"{key}": ['] + [("," if i else "") + json.dumps(it) for i, it in enumerate(items)] + ["]}"]
+        for i, part in enumerate(parts):
+            if 0 < i < len(parts) - 1:
+                time.sleep(fake.node_latency)
+            for a in range(0, len(part), 64):
+                send({"function_call": {"arguments": part[a:a + 64]}})
+        send(finish="function_call")
+        send(usage={"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0})
+        raw = b"data: [DONE]\n\n"
+        self.wfile.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n0\r\n\r\n")
+        self.wfile.flush()
+
+class FakeOpenAIServer:
+    """
+    Minimal /v1/embeddings + /v1/chat/completions on localhost. Vectors are
+    deterministic per text; chat splits the input every `chunk_words` words
+    and spends `node_latency` generating each piece (streamed as SSE when
+    the request asks for stream=true); `fail_next` answers that many
+    requests with 429. Counts requests and distinct client connections.
+    """
+    def __init__(self, latency: float = 0.0, dim: int = 64, chunk_words: int = 80, node_latency: float = 0.0):
+        self.latency, self.dim, self.chunk_words, self.node_latency = latency, dim, chunk_words, node_latency
+        self.stats = Counter()
+        self.connections = set()
+        self.fail_next = 0
+        self.lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _OpenAIHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}/v1"
+
+    def vector(self, text: str):
+        seed = hashlib.sha256(text.encode()).digest()
+        return [(seed[i % 32] - 127.5) / 127.5 for i in range(self.dim)]
+
+    def __enter__(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        return False
+
+# ─────────────────────────  VECTOR STORE  ──────────────────────────────
+class MemoryVectorStore(VectorStore):
+    """
+    Exact cosine search over one in-memory float32 matrix per user.
+    `seed` bulk-loads random unit vectors to stand in for an existing graph.
+    """
+    def __init__(self):
+        self._users: Dict[str, list] = {}   # user → [matrix, ids, rows]
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def _user(self, user_id: str, dim: int) -> list:
+        if user_id not in self._users:
+            self._users[user_id] = [np.zeros((1024, dim), np.float32), [], 0]
+        return self._users[user_id]
+
+    def _append(self, user_id: str, ids: List[str], X: np.ndarray) -> None:
+        u = self._user(user_id, X.shape[1])
+        M, n = u[0], u[2]
+        if n + len(X) > len(M):   # grow ×2 so appends stay amortised O(1)
+            grown = np.zeros((max(2 * len(M), n + len(X)), M.shape[1]), np.float32)
+            grown[:n] = M[:n]
+            u[0] = M = grown
+        M[n:n + len(X)] = X
+        u[1].extend(ids)
+        u[2] = n + len(X)
+
+    def seed(self, user_id: str, n: int, dim: int, seed: int = 0, batch: int = 100_000) -> None:
+        rng = np.random.default_rng(seed)
+        with self._lock:
+            for a in range(0, n, batch):
+                X = rng.standard_normal((min(batch, n - a), dim), dtype=np.float32)
+                X /= np.linalg.norm(X, axis=1, keepdims=True)
+                self._append(user_id, [f"seed-{a + i}" for i in range(len(X))], X)
+
+    def add_many(self, user_id, ids, vectors, metas, full=None):
+        if not len(ids):
+            return
+        X = np.asarray(vectors, dtype=np.float32)
+        X /= np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            self.stats["adds"] += len(ids)
+            self._append(user_id, list(ids), X)
+
+    def query_many(self, vectors, user_id, top_k=10, full=None):
+        self.stats["queries"] += 1
+        u = self._users.get(user_id)
+        if not len(vectors) or u is None or not u[2]:
+            return {"ids": [[] for _ in vectors], "distances": [[] for _ in vectors]}
+        Q = np.asarray(vectors, dtype=np.float32)
+        Q /= np.maximum(np.linalg.norm(Q, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            M, ids, n = u[0][:u[2]], u[1], u[2]
+            S = Q @ M.T
+        k = min(top_k, n)
+        top = np.argpartition(-S, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(S, top, 1).argsort(axis=1)[:, ::-1]
+        top = np.take_along_axis(top, order, 1)
+        return {"ids": [[ids[j] for j in row] for row in top],
+                "distances": (1.0 - np.take_along_axis(S, top, 1)).tolist()}
+
+    def delete_many(self, user_id, ids):
+        pass   # benchmarks never delete
+
+    def count(self, user_id: str) -> int:
+        u = self._users.get(user_id)
+        return u[2] if u else 0
@@ -0,0 +1,297 @@
+# bulk_import.py — onboarding imports: NDJSON or a zip of notes, pipelined through the ingest stages
+import hashlib, json, os, queue, shutil, sqlite3, threading, time, uuid, zipfile
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from algo import (attach_links, batch_embed, chunk_raw_text, decide_links_batch, stamp_nodes,
+                  persist_nodes)
+from logs import log
+from metrics import ITEMS, STAGE_SECONDS
+
+BULK_DB = os.getenv("BULK_DB", "bulk_import.sqlite3")
+BULK_DIR = os.getenv("BULK_DIR", "bulk_uploads")                       # kept until the import completes
+BULK_CHUNK_CONCURRENCY = int(os.getenv("BULK_CHUNK_CONCURRENCY", "8"))  # entries being chunked at once
+BULK_BATCH_NODES = int(os.getenv("BULK_BATCH_NODES", "512"))           # nodes per embed / link / write round
+BULK_MAX_ITEM_BYTES = int(os.getenv("BULK_MAX_ITEM_BYTES", str(1 << 20)))
+NOTE_EXTS = (".txt", ".md", ".markdown")
+
+# node ids are derived from (import, item, position) so a re-run after a crash
+# overwrites what a half-written batch left instead of duplicating it
+NODE_NS = uuid.UUID("9ebdada1-dc1d-49b3-9662-8dcaab8a0108")
+
+# ────────────────────────────  INPUT  ──────────────────────────────────
+def _item(key: str, text: str, title: Optional[str] = None, tags=None, created_at: Optional[str] = None) -> Dict:
+    if not text.strip():
+        return {"key": key, "error": "empty"}
+    if len(text.encode("utf-8")) > BULK_MAX_ITEM_BYTES:
+        return {"key": key, "error": f"larger than {BULK_MAX_ITEM_BYTES} bytes"}
+    return {"key": key, "text": f"{title}\n\n{text}" if title else text,
+            "tags": [str(t) for t in tags or []], "created_at": created_at}
+
+def iter_ndjson(path: str) -> Iterator[Dict]:
+    """One entry per line: a JSON string, or {"text"|"content", "id"?, "title"?, "tags"?, "created_at"?}."""
+    with open(path, "rb") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError as exc:
+                yield {"key": f"line:{lineno}", "error": f"bad JSON: {exc}"}
+                continue
+            if isinstance(obj, str):
+                obj = {"text": obj}
+            if not isinstance(obj, dict):
+                yield {"key": f"line:{lineno}", "error": "expected an object or a string"}
+                continue
+            text = obj.get("text") or obj.get("content") or ""
+            if not isinstance(text, str):
+                yield {"key": f"line:{lineno}", "error": "text must be a string"}
+                continue
+            key = str(obj.get("id") or hashlib.sha256(text.encode("utf-8")).hexdigest()[:16])
+            yield _item(key, text, obj.get("title"), obj.get("tags"), obj.get("created_at"))
+
+def _is_note(info: zipfile.ZipInfo) -> bool:
+    name = info.filename
+    return (not info.is_dir() and name.lower().endswith(NOTE_EXTS)
+            and not name.startswith("__MACOSX/") and not os.path.basename(name).startswith("."))
+
+def iter_zip(path: str) -> Iterator[Dict]:
+    """.txt / .md files anywhere in the archive; the path inside it is the item key."""
+    with zipfile.ZipFile(path) as z:
+        for info in z.infolist():
+            if not _is_note(info):
+                continue
+            if info.file_size > BULK_MAX_ITEM_BYTES:
+                yield {"key": info.filename, "error": f"larger than {BULK_MAX_ITEM_BYTES} bytes"}
+                continue
+            yield _item(info.filename, z.read(info).decode("utf-8", errors="replace"))
+
+def iter_items(path: str) -> Iterator[Dict]:
+    return iter_zip(path) if zipfile.is_zipfile(path) else iter_ndjson(path)
+
+def count_items(path: str) -> int:
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as z:
+            return sum(map(_is_note, z.infolist()))
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+def save_upload(src: BinaryIO, import_id: str) -> str:
+    """Copies an upload under BULK_DIR so the import can resume after a restart."""
+    os.makedirs(BULK_DIR, exist_ok=True)
+    path = os.path.join(BULK_DIR, import_id)
+    if not os.path.exists(path):
+        tmp = f"{path}.part"
+        src.seek(0)
+        with open(tmp, "wb") as out:
+            shutil.copyfileobj(src, out, 1 << 20)
+        os.replace(tmp, path)
+    return path
+
+# ─────────────────────────  CHECKPOINTS  ───────────────────────────────
+class ImportLog:
+    """Per-item outcome of every import; items marked done are skipped on resume."""
+
+    def __init__(self, path: str = BULK_DB):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS bulk_imports ("
+            " import_id TEXT PRIMARY KEY, user_id TEXT, path TEXT, total INTEGER,"
+            " started_at REAL, finished_at REAL);"
+            "CREATE TABLE IF NOT EXISTS bulk_items ("
+            " import_id TEXT, item_key TEXT, status TEXT, nodes INTEGER, error TEXT, updated_at REAL,"
+            " PRIMARY KEY (import_id, item_key));"
+        )
+
+    def start(self, import_id: str, user_id: str, path: str, total: int) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO bulk_imports VALUES (?,?,?,?,?,NULL) ON CONFLICT(import_id) DO UPDATE SET"
+                " path=excluded.path, total=excluded.total, finished_at=NULL",
+                (import_id, user_id, path, total, time.time()),
+            )
+            self._db.commit()
+
+    def done_keys(self, import_id: str) -> Set[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT item_key FROM bulk_items WHERE import_id=? AND status='done'",
+                                    (import_id,)).fetchall()
+        return {r[0] for r in rows}
+
+    def record(self, import_id: str, rows: List[Tuple[str, str, int, Optional[str]]]) -> None:
+        """rows: (item_key, status, nodes, error); one commit per batch."""
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO bulk_items VALUES (?,?,?,?,?,?)",
+                [(import_id, k, st, n, err, now) for k, st, n, err in rows],
+            )
+            self._db.commit()
+
+    def finish(self, import_id: str) -> None:
+        with self._lock:
+            self._db.execute("UPDATE bulk_imports SET finished_at=? WHERE import_id=?", (time.time(), import_id))
+            self._db.commit()
+
+    def get(self, import_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute("SELECT user_id, path, total, started_at, finished_at FROM bulk_imports"
+                                   " WHERE import_id=?", (import_id,)).fetchone()
+            counts = self._db.execute("SELECT status, COUNT(*), COALESCE(SUM(nodes), 0) FROM bulk_items"
+                                      " WHERE import_id=? GROUP BY status", (import_id,)).fetchall()
+        if row is None:
+            return None
+        return {"import_id": import_id, **dict(zip(("user_id", "path", "total", "started_at", "finished_at"), row)),
+                "items": {st: n for st, n, _ in counts}, "nodes": sum(n for _, _, n in counts)}
+
+    def items(self, import_id: str, status: Optional[str] = None) -> List[Dict]:
+        q = "SELECT item_key, status, nodes, error FROM bulk_items WHERE import_id=?"
+        args: tuple = (import_id,)
+        if status:
+            q, args = q + " AND status=?", args + (status,)
+        with self._lock:
+            rows = self._db.execute(q + " ORDER BY updated_at, item_key", args).fetchall()
+        return [dict(zip(("key", "status", "nodes", "error"), r)) for r in rows]
+
+    def unfinished(self) -> List[Tuple[str, str, str]]:
+        with self._lock:
+            return self._db.execute("SELECT import_id, user_id, path FROM bulk_imports"
+                                    " WHERE finished_at IS NULL").fetchall()
+
+_import_log: Optional[ImportLog] = None
+_import_log_lock = threading.Lock()
+
+def get_import_log() -> ImportLog:
+    global _import_log
+    with _import_log_lock:
+        if _import_log is None:
+            _import_log = ImportLog()
+        return _import_log
+
+# ───────────────────────────  PIPELINE  ────────────────────────────────
+def _write_batch(user_id: str, batch: List[Tuple[Dict, List[Dict]]]) -> None:
+    """Embed, link and store the nodes of many entries as one unit."""
+    nodes = [n for _, ns in batch for n in ns]
+    if not nodes:
+        return
+    ids = [n["id"] for n in nodes]
+    with STAGE_SECONDS.time(stage="bulk_embed"):
+        vectors = batch_embed(nodes)   # packed into as few requests as the API allows
+    with STAGE_SECONDS.time(stage="bulk_link"):
+        attach_links(nodes, decide_links_batch(vectors, ids, user_id))
+    with STAGE_SECONDS.time(stage="bulk_write"):
+        # the next group links against this one through the vector index
+        persist_nodes(user_id, nodes, vectors, visible=True)
+    ITEMS.inc(len(nodes), kind="nodes")
+    ITEMS.inc(sum(len(n["related_ids"]) for n in nodes), kind="edges")
+
+def run_import(import_id: str, user_id: str, path: str,
+               publish: Optional[Callable[[str, Dict], None]] = None) -> Dict:
+    """
+    Streams the file's entries through the ingest stages:
+      • chunking runs BULK_CHUNK_CONCURRENCY entries at a time
+      • finished entries are grouped until BULK_BATCH_NODES nodes, then one
+        writer thread embeds / links / writes the whole group while the
+        next one is being chunked
+      • each group's items are checkpointed after its writes, so a rerun
+        (or a restart) skips them
+    """
+    publish = publish or (lambda stage, info: None)
+    ilog = get_import_log()
+    total = count_items(path)
+    ilog.start(import_id, user_id, path, total)
+    done = ilog.done_keys(import_id)
+    counts = Counter()
+    lock = threading.Lock()
+
+    def report(rows: List[Tuple[str, str, int, Optional[str]]], persist: bool = True) -> None:
+        if persist:
+            ilog.record(import_id, rows)
+        with lock:
+            for key, status, nodes, error in rows:
+                counts[status] += 1
+                counts["nodes"] += nodes
+                publish("item", {"key": key, "status": status, "nodes": nodes, "error": error,
+                                 "processed": counts["done"] + counts["failed"] + counts["skipped"], "total": total})
+
+    # ── writer: one group in flight while the next is chunked ──────
+    groups: "queue.Queue" = queue.Queue(maxsize=1)
+
+    def writer() -> None:
+        while True:
+            batch = groups.get()
+            if batch is None:
+                return
+            try:
+                _write_batch(user_id, batch)
+            except Exception as exc:
+                log("BULK", f"import={import_id} batch of {len(batch)} failed: {exc}")
+                report([(item["key"], "failed", 0, str(exc)) for item, _ in batch])
+                continue
+            report([(item["key"], "done", len(nodes), None) for item, nodes in batch])
+
+    def chunk(item: Dict) -> List[Dict]:
+        nodes = chunk_raw_text(item["text"])
+        ids = [str(uuid.uuid5(NODE_NS, f"{import_id}:{item['key']}:{i}")) for i in range(len(nodes))]
+        stamp_nodes(nodes, item["text"], user_id, item["created_at"], ids)
+        for n in nodes:
+            n["tags"] = list(dict.fromkeys((n.get("tags") or []) + item["tags"]))
+        return nodes
+
+    wt = threading.Thread(target=writer, name=f"bulk-write-{import_id[:8]}", daemon=True)
+    wt.start()
+    pending: List[Tuple[Dict, List[Dict]]] = []
+    pending_nodes = 0
+
+    def collect(item: Dict, fut) -> None:
+        nonlocal pending, pending_nodes
+        try:
+            nodes = fut.result()
+        except Exception as exc:
+            report([(item["key"], "failed", 0, f"chunking: {exc}")])
+            return
+        pending.append((item, nodes))
+        pending_nodes += len(nodes)
+        if pending_nodes >= BULK_BATCH_NODES:
+            groups.put(pending)
+            pending, pending_nodes = [], 0
+
+    seen: Set[str] = set()
+    t0 = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=BULK_CHUNK_CONCURRENCY, thread_name_prefix="bulk-chunk") as pool:
+            window: deque = deque()   # chunk futures, collected in file order
+            for item in iter_items(path):
+                key = item["key"]
+                if key in done or key in seen:
+                    # already imported (earlier run / repeated in the file): keep its stored row
+                    report([(key, "skipped", 0, None)], persist=False)
+                    continue
+                seen.add(key)
+                if "error" in item:
+                    report([(key, "failed", 0, item["error"])])
+                    continue
+                window.append((item, pool.submit(chunk, item)))
+                if len(window) >= 2 * BULK_CHUNK_CONCURRENCY:
+                    collect(*window.popleft())
+            while window:
+                collect(*window.popleft())
+        if pending:
+            groups.put(pending)
+    finally:
+        groups.put(None)
+        wt.join()
+
+    ilog.finish(import_id)
+    if not counts["failed"]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    out = {"import_id": import_id, "total": total, "done": counts["done"], "failed": counts["failed"],
+           "skipped": counts["skipped"], "nodes": counts["nodes"]}
+    log("BULK", f"import={import_id} user={user_id} {out} in {time.perf_counter() - t0:.1f}s")
+    return out
@@ -0,0 +1,150 @@
+# dedupe.py — offline near-duplicate merging over a user's whole graph
+import os, tempfile
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from algo import MERGE_T, batch_embed, content_hash, embed_model_key, embed_text, merge_thoughts, vector_meta
+from embed_cache import get_cache
+from embed_repr import reduce
+from graph_store import fetch_nodes, get_driver, merge_nodes, scan_nodes
+from logs import log
+from metrics import ITEMS, STAGE_SECONDS
+from outbox import fence
+from relink import RELINK_BATCH
+from vector_store import add_many, delete_many
+
+# rows per similarity tile: peak extra memory is DEDUPE_BLOCK² float32s (16 MB at 2048)
+DEDUPE_BLOCK = int(os.getenv("DEDUPE_BLOCK", "2048"))
+DEDUPE_WRITE = int(os.getenv("DEDUPE_WRITE", "200"))   # clusters per merge tx
+
+# ────────────────────────────  SCAN  ───────────────────────────────────
+def spill_vectors(user_id: str, driver, path: str, batch: int = RELINK_BATCH) -> Tuple[List[str], np.ndarray]:
+    """
+    Every node id of the user (id order) and its unit-length full-width
+    embedding, written page by page to `path` and memory-mapped back, so
+    only one page is ever in memory. Not the reduced index vector: cosine
+    over a Matryoshka prefix runs high, and at MERGE_T that merges nodes
+    that only look alike. Embeddings are read from the cache only; a node
+    whose vector was evicted is skipped rather than re-embedded.
+    """
+    ids: List[str] = []
+    after, dim, skipped = "", 0, 0
+    with open(path, "wb") as f:
+        while True:
+            page = scan_nodes(driver, user_id, after, batch)
+            if not page:
+                break
+            after = page[-1]["id"]
+            for n in page:
+                n["tags"] = n.get("tags") or []
+            found = get_cache().get_many(embed_model_key(), [embed_text(n) for n in page])
+            skipped += len(page) - len(found)
+            if not found:
+                continue
+            rows = sorted(found)
+            V = reduce([found[i] for i in rows], dims=0)   # dims=0: normalize only
+            dim = dim or V.shape[1]
+            f.write(np.ascontiguousarray(V, dtype=np.float32).tobytes())
+            ids += [page[i]["id"] for i in rows]
+    if skipped:
+        # a full relink embeds them again, and the next pass compares them
+        log("MERGE", f"user={user_id}: skipped {skipped} nodes with no cached embedding")
+    if not ids:
+        return ids, np.zeros((0, 0), dtype=np.float32)
+    return ids, np.memmap(path, np.float32, "r", shape=(len(ids), dim))
+
+def similar_pairs(U: np.ndarray, merge_t: float = MERGE_T, block: int = DEDUPE_BLOCK) -> Iterator[Tuple[int, int]]:
+    """(i, j), i < j, with cosine ≥ merge_t; compares block×block tiles of the upper triangle."""
+    n = len(U)
+    for a in range(0, n, block):
+        A = np.asarray(U[a:a + block])
+        for b in range(a, n, block):
+            S = A @ np.asarray(U[b:b + block]).T
+            if a == b:
+                S = np.triu(S, 1)
+            ii, jj = np.nonzero(S >= merge_t)
+            yield from zip((ii + a).tolist(), (jj + b).tolist())
+
+def clusters(n: int, pairs: Iterator[Tuple[int, int]]) -> List[List[int]]:
+    """
+    Complete-linkage groups of size > 1: every two members are ≥ merge_t.
+    The node with the most duplicates seeds a group, and each free
+    neighbour joins only if it is similar to every member already in it,
+    so A~B and B~C never fold A and C together unless A~C too.
+    """
+    adj: Dict[int, set] = {}
+    for i, j in pairs:
+        adj.setdefault(i, set()).add(j)
+        adj.setdefault(j, set()).add(i)
+    taken = [False] * n
+    out = []
+    for c in sorted(adj, key=lambda i: (-len(adj[i]), i)):
+        if taken[c]:
+            continue
+        members = [c]
+        for j in sorted(adj[c], key=lambda i: (-len(adj[i]), i)):
+            if not taken[j] and all(m in adj[j] for m in members[1:]):
+                members.append(j)
+        if len(members) > 1:
+            for j in members:
+                taken[j] = True
+            out.append(members)
+    return out
+
+# ────────────────────────────  MERGE  ──────────────────────────────────
+def _apply(user_id: str, driver, groups: List[List[Dict]]) -> int:
+    """Merges each group into its oldest node: graph first, then the index."""
+    now = datetime.now(timezone.utc).isoformat()
+    rows, kept = [], []
+    for group in groups:
+        group = sorted(group, key=lambda n: (n.get("created_at") or "", n["id"]))
+        keep, drop = group[0], group[1:]
+        props = merge_thoughts(keep, drop, now)
+        props["content_hash"] = content_hash({**keep, **props})
+        rows.append({"keep": keep["id"], "drop": [n["id"] for n in drop], "props": props})
+        kept.append({**keep, **props})
+    dropped = [i for r in rows for i in r["drop"]]
+    fence(user_id, [r["keep"] for r in rows])
+    fence(user_id, dropped, gone=True)
+    merge_nodes(driver, user_id, rows)
+    V = batch_embed(kept)
+    add_many(user_id, [n["id"] for n in kept], reduce(V).tolist(), [vector_meta(n) for n in kept], full=V)
+    delete_many(user_id, dropped)
+    return len(dropped)
+
+def dedupe_user(user_id: str, publish: Optional[Callable[[str, Dict], None]] = None,
+                driver=None, merge_t: float = MERGE_T, block: int = DEDUPE_BLOCK) -> Dict:
+    """
+    Finds groups of the user's nodes that are pairwise ≥ merge_t and
+    folds each into its oldest member (kept id, merged
+    title/content/tags, edges re-pointed, duplicates deleted).
+    Safe to re-run: a later pass merges pairs a group left out and what
+    new merged text brings together.
+    """
+    driver = driver or get_driver(user_id)
+    publish = publish or (lambda stage, info: None)
+    with tempfile.TemporaryDirectory(prefix="dedupe-") as tmp:
+        with STAGE_SECONDS.time(stage="dedupe_scan"):
+            ids, U = spill_vectors(user_id, driver, os.path.join(tmp, "vectors.f32"))
+        publish("scanned", {"nodes": len(ids)})
+        with STAGE_SECONDS.time(stage="dedupe_compare"):
+            groups = [[ids[i] for i in g] for g in clusters(len(ids), similar_pairs(U, merge_t, block))]
+        del U   # unmap before the directory goes
+    publish("compared", {"clusters": len(groups)})
+
+    merged = 0
+    with STAGE_SECONDS.time(stage="dedupe_write"):
+        for i in range(0, len(groups), DEDUPE_WRITE):
+            chunk = groups[i:i + DEDUPE_WRITE]
+            # full nodes only for what merges; one may have been deleted since the scan
+            byid = {n["id"]: {**n, "tags": n.get("tags") or []}
+                    for n in fetch_nodes(driver, user_id, [x for g in chunk for x in g])}
+            live = [g for g in ([byid[x] for x in g if x in byid] for g in chunk) if len(g) > 1]
+            if live:
+                merged += _apply(user_id, driver, live)
+            publish("merged", {"merged": merged})
+    ITEMS.inc(merged, kind="merged_nodes")
+    log("MERGE", f"user={user_id} nodes={len(ids)} clusters={len(groups)} merged={merged}")
+    return {"nodes": len(ids), "clusters": len(groups), "merged": merged}
@@ -0,0 +1,140 @@
+# embed_cache.py — content-addressed embedding cache (LRU in memory + SQLite on disk)
+import hashlib, os, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from metrics import collected
+
+CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "embed_cache.sqlite3")
+MEM_ITEMS = int(os.getenv("EMBED_CACHE_MEM_ITEMS", "2048"))
+DISK_ITEMS = int(os.getenv("EMBED_CACHE_DISK_ITEMS", "200000"))
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Two tiers keyed by sha256(model, text):
+      • in-process LRU (OrderedDict)       – MEM_ITEMS entries
+      • SQLite table of float32 blobs      – DISK_ITEMS entries, LRU by last_used
+    """
+
+    def __init__(self, path: str = CACHE_PATH, mem_items: int = MEM_ITEMS, disk_items: int = DISK_ITEMS):
+        self.mem_items, self.disk_items = mem_items, disk_items
+        self._mem: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"mem_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, model TEXT, dim INTEGER, vec BLOB, last_used REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings(last_used)")
+        self._db.commit()
+
+    # ── memory tier ────────────────────────────────────────────────
+    def _mem_put(self, key: str, vec: List[float]) -> None:
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.mem_items:
+            self._mem.popitem(last=False)
+
+    # ── lookups ────────────────────────────────────────────────────
+    def get_many(self, model: str, texts: List[str]) -> Dict[int, List[float]]:
+        """Returns {index: vector} for every text that is cached."""
+        keys = [cache_key(model, t) for t in texts]
+        found: Dict[int, List[float]] = {}
+        with self._lock:
+            cold = []
+            for i, k in enumerate(keys):
+                if k in self._mem:
+                    self._mem.move_to_end(k)
+                    found[i] = self._mem[k]
+                    self.stats["mem_hits"] += 1
+                else:
+                    cold.append(i)
+            if cold:
+                wanted = {keys[i] for i in cold}
+                marks = ",".join("?" * len(wanted))
+                rows = dict(self._db.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({marks})", list(wanted)
+                ).fetchall())
+                for i in cold:
+                    blob = rows.get(keys[i])
+                    if blob is None:
+                        self.stats["misses"] += 1
+                        continue
+                    vec = np.frombuffer(blob, dtype=np.float32).tolist()
+                    self._mem_put(keys[i], vec)
+                    found[i] = vec
+                    self.stats["disk_hits"] += 1
+                if rows:
+                    self._db.executemany(
+                        "UPDATE embeddings SET last_used=? WHERE key=?",
+                        [(time.time(), k) for k in rows],
+                    )
+                    self._db.commit()
+        return found
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]) -> None:
+        now = time.time()
+        rows = []
+        with self._lock:
+            for t, v in zip(texts, vectors):
+                k = cache_key(model, t)
+                self._mem_put(k, list(v))
+                rows.append((k, model, len(v), np.asarray(v, dtype=np.float32).tobytes(), now))
+            self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?,?,?,?,?)", rows)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        (n,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        extra = n - self.disk_items
+        if extra > 0:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (extra,)
+            )
+            self.stats["evictions"] += extra
+
+    # ── read-through helper ────────────────────────────────────────
+    def embed(self, model: str, texts: List[str],
+              fetch: Callable[[List[str]], List[List[float]]]) -> Tuple[List[List[float]], int]:
+        """
+        Serve hits from cache, call fetch() once with only the misses,
+        merge results back in input order. Returns (vectors, n_misses).
+        """
+        found = self.get_many(model, texts)
+        # identical texts inside one batch are fetched once
+        miss_texts = list(dict.fromkeys(t for i, t in enumerate(texts) if i not in found))
+        if miss_texts:
+            fresh = dict(zip(miss_texts, fetch(miss_texts)))
+            self.put_many(model, miss_texts, [fresh[t] for t in miss_texts])
+            for i, t in enumerate(texts):
+                if i not in found:
+                    found[i] = fresh[t]
+        return [found[i] for i in range(len(texts))], len(miss_texts)
+
+    def hit_rate(self) -> float:
+        hits = self.stats["mem_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> EmbeddingCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
+
+collected("mindmap_embed_cache_events_total", "Embedding cache lookups / evictions",
+          lambda: [((k,), v) for k, v in _cache.stats.items()], kind="counter", labels=["event"])
+collected("mindmap_embed_cache_hit_ratio", "Embedding cache hit ratio since start",
+          lambda: [((), _cache.hit_rate())])
@@ -0,0 +1,23 @@
+# embed_repr.py — Matryoshka dimension reduction for indexed embeddings
+import os
+from typing import List, Optional
+
+import numpy as np
+
+EMBED_DIMS = int(os.getenv("EMBED_DIMS", "0"))                  # 0 = model's native width
+EMBED_DIMS_MODE = os.getenv("EMBED_DIMS_MODE", "truncate")      # truncate | api
+
+def api_dims() -> Optional[int]:
+    """`dimensions=` to send with the embeddings request, if the API does the reduction."""
+    return EMBED_DIMS if EMBED_DIMS and EMBED_DIMS_MODE == "api" else None
+
+def reduce(vectors: List[List[float]], dims: int = EMBED_DIMS) -> np.ndarray:
+    """
+    text-embedding-3-* vectors are Matryoshka-trained: the leading dims
+    carry most of the signal, so a prefix renormalized to unit length is a
+    usable embedding on its own (this is what `dimensions=` does server-side).
+    """
+    V = np.asarray(vectors, dtype=np.float32)
+    if dims and dims < V.shape[-1]:
+        V = V[..., :dims]
+    return V / np.maximum(np.linalg.norm(V, axis=-1, keepdims=True), 1e-12)
@@ -0,0 +1,546 @@
+# graph_store.py — batched Neo4j writes for thought nodes
+import base64, json, os, threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from resources import resource
+from shards import SHARD_SECONDS, get_shard_map, sharded
+
+# shard → Neo4j database, e.g. "s1=graph1,s2=graph2" (multi-database servers);
+# unlisted shards use the server's default database, where user_id scoping still applies
+NEO4J_SHARD_DATABASES = dict(
+    kv.split("=", 1) for kv in (x.strip() for x in os.getenv("NEO4J_SHARD_DATABASES", "").split(",")) if "=" in kv
+)
+
+# ───────────────────────────  CYPHER  ──────────────────────────────────
+SCHEMA_QUERIES = [
+    "CREATE CONSTRAINT thought_id IF NOT EXISTS "
+    "FOR (t:Thought) REQUIRE t.id IS UNIQUE",
+    # backs user-scoped paging / incremental sync in fetch_page
+    "CREATE INDEX thought_user_updated IF NOT EXISTS "
+    "FOR (t:Thought) ON (t.user_id, t.updated_at)",
+    "CREATE CONSTRAINT graph_version_user IF NOT EXISTS "
+    "FOR (v:GraphVersion) REQUIRE v.user_id IS UNIQUE",
+]
+
+NODES_CYPHER = """
+UNWIND $rows AS row
+MERGE (t:Thought {id: row.id})
+SET t += row
+"""
+
+# RELATED_TO is stored both ways; r.by lists the end(s) whose own top-k chose the edge, and the
+# edge lives while either end still does. Edges from before r.by count as chosen by both ends.
+def _owners(r: str) -> str:
+    return f"coalesce({r}.by, [startNode({r}).id, endNode({r}).id])"
+
+def _claim(r: str, src: str) -> str:
+    """ON CREATE / ON MATCH clauses for a MERGEd edge: `src` chose it."""
+    return f"ON CREATE SET {r}.by = [{src}] ON MATCH SET {r}.by = [x IN {_owners(r)} WHERE x <> {src}] + {src}"
+
+# similarity is symmetric, so the older node learns about the newer one too
+EDGES_CYPHER = f"""
+UNWIND $rows AS row
+MATCH (a:Thought {{id: row.src}}), (b:Thought {{id: row.dst}})
+MERGE (a)-[r:RELATED_TO]->(b) {_claim("r", "a.id")}
+MERGE (b)-[s:RELATED_TO]->(a) {_claim("s", "a.id")}
+SET b.related_ids = CASE WHEN a.id IN coalesce(b.related_ids, []) THEN b.related_ids
+                         ELSE coalesce(b.related_ids, []) + a.id END
+"""
+
+PAGE_CYPHER = """
+MATCH (t:Thought)
+WHERE t.user_id = $user_id
+  AND ($since IS NULL OR t.updated_at > $since)
+  AND ($after_ts IS NULL OR t.updated_at > $after_ts
+       OR (t.updated_at = $after_ts AND t.id > $after_id))
+WITH t ORDER BY t.updated_at, t.id LIMIT $limit
+RETURN {projection} AS node
+"""
+
+# ── re-linking (relink.py) ─────────────────────────────────────────
+LINK_FIELDS = ("t{.id, .user_id, .title, .content, .tags, .content_hash, .origin_input, .created_at, .updated_at,"
+               " .history_titles, .related_ids}")
+
+NODES_BY_ID_CYPHER = f"""
+MATCH (t:Thought) WHERE t.user_id = $user_id AND t.id IN $ids
+RETURN {LINK_FIELDS} AS node
+"""
+
+DIRTY_CYPHER = f"""
+MATCH (t:Thought) WHERE t.user_id = $user_id AND t.dirty = true
+RETURN {LINK_FIELDS} AS node LIMIT $limit
+"""
+
+SCAN_CYPHER = f"""
+MATCH (t:Thought) WHERE t.user_id = $user_id AND t.id > $after
+WITH t ORDER BY t.id LIMIT $limit
+RETURN {LINK_FIELDS} AS node
+"""
+
+EDIT_CYPHER = """
+MATCH (t:Thought {id: $id}) WHERE t.user_id = $user_id
+SET t.history_titles = CASE WHEN $title IS NULL OR $title = t.title THEN coalesce(t.history_titles, [])
+                            ELSE coalesce(t.history_titles, []) + t.title END,
+    t.title = coalesce($title, t.title),
+    t.content = coalesce($content, t.content),
+    t.tags = coalesce($tags, t.tags),
+    t.updated_at = $now,
+    t.dirty = true
+RETURN properties(t) AS node
+"""
+
+DELETE_CYPHER = """
+MATCH (t:Thought {id: $id}) WHERE t.user_id = $user_id
+OPTIONAL MATCH (t)-[:RELATED_TO]-(o:Thought)
+WITH t, collect(DISTINCT o) AS nbrs
+FOREACH (o IN nbrs | SET o.related_ids = [x IN coalesce(o.related_ids, []) WHERE x <> $id])
+DETACH DELETE t
+RETURN [o IN nbrs | o.id] AS neighbours
+"""
+
+# the relinked nodes withdraw their claim on every edge they touch; an edge nobody else chose
+# goes, remembering who was on its ends. Each directed edge is handled once (DISTINCT r), and a
+# batch withdraws all of its ids at once, so an edge between two members is dropped by both
+UNLINK_CYPHER = f"""
+UNWIND $ids AS id
+MATCH (:Thought {{id: id}})-[r:RELATED_TO]-(:Thought)
+WITH DISTINCT r
+WITH r, startNode(r) AS a, endNode(r) AS b, [x IN {_owners("r")} WHERE NOT x IN $ids] AS by
+FOREACH (_ IN CASE WHEN by = [] THEN [] ELSE [1] END | SET r.by = by)
+FOREACH (_ IN CASE WHEN by = [] THEN [1] ELSE [] END | DELETE r)
+RETURN collect(CASE WHEN by = [] THEN a.id END) + collect(CASE WHEN by = [] THEN b.id END) AS old
+"""
+
+RELINK_CYPHER = f"""
+UNWIND $rows AS row
+MATCH (a:Thought {{id: row.src}}), (b:Thought {{id: row.dst}})
+MERGE (a)-[r:RELATED_TO]->(b) {_claim("r", "a.id")}
+MERGE (b)-[s:RELATED_TO]->(a) {_claim("s", "a.id")}
+"""
+
+REFRESH_CYPHER = """
+UNWIND $ids AS id
+MATCH (t:Thought {id: id})
+SET t.related_ids = [(t)-[:RELATED_TO]->(o:Thought) | o.id]
+"""
+
+SETTLE_CYPHER = """
+UNWIND $rows AS row
+MATCH (t:Thought {id: row.id})
+SET t.dirty = false, t.content_hash = row.content_hash
+"""
+
+# ── sharding (rebalance.py) ────────────────────────────────────────
+HAS_USER_CYPHER = "MATCH (t:Thought) WHERE t.user_id = $user_id RETURN t.id AS id LIMIT 1"
+
+PURGE_CYPHER = """
+MATCH (t:Thought) WHERE t.user_id = $user_id
+WITH t LIMIT $limit
+DETACH DELETE t
+RETURN count(*) AS n
+"""
+
+DELETE_IDS_CYPHER = """
+UNWIND $ids AS id
+MATCH (t:Thought {id: id}) WHERE t.user_id = $user_id
+DETACH DELETE t
+"""
+
+# ── versions: one counter per user, next to the graph it describes ──
+# a clock value, not +1, so a shard the user moves to never reissues an older version number
+VERSION_BUMP_CYPHER = """
+UNWIND $user_ids AS uid
+MERGE (v:GraphVersion {user_id: uid})
+SET v.v = CASE WHEN coalesce(v.v, 0) < timestamp() THEN timestamp() ELSE v.v + 1 END
+"""
+
+VERSION_CYPHER = "MATCH (v:GraphVersion {user_id: $user_id}) RETURN v.v AS v"
+
+# ── snapshots (snapshot.py): restore never overwrites a node that exists ──
+USERS_CYPHER = "MATCH (t:Thought) RETURN DISTINCT t.user_id AS user_id ORDER BY user_id"
+
+ALL_NODES_CYPHER = "MATCH (t:Thought) RETURN t{.*} AS node ORDER BY t.user_id, t.id"
+
+RESTORE_NODES_CYPHER = """
+UNWIND $rows AS row
+MERGE (t:Thought {id: row.id})
+ON CREATE SET t += row
+"""
+
+# ── layout (layout.py): the whole graph, ids and edges only ───────
+GRAPH_CYPHER = """
+MATCH (t:Thought) WHERE t.user_id = $user_id
+RETURN t.id AS id, t.title AS title, t.tags AS tags,
+       [(t)-[:RELATED_TO]->(o:Thought) | o.id] AS links
+"""
+
+# ── merging (dedupe.py): each dropped node's edges move to the kept one, then it goes ──
+MERGE_CYPHER = """
+UNWIND $rows AS row
+MATCH (k:Thought {id: row.keep}) WHERE k.user_id = $user_id
+SET k += row.props
+WITH k, row
+UNWIND row.drop AS did
+MATCH (d:Thought {id: did}) WHERE d.user_id = $user_id
+OPTIONAL MATCH (d)-[:RELATED_TO]-(o:Thought) WHERE o <> k AND NOT o.id IN row.drop
+WITH k, d, collect(DISTINCT o) AS nbrs
+FOREACH (o IN nbrs | MERGE (k)-[:RELATED_TO]->(o) MERGE (o)-[:RELATED_TO]->(k))
+DETACH DELETE d
+RETURN k.id AS keep, [o IN nbrs | o.id] AS touched
+"""
+
+# ── search (search.py): seeds + k hops, their edges, in one read ──
+# each seed keeps its per_seed nearest neighbours; `via` lists every (seed, hops) that reached a node
+NEIGHBOURHOOD_CYPHER = """
+UNWIND $seeds AS seed
+MATCH (s:Thought {{id: seed}}) WHERE s.user_id = $user_id
+{expand}
+UNWIND [{{id: s.id, hop: 0}}] + near AS r
+WITH r.id AS id, collect({{seed: s.id, hop: r.hop}}) AS via
+WITH collect({{id: id, via: via}}) AS found
+WITH found, [f IN found | f.id] AS ids
+UNWIND found AS f
+MATCH (t:Thought {{id: f.id}})
+OPTIONAL MATCH (t)-[:RELATED_TO]->(u:Thought) WHERE u.id IN ids
+RETURN t{{.id, .title, .tags, .created_at, .updated_at, snippet: left(coalesce(t.content, ''), $snippet)}} AS node,
+       f.via AS via, collect(u.id) AS links
+"""
+
+EXPAND_CYPHER = """
+CALL {{
+  WITH s
+  MATCH p = (s)-[:RELATED_TO*1..{hops}]->(n:Thought)
+  WHERE n.user_id = $user_id AND n <> s
+  WITH n, min(length(p)) AS hop
+  ORDER BY hop LIMIT $per_seed
+  RETURN collect({{id: n.id, hop: hop}}) AS near
+}}
+"""
+
+# rows per UNWIND statement; keeps single parameter payloads reasonable
+WRITE_BATCH = 2000
+
+# ───────────────────────────  SCHEMA  ──────────────────────────────────
+def ensure_schema(driver, database: Optional[str] = None) -> None:
+    """Create the :Thought(id) uniqueness constraint (backs every MERGE)."""
+    with driver.session(**({"database": database} if database else {})) as s:
+        for q in SCHEMA_QUERIES:
+            s.run(q).consume()
+
+# ───────────────────────────  DRIVER  ──────────────────────────────────
+def _connect():
+    from neo4j import GraphDatabase, basic_auth   # ~0.2 s of imports, paid on first use
+    driver = GraphDatabase.driver(
+        os.getenv("NEO4J_URI"),
+        auth=basic_auth(os.getenv("NEO4J_USER"), os.getenv("NEO4J_PASSWORD")),
+    )
+    try:
+        ensure_schema(driver)   # also proves the server is reachable
+    except Exception:
+        driver.close()
+        raise
+    return driver
+
+DRIVER = resource("neo4j", _connect, close=lambda d: d.close(), check=lambda d: d.verify_connectivity())
+
+def get_driver(user_id: Optional[str] = None):
+    """The driver; with SHARDS set and a user given, one routed to that user's shard(s)."""
+    if user_id is None or not sharded():
+        return DRIVER.get()
+    m = get_shard_map()
+    return ShardDriver(DRIVER.get(), m.read_shard(user_id), m.write_shards(user_id))
+
+def shard_driver(shard: str):
+    """A driver bound to one shard, whoever the user (moves, stats)."""
+    return ShardDriver(DRIVER.get(), shard, (shard,))
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+class ShardDriver:
+    """
+    Sessions whose reads run on the read shard's database and whose write
+    transactions run on every write shard's database in turn (source
+    first, so the caller gets the source's result). Shards that share a
+    database are written once.
+    """
+
+    def __init__(self, driver, read: str, writes: Tuple[str, ...]):
+        self.driver = driver
+        self.read = (read, NEO4J_SHARD_DATABASES.get(read))
+        self.writes = list({NEO4J_SHARD_DATABASES.get(w): (w, NEO4J_SHARD_DATABASES.get(w)) for w in writes}.values())
+        for _, db in [self.read] + self.writes:
+            if db and db not in _schema_ready:
+                with _schema_lock:
+                    if db not in _schema_ready:
+                        ensure_schema(driver, db)
+                        _schema_ready.add(db)
+
+    def session(self, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def _session(self, db: Optional[str]):
+        return self.driver.session(**({"database": db} if db else {}))
+
+    def execute_read(self, fn, *args, **kwargs):
+        shard, db = self.read
+        with SHARD_SECONDS.time(shard=shard, store="neo4j", op="read"), self._session(db) as s:
+            return s.execute_read(fn, *args, **kwargs)
+
+    def execute_write(self, fn, *args, **kwargs):
+        out = []
+        for shard, db in self.writes:
+            with SHARD_SECONDS.time(shard=shard, store="neo4j", op="write"), self._session(db) as s:
+                out.append(s.execute_write(fn, *args, **kwargs))
+        return out[0]
+
+# ───────────────────────────  READS  ───────────────────────────────────
+def encode_cursor(updated_at: str, node_id: str) -> str:
+    raw = json.dumps([updated_at, node_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        ts, nid = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return ts, nid
+    except Exception as exc:
+        raise ValueError("invalid cursor") from exc
+
+def fetch_page(driver, user_id: str, fields: List[str], limit: int = 200,
+               cursor: Optional[str] = None, updated_since: Optional[str] = None) -> Dict:
+    """
+    One page of a user's thoughts ordered by (updated_at, id).
+    `fields` must already be whitelisted – they're spliced into the
+    RETURN map so unwanted properties never leave the database.
+    """
+    after_ts, after_id = decode_cursor(cursor) if cursor else (None, None)
+    cols = list(dict.fromkeys(["id", "updated_at", *fields]))
+    projection = "{" + ", ".join(f"{f}: t.{f}" for f in cols) + "}"
+    with driver.session() as s:
+        rows = s.execute_read(
+            lambda tx: tx.run(
+                PAGE_CYPHER.format(projection=projection),
+                user_id=user_id, since=updated_since, limit=limit,
+                after_ts=after_ts, after_id=after_id,
+            ).data()
+        )
+    items = [r["node"] for r in rows]
+    nxt = encode_cursor(items[-1]["updated_at"], items[-1]["id"]) if len(items) == limit else None
+    return {"items": items, "next_cursor": nxt}
+
+# ───────────────────────────  WRITES  ──────────────────────────────────
+def edge_rows(nodes: Iterable[Dict]) -> List[Dict]:
+    return [
+        {"src": n["id"], "dst": rid}
+        for n in nodes
+        for rid in n.get("related_ids", [])
+    ]
+
+def _chunks(rows: List[Dict], size: int):
+    for i in range(0, len(rows), size):
+        yield rows[i : i + size]
+
+def _write_tx(tx, nodes: List[Dict], edges: List[Dict], batch: int) -> None:
+    # nodes first so edges between members of the same batch can MATCH
+    for rows in _chunks(nodes, batch):
+        tx.run(NODES_CYPHER, rows=rows).consume()
+    for rows in _chunks(edges, batch):
+        tx.run(EDGES_CYPHER, rows=rows).consume()
+    _bump_tx(tx, {n["user_id"] for n in nodes})
+
+def write_thoughts(driver, nodes: List[Dict], batch: int = WRITE_BATCH) -> int:
+    """
+    Persist all nodes and their RELATED_TO edges in ONE managed write
+    transaction. Returns the number of edge rows sent.
+    """
+    if not nodes:
+        return 0
+    edges = edge_rows(nodes)
+    with driver.session() as s:
+        s.execute_write(_write_tx, nodes, edges, batch)
+    return len(edges)
+
+# ───────────────────────────  VERSIONS  ────────────────────────────────
+# per-user change counter, stored in Neo4j so every API worker sees the same
+# one; every write through this module bumps it, so caches keyed on it
+# (search.py, layout.py) never serve a graph that has since changed.
+def _bump_tx(tx, user_ids: Iterable[str]) -> None:
+    tx.run(VERSION_BUMP_CYPHER, user_ids=sorted(user_ids)).consume()
+
+def bump_version(user_id: str, driver=None) -> None:
+    with (driver or get_driver(user_id)).session() as s:
+        s.execute_write(_bump_tx, [user_id])
+
+def graph_version(user_id: str, driver=None) -> int:
+    with (driver or get_driver(user_id)).session() as s:
+        rows = s.execute_read(lambda tx: tx.run(VERSION_CYPHER, user_id=user_id).data())
+    return (rows[0]["v"] or 0) if rows else 0
+
+# ───────────────────────────  RE-LINKING  ──────────────────────────────
+def _nodes(driver, query: str, **params) -> List[Dict]:
+    with driver.session() as s:
+        return [r["node"] for r in s.execute_read(lambda tx: tx.run(query, **params).data())]
+
+def fetch_nodes(driver, user_id: str, ids: List[str]) -> List[Dict]:
+    return _nodes(driver, NODES_BY_ID_CYPHER, user_id=user_id, ids=list(ids))
+
+def fetch_dirty(driver, user_id: str, limit: int) -> List[Dict]:
+    return _nodes(driver, DIRTY_CYPHER, user_id=user_id, limit=limit)
+
+def scan_nodes(driver, user_id: str, after: str, limit: int) -> List[Dict]:
+    """A user's nodes in id order after `after` (checkpointable full scan)."""
+    return _nodes(driver, SCAN_CYPHER, user_id=user_id, after=after, limit=limit)
+
+def fetch_graph(driver, user_id: str) -> List[Dict]:
+    """Every node of the user as {id, title, tags, links} in ONE read."""
+    with driver.session() as s:
+        return s.execute_read(lambda tx: tx.run(GRAPH_CYPHER, user_id=user_id).data())
+
+def edit_thought(driver, user_id: str, node_id: str, now: str, title: Optional[str] = None,
+                 content: Optional[str] = None, tags: Optional[List[str]] = None) -> Optional[Dict]:
+    """Applies an edit and marks the node dirty; a changed title goes to history_titles."""
+    with driver.session() as s:
+        rows = s.execute_write(lambda tx: tx.run(
+            EDIT_CYPHER, id=node_id, user_id=user_id, now=now, title=title, content=content, tags=tags,
+        ).data())
+    bump_version(user_id, driver)
+    return rows[0]["node"] if rows else None
+
+def delete_thought(driver, user_id: str, node_id: str) -> Optional[List[str]]:
+    """Removes the node and its edges; returns former neighbours, None if not found."""
+    with driver.session() as s:
+        rows = s.execute_write(lambda tx: tx.run(DELETE_CYPHER, id=node_id, user_id=user_id).data())
+    bump_version(user_id, driver)
+    return rows[0]["neighbours"] if rows else None
+
+def _relink_tx(tx, ids: List[str], edges: List[Dict], settle: List[Dict], batch: int) -> List[str]:
+    old = set()
+    for chunk in _chunks(ids, batch):
+        for r in tx.run(UNLINK_CYPHER, ids=chunk).data():
+            old.update(r["old"])
+    for rows in _chunks(edges, batch):
+        tx.run(RELINK_CYPHER, rows=rows).consume()
+    touched = sorted(old | set(ids) | {e["dst"] for e in edges})
+    for chunk in _chunks(touched, batch):
+        tx.run(REFRESH_CYPHER, ids=chunk).consume()
+    for rows in _chunks(settle, batch):
+        tx.run(SETTLE_CYPHER, rows=rows).consume()
+    return touched
+
+def replace_links(driver, links: Dict[str, List[str]], hashes: Dict[str, str],
+                  batch: int = WRITE_BATCH) -> List[str]:
+    """
+    In ONE write tx: every key of `links` drops its claim on the edges it
+    touches and claims edges (both directions) to its new neighbours; an
+    edge another node chose survives, so relinking in any order, any
+    number of times, leaves the union of every node's choices. related_ids
+    is recomputed on every node whose edges changed, and the relinked
+    nodes are marked clean. Returns the ids whose related_ids changed.
+    """
+    if not links:
+        return []
+    edges = [{"src": src, "dst": dst} for src, dsts in links.items() for dst in dsts]
+    settle = [{"id": i, "content_hash": hashes[i]} for i in links]
+    with driver.session() as s:
+        return s.execute_write(_relink_tx, list(links), edges, settle, batch)
+
+# ────────────────────────────  MERGING  ────────────────────────────────
+def _merge_tx(tx, user_id: str, rows: List[Dict], batch: int) -> List[str]:
+    touched = set()
+    for chunk in _chunks(rows, batch):
+        for r in tx.run(MERGE_CYPHER, rows=chunk, user_id=user_id).data():
+            touched.add(r["keep"])
+            touched.update(r["touched"])
+    touched = sorted(touched)
+    for chunk in _chunks(touched, batch):
+        tx.run(REFRESH_CYPHER, ids=chunk).consume()
+    return touched
+
+def merge_nodes(driver, user_id: str, rows: List[Dict], batch: int = WRITE_BATCH) -> List[str]:
+    """
+    rows: {"keep": id, "drop": [ids], "props": {...}}. In ONE write tx the
+    kept node gets `props`, inherits every edge of the dropped ones (both
+    directions) and they are deleted; related_ids is recomputed on every
+    node whose edges changed. Returns those ids.
+    """
+    if not rows:
+        return []
+    with driver.session() as s:
+        touched = s.execute_write(_merge_tx, user_id, rows, batch)
+    bump_version(user_id, driver)
+    return touched
+
+# ───────────────────────────  SHARDING  ────────────────────────────────
+def has_user(driver, user_id: str) -> bool:
+    with driver.session() as s:
+        return bool(s.execute_read(lambda tx: tx.run(HAS_USER_CYPHER, user_id=user_id).data()))
+
+def delete_nodes(driver, user_id: str, ids: List[str], batch: int = WRITE_BATCH) -> None:
+    if not ids:
+        return
+    with driver.session() as s:
+        s.execute_write(lambda tx: [tx.run(DELETE_IDS_CYPHER, ids=c, user_id=user_id).consume()
+                                    for c in _chunks(list(ids), batch)])
+    bump_version(user_id, driver)
+
+def purge_user(driver, user_id: str, batch: int = WRITE_BATCH) -> int:
+    """Deletes every node of the user, `batch` per transaction; returns how many."""
+    total = 0
+    while True:
+        with driver.session() as s:
+            rows = s.execute_write(lambda tx: tx.run(PURGE_CYPHER, user_id=user_id, limit=batch).data())
+        n = rows[0]["n"] if rows else 0
+        total += n
+        if n < batch:
+            return total
+
+# ───────────────────────────  SNAPSHOTS  ───────────────────────────────
+def list_users(driver) -> List[str]:
+    with driver.session() as s:
+        return [r["user_id"] for r in s.execute_read(lambda tx: tx.run(USERS_CYPHER).data()) if r["user_id"]]
+
+def all_thoughts(driver) -> List[Dict]:
+    """Every node of every user, all properties (the legacy unpaged dump)."""
+    return _nodes(driver, ALL_NODES_CYPHER)
+
+def _restore_tx(tx, nodes: List[Dict], edges: List[Dict], batch: int) -> None:
+    for rows in _chunks(nodes, batch):
+        tx.run(RESTORE_NODES_CYPHER, rows=rows).consume()
+    for rows in _chunks(edges, batch):
+        tx.run(RELINK_CYPHER, rows=rows).consume()
+    _bump_tx(tx, {n["user_id"] for n in nodes})
+
+def restore_thoughts(driver, nodes: List[Dict], batch: int = WRITE_BATCH) -> int:
+    """
+    Like write_thoughts, but nodes that already exist keep their current
+    properties (a snapshot is older than anything written since); edges
+    are merged both ways. Returns the number of edge rows sent.
+    """
+    if not nodes:
+        return 0
+    edges = edge_rows(nodes)
+    with driver.session() as s:
+        s.execute_write(_restore_tx, nodes, edges, batch)
+    return len(edges)
+
+# ────────────────────────────  SEARCH  ─────────────────────────────────
+def neighbourhood(driver, user_id: str, seeds: List[str], hops: int, per_seed: int,
+                  snippet: int = 200) -> List[Dict]:
+    """
+    Seeds plus everything within `hops` RELATED_TO steps (at most per_seed
+    per seed), and the edges among them, in ONE read query.
+    Rows: {"node": {...}, "via": [{"seed", "hop"}], "links": [ids]}.
+    """
+    if not seeds:
+        return []
+    expand = EXPAND_CYPHER.format(hops=int(hops)).strip() if hops > 0 else "WITH s, [] AS near"
+    query = NEIGHBOURHOOD_CYPHER.format(expand=expand)
+    with driver.session() as s:
+        return s.execute_read(lambda tx: tx.run(query, user_id=user_id, seeds=list(seeds),
+                                                per_seed=per_seed, snippet=snippet).data())
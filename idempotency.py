@@ -0,0 +1,114 @@
+# idempotency.py — request-level dedup for the ingest endpoints
+import hashlib, json, os, sqlite3, threading, time
+from concurrent.futures import Future
+from typing import Any, BinaryIO, Callable, Dict, Optional, Tuple
+
+from metrics import collected
+
+IDEM_PATH = os.getenv("IDEMPOTENCY_DB", "idempotency.sqlite3")
+IDEM_TTL_S = float(os.getenv("IDEMPOTENCY_TTL_S", str(24 * 3600)))
+
+def request_key(user_id: str, payload: bytes, client_key: Optional[str] = None) -> str:
+    """(user_id, sha256 of raw_text / audio bytes, optional Idempotency-Key header)"""
+    return key_from_digest(user_id, hashlib.sha256(payload).hexdigest(), client_key)
+
+def key_from_digest(user_id: str, digest: str, client_key: Optional[str] = None) -> str:
+    return hashlib.sha256(f"{user_id}\0{digest}\0{client_key or ''}".encode("utf-8")).hexdigest()
+
+def file_digest(fileobj: BinaryIO, chunk: int = 1 << 20) -> str:
+    """sha256 of a seekable upload without loading it; rewinds afterwards."""
+    h = hashlib.sha256()
+    fileobj.seek(0)
+    for buf in iter(lambda: fileobj.read(chunk), b""):
+        h.update(buf)
+    fileobj.seek(0)
+    return h.hexdigest()
+
+class IdempotencyStore:
+    """
+    Stores the JSON response of a finished ingest under its request key.
+    A repeat within IDEM_TTL_S gets the stored response back; concurrent
+    identical requests share one in-flight run. Failures are not stored.
+    """
+
+    def __init__(self, path: str = IDEM_PATH, ttl_s: float = IDEM_TTL_S):
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self.stats = {"runs": 0, "replays": 0, "coalesced": 0}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_results ("
+            " key TEXT PRIMARY KEY, user_id TEXT, result TEXT, created_at REAL)"
+        )
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result, created_at FROM ingest_results WHERE key=?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_s:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, user_id: str, result: Any) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO ingest_results VALUES (?,?,?,?)",
+                (key, user_id, json.dumps(result), time.time()),
+            )
+            self._db.execute(
+                "DELETE FROM ingest_results WHERE created_at < ?", (time.time() - self.ttl_s,)
+            )
+            self._db.commit()
+
+    def run(self, key: str, user_id: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Returns (result, replayed). fn() must return something JSON-able;
+        it only runs if no stored or in-flight result exists for key.
+        """
+        stored = self.get(key)
+        if stored is not None:
+            self.stats["replays"] += 1
+            return stored, True
+
+        with self._lock:
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[key] = Future()
+        if not owner:
+            self.stats["coalesced"] += 1
+            return fut.result(), True
+
+        try:
+            # a previous owner may have finished between get() and the claim
+            stored = self.get(key)
+            if stored is not None:
+                fut.set_result(stored)
+                return stored, True
+            result = fn()
+            self.put(key, user_id, result)
+            self.stats["runs"] += 1
+            fut.set_result(result)
+            return result, False
+        except BaseException as exc:
+            fut.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+_store: Optional[IdempotencyStore] = None
+_store_lock = threading.Lock()
+
+def get_store() -> IdempotencyStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = IdempotencyStore()
+        return _store
+
+collected("mindmap_idempotency_total", "Ingest requests by dedup outcome",
+          lambda: [((k,), v) for k, v in _store.stats.items()], kind="counter", labels=["outcome"])
@@ -0,0 +1,198 @@
+# jobs.py — background jobs: bounded worker pools, per-user fairness, progress events
+import asyncio, os, threading, time, uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from metrics import STAGE_SECONDS, collected, counter
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+INGEST_QUEUE_MAX = int(os.getenv("INGEST_QUEUE_MAX", "256"))
+JOBS_KEEP = int(os.getenv("INGEST_JOBS_KEEP", "1000"))   # finished jobs kept for GET /jobs/{id}
+# relink / dedupe / shard moves / snapshots / bulk imports: long-running, kept off the ingest workers
+MAINTENANCE_WORKERS = int(os.getenv("MAINTENANCE_WORKERS", "1"))
+MAINTENANCE_QUEUE_MAX = int(os.getenv("MAINTENANCE_QUEUE_MAX", "32"))
+
+STAGES = ["queued", "running", "chunked", "embedded", "linked", "stored", "done"]
+
+JOB_OUTCOMES = counter("mindmap_jobs_total", "Background jobs by outcome", ["outcome"])
+
+class QueueFull(Exception):
+    pass
+
+class Job:
+    def __init__(self, user_id: str, fn: Callable[[Callable[[str, Dict], None]], Any], key: Optional[str] = None):
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.key = key
+        self.fn = fn
+        self.stage = "queued"
+        self.error: Optional[str] = None
+        self.result: Any = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.events: List[Dict] = []
+        self._subs: List[tuple] = []
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.stage in ("done", "failed")
+
+    def publish(self, stage: str, info: Optional[Dict] = None) -> None:
+        ev = {"stage": stage, "at": time.time(), **(info or {})}
+        with self._lock:
+            # other event names (bulk-import items, relink batches) are progress within the current stage
+            if stage in STAGES or stage == "failed":
+                self.stage = stage
+            self.events.append(ev)
+            subs = list(self._subs)
+        for loop, q in subs:
+            loop.call_soon_threadsafe(q.put_nowait, ev)
+
+    def subscribe(self) -> "asyncio.Queue":
+        """Async queue that replays past events, then receives new ones."""
+        loop = asyncio.get_running_loop()
+        q: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            for ev in self.events:
+                q.put_nowait(ev)
+            self._subs.append((loop, q))
+        return q
+
+    def unsubscribe(self, q: "asyncio.Queue") -> None:
+        with self._lock:
+            self._subs = [s for s in self._subs if s[1] is not q]
+
+    def status(self) -> Dict:
+        done = STAGES.index(self.stage) if self.stage in STAGES else None
+        return {
+            "job_id": self.id,
+            "user_id": self.user_id,
+            "stage": self.stage,
+            "progress": round(done / (len(STAGES) - 1), 2) if done is not None else None,
+            "stages": [e["stage"] for e in self.events if e["stage"] in STAGES or e["stage"] == "failed"],
+            "error": self.error,
+            "result": self.result if self.finished else None,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+class JobQueue:
+    """
+    One FIFO per user, served round-robin so a user who submits 50
+    entries can't starve everyone else. `workers` threads run jobs.
+    """
+
+    def __init__(self, workers: int = INGEST_WORKERS, max_queued: int = INGEST_QUEUE_MAX, name: str = "ingest"):
+        self.workers, self.max_queued, self.name = workers, max_queued, name
+        self.jobs: Dict[str, Job] = {}
+        self._by_key: Dict[str, str] = {}
+        self._queues: Dict[str, Deque[Job]] = {}
+        self._rr: Deque[str] = deque()
+        self._queued = 0
+        self._cv = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    def _ensure_workers(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, user_id: str, fn: Callable, key: Optional[str] = None,
+               reuse_finished: bool = True) -> Job:
+        with self._cv:
+            # same request already queued/running → hand back that job
+            # (and a finished one too, unless the caller wants a fresh run)
+            if key and key in self._by_key:
+                job = self.jobs.get(self._by_key[key])
+                if job and job.stage != "failed" and (reuse_finished or not job.finished):
+                    return job
+            if self._queued >= self.max_queued:
+                raise QueueFull(f"{self.name} queue full ({self.max_queued})")
+            job = Job(user_id, fn, key)
+            job.publish("queued")
+            self.jobs[job.id] = job
+            if key:
+                self._by_key[key] = job.id
+            if user_id not in self._queues:
+                self._queues[user_id] = deque()
+                self._rr.append(user_id)
+            self._queues[user_id].append(job)
+            self._queued += 1
+            self._ensure_workers()
+            self._cv.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def _next(self) -> Job:
+        with self._cv:
+            while not self._queued:
+                self._cv.wait()
+            user = self._rr.popleft()
+            q = self._queues[user]
+            job = q.popleft()
+            if q:
+                self._rr.append(user)
+            else:
+                del self._queues[user]
+            self._queued -= 1
+            return job
+
+    def _worker(self) -> None:
+        while True:
+            job = self._next()
+            STAGE_SECONDS.observe(time.time() - job.created_at, stage="job_wait")
+            job.publish("running")
+            try:
+                job.result = job.fn(job.publish)
+                job.finished_at = time.time()
+                job.publish("done")
+            except Exception as exc:
+                job.error = str(exc)
+                job.finished_at = time.time()
+                job.publish("failed", {"error": job.error})
+            JOB_OUTCOMES.inc(outcome=job.stage)
+            self._prune()
+
+    def _prune(self) -> None:
+        with self._cv:
+            done = [j for j in self.jobs.values() if j.finished]
+            for j in sorted(done, key=lambda j: j.finished_at)[: max(0, len(done) - JOBS_KEEP)]:
+                self.jobs.pop(j.id, None)
+                if j.key and self._by_key.get(j.key) == j.id:
+                    del self._by_key[j.key]
+
+_queue: Optional[JobQueue] = None
+_maintenance: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+def get_queue() -> JobQueue:
+    """Ingest jobs (async /process-text, /transcribe-audio)."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
+
+def get_maintenance_queue() -> JobQueue:
+    """Whole-graph jobs; a full re-link or a snapshot never holds up ingest."""
+    global _maintenance
+    with _queue_lock:
+        if _maintenance is None:
+            _maintenance = JobQueue(MAINTENANCE_WORKERS, MAINTENANCE_QUEUE_MAX, name="maintenance")
+        return _maintenance
+
+def find_job(job_id: str) -> Optional[Job]:
+    for q in (_queue, _maintenance):
+        job = q.get(job_id) if q is not None else None
+        if job is not None:
+            return job
+    return None
+
+collected("mindmap_jobs_queued", "Jobs waiting for a worker",
+          lambda: [((q.name,), q._queued) for q in (_queue, _maintenance) if q is not None], labels=["queue"])
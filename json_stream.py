@@ -0,0 +1,78 @@
+# json_stream.py — incremental JSON: yield array elements while the document is still arriving
+import json
+from typing import Any, Iterator, List
+
+class ArrayItems:
+    """
+    Fed fragments of one JSON object (e.g. streamed function-call
+    arguments), yields each element of its top-level array `key` as soon
+    as that element's closing bracket arrives. Only what is needed is
+    tracked: nesting depth, string/escape state and the last key seen at
+    the top level. Elements are parsed with json.loads, so a malformed one
+    raises json.JSONDecodeError.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self._buf = ""           # unconsumed text; element text from _item on
+        self._pos = 0            # next char of _buf to scan
+        self._depth = 0
+        self._in_str = self._esc = False
+        self._str_start = 0
+        self._last_str = None    # last complete string at depth 1 (a key, when followed by ':')
+        self._array = False      # inside the target array (its elements are at depth 2)
+        self._item = None        # offset in _buf where the current element starts
+        self.done = False        # target array closed
+
+    def feed(self, fragment: str) -> List[Any]:
+        out: List[Any] = []
+        if self.done or not fragment:
+            return out
+        buf = self._buf + fragment
+        i = self._pos
+        while i < len(buf):
+            c = buf[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    if self._depth == 1 and not self._array:
+                        self._last_str = buf[self._str_start:i]
+            else:
+                if self._array and self._depth == 2 and self._item is None and c not in " \t\r\n,]":
+                    self._item = i                       # an element starts
+                if c == '"':
+                    self._in_str, self._str_start = True, i + 1
+                elif c in "{[":
+                    self._depth += 1
+                    if c == "[" and self._depth == 2 and not self._array and self._last_str == self.key:
+                        self._array = True
+                elif c in "}]":
+                    self._depth -= 1
+                    if self._array and self._depth == 1:  # target array closed
+                        if self._item is not None:
+                            out.append(json.loads(buf[self._item:i]))
+                        self._item, self.done = None, True
+                        break
+                    if self._array and self._depth == 2 and self._item is not None:
+                        out.append(json.loads(buf[self._item:i + 1]))
+                        self._item = None
+                elif c == "," and self._array and self._depth == 2 and self._item is not None:
+                    out.append(json.loads(buf[self._item:i]))   # scalar element
+                    self._item = None
+            i += 1
+            if self._array and self._depth == 2 and self._item is None and not self._in_str:
+                buf, i = buf[i:], 0      # drop consumed text between elements
+        self._buf, self._pos = buf, i
+        return out
+
+def iter_array(fragments: Iterator[str], key: str) -> Iterator[Any]:
+    """Elements of `key` from an iterable of text fragments, each yielded once complete."""
+    parser = ArrayItems(key)
+    for fragment in fragments:
+        yield from parser.feed(fragment)
+        if parser.done:
+            return
@@ -0,0 +1,322 @@
+# layout.py — server-side mind-map layout: force-directed coordinates, communities, cluster summaries
+import os, threading, time
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from graph_store import fetch_graph, get_driver, graph_version
+from logs import log
+from metrics import STAGE_SECONDS, collected
+
+LAYOUT_ITERS = int(os.getenv("LAYOUT_ITERS", "80"))               # full layout
+LAYOUT_ITERS_INCR = int(os.getenv("LAYOUT_ITERS_INCR", "20"))     # warm start from the previous version
+LAYOUT_INCR_MAX = float(os.getenv("LAYOUT_INCR_MAX", "0.25"))     # changed fraction above which we start over
+LAYOUT_CACHE_USERS = int(os.getenv("LAYOUT_CACHE_USERS", "256"))
+CELL_NODES = 4        # target nodes per grid cell (near-field pairs ~ 4.5 × this per node)
+MAX_GRID = 512        # cells per side
+GRAVITY = 0.1         # weak pull to the origin keeps disconnected pieces on screen
+LPA_ROUNDS = 20
+TOP_MEMBERS = 5
+
+# ─────────────────────────────  FORCES  ────────────────────────────────
+def _grid(P: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int, float]:
+    n = len(P)
+    g = int(min(MAX_GRID, max(1, np.sqrt(n / CELL_NODES))))
+    # span the bulk, not the stragglers: outliers share the border cells
+    lo, hi = np.percentile(P, [1, 99], axis=0)
+    h = max(float((hi - lo).max()), 1e-9) / g
+    cxy = np.clip(((P - lo) / h).astype(np.int64), 0, g - 1)
+    return cxy, cxy[:, 0] * g + cxy[:, 1], g, h
+
+def repulsion(P: np.ndarray, k: float = 1.0) -> np.ndarray:
+    """
+    Particle-mesh, Barnes-Hut-style: nodes in the same or an adjacent grid
+    cell repel exactly (k²/d); farther cells act through their node count,
+    as one FFT convolution over the grid.
+    O(n · CELL_NODES + cells · log cells) per call instead of O(n²).
+    """
+    n = len(P)
+    x, y = np.ascontiguousarray(P[:, 0]), np.ascontiguousarray(P[:, 1])   # 1-D gathers are ~20× faster
+    cxy, cell, g, h = _grid(P)
+    cnt = np.bincount(cell, minlength=g * g)
+    Fx, Fy = np.zeros(n), np.zeros(n)
+
+    # near field: each unordered pair in the same or neighbouring cells once (5 of the 9 offsets)
+    order = np.argsort(cell, kind="stable")
+    start = np.cumsum(cnt) - cnt
+    for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+        nx, ny = cxy[:, 0] + dx, cxy[:, 1] + dy
+        ok = (nx >= 0) & (nx < g) & (ny >= 0) & (ny < g)
+        i = np.flatnonzero(ok)
+        d = nx[ok] * g + ny[ok]
+        c = cnt[d]
+        ii = np.repeat(i, c)
+        within = np.arange(len(ii)) - np.repeat(np.cumsum(c) - c, c)
+        jj = order[np.repeat(start[d], c) + within]
+        if dx == dy == 0:
+            keep = ii < jj
+            ii, jj = ii[keep], jj[keep]
+        ddx, ddy = x[ii] - x[jj], y[ii] - y[jj]
+        w = k * k / np.maximum(ddx * ddx + ddy * ddy, 1e-6)
+        fx, fy = w * ddx, w * ddy
+        Fx += np.bincount(ii, fx, n) - np.bincount(jj, fx, n)
+        Fy += np.bincount(ii, fy, n) - np.bincount(jj, fy, n)
+
+    # far field: cell masses convolved (FFT) with the k²/d kernel, cells ≥ 2 apart only
+    Kx, Ky, size = _kernel(g)
+    M = np.fft.rfft2(cnt.reshape(g, g).astype(np.float64), size)
+    near = slice(g - 1, 2 * g - 1)
+    Fcx = np.fft.irfft2(M * Kx, size)[near, near].ravel() * (k * k / h)
+    Fcy = np.fft.irfft2(M * Ky, size)[near, near].ravel() * (k * k / h)
+    return np.stack([Fx + Fcx[cell], Fy + Fcy[cell]], axis=1)
+
+@lru_cache(maxsize=16)
+def _kernel(g: int) -> Tuple[np.ndarray, np.ndarray, Tuple[int, int]]:
+    """FFT of the repulsion at unit cell size, per cell offset; zero for the 3×3 near field."""
+    off = np.arange(-(g - 1), g, dtype=np.float64)
+    dx, dy = np.meshgrid(off, off, indexing="ij")
+    w = 1.0 / np.maximum(dx * dx + dy * dy, 1e-12)
+    w[g - 2:g + 1, g - 2:g + 1] = 0.0
+    size = (3 * g - 2,) * 2
+    return np.fft.rfft2(w * dx, size), np.fft.rfft2(w * dy, size), size
+
+def attraction(P: np.ndarray, src: np.ndarray, dst: np.ndarray, k: float = 1.0) -> np.ndarray:
+    """Springs along edges, d²/k."""
+    n = len(P)
+    delta = P[dst] - P[src]
+    f = delta * (np.sqrt((delta ** 2).sum(axis=1)) / k)[:, None]
+    F = np.zeros_like(P)
+    for axis in (0, 1):
+        F[:, axis] = np.bincount(src, f[:, axis], n) - np.bincount(dst, f[:, axis], n)
+    return F
+
+def force_layout(n: int, src: np.ndarray, dst: np.ndarray, P0: Optional[np.ndarray] = None,
+                 iters: int = LAYOUT_ITERS, temp: Optional[float] = None, seed: int = 0) -> np.ndarray:
+    """
+    Fruchterman-Reingold with grid-approximated repulsion. `P0` warm-starts
+    (incremental updates pass the previous coordinates and a low `temp`).
+    Natural edge length is 1; the graph spans roughly √n.
+    """
+    side = max(np.sqrt(n), 1.0)
+    rng = np.random.default_rng(seed)
+    P = rng.uniform(-side / 2, side / 2, (n, 2)) if P0 is None else P0.astype(np.float64, copy=True)
+    if n < 2:
+        return P
+    temp = side / 10 if temp is None else temp
+    for it in range(iters):
+        D = repulsion(P) + attraction(P, src, dst) - GRAVITY * P
+        L = np.maximum(np.sqrt((D ** 2).sum(axis=1)), 1e-9)
+        step = temp * (1 - it / iters)
+        P += D * (np.minimum(L, step) / L)[:, None]
+    return P
+
+# ───────────────────────────  COMMUNITIES  ─────────────────────────────
+def communities(n: int, src: np.ndarray, dst: np.ndarray, labels: Optional[np.ndarray] = None,
+                rounds: int = LPA_ROUNDS, seed: int = 0) -> np.ndarray:
+    """
+    Label propagation: each node takes its neighbours' most common label
+    (ties keep the current one). Half the nodes update per pass so the
+    synchronous version doesn't oscillate. `labels` warm-starts it.
+    Returns labels compacted to 0..c-1.
+    """
+    L = np.arange(n) if labels is None else np.unique(labels, return_inverse=True)[1].astype(np.int64)
+    if len(src):
+        a, b = np.concatenate([src, dst]), np.concatenate([dst, src])
+        rng = np.random.default_rng(seed)
+        for _ in range(rounds):
+            changed = 0
+            half = rng.random(n) < 0.5
+            for part in (half, ~half):
+                u, c = np.unique(a * n + L[b], return_counts=True)
+                node, lab = u // n, u % n
+                o = np.lexsort((lab, lab != L[node], -c, node))
+                first = o[np.r_[True, node[o][1:] != node[o][:-1]]]
+                new = L.copy()
+                new[node[first]] = lab[first]
+                upd = part & (new != L)
+                L[upd] = new[upd]
+                changed += int(upd.sum())
+            if not changed:
+                break
+        L = merge_communities(np.unique(L, return_inverse=True)[1], src, dst)
+    return np.unique(L, return_inverse=True)[1]
+
+def merge_communities(labels: np.ndarray, src: np.ndarray, dst: np.ndarray, rounds: int = LPA_ROUNDS) -> np.ndarray:
+    """
+    Label propagation leaves sparse graphs in many small pieces; this joins
+    neighbouring communities while that raises modularity (Louvain's
+    aggregation step). ΔQ(c, d) = e_cd/m − tot_c·tot_d/2m², best pairs first,
+    each community in at most one merge per round.
+    """
+    m = len(src)
+    deg = np.bincount(np.concatenate([src, dst]), minlength=len(labels)).astype(np.float64)
+    for _ in range(rounds):
+        c = int(labels.max()) + 1
+        tot = np.bincount(labels, deg, c)
+        a, b = labels[src], labels[dst]
+        cross = a != b
+        u, e = np.unique(np.minimum(a, b)[cross] * c + np.maximum(a, b)[cross], return_counts=True)
+        dq = e / m - tot[u // c] * tot[u % c] / (2.0 * m * m)
+        best = np.argsort(-dq)[: int((dq > 0).sum())]
+        remap, taken = np.arange(c), np.zeros(c, dtype=bool)
+        for x, y in zip((u[best] // c).tolist(), (u[best] % c).tolist()):
+            if not (taken[x] or taken[y]):
+                remap[y], taken[x], taken[y] = x, True, True
+        if not taken.any():
+            break
+        labels = remap[labels]
+    return labels
+
+def rank_clusters(labels: np.ndarray) -> np.ndarray:
+    """Relabels communities 0..c-1 by size, largest first (c0 is the biggest)."""
+    if not len(labels):
+        return labels
+    by_size = np.argsort(-np.bincount(labels), kind="stable")
+    rank = np.empty_like(by_size)
+    rank[by_size] = np.arange(len(by_size))
+    return rank[labels]
+
+def summarize(rows: List[Dict], P: np.ndarray, cid: np.ndarray, degree: np.ndarray,
+              src: np.ndarray, dst: np.ndarray) -> Tuple[List[Dict], List[Dict]]:
+    """One summary node per community and weighted edges between them."""
+    out = []
+    order = np.argsort(cid, kind="stable")
+    bounds = np.r_[0, np.cumsum(np.bincount(cid))] if len(cid) else [0]
+    for c in range(len(bounds) - 1):
+        members = order[bounds[c]:bounds[c + 1]]
+        centre = P[members].mean(axis=0)
+        top = members[np.argsort(-degree[members], kind="stable")[:TOP_MEMBERS]]
+        tags = Counter(t for i in members for t in rows[i].get("tags") or [])
+        out.append({
+            "id": f"c{c}", "size": int(len(members)),
+            "x": round(float(centre[0]), 2), "y": round(float(centre[1]), 2),
+            "radius": round(float(np.sqrt(((P[members] - centre) ** 2).sum(axis=1).mean())), 2),
+            "title": rows[top[0]].get("title") or "",
+            "tags": [t for t, _ in tags.most_common(3)],
+            "top": [rows[i]["id"] for i in top],
+        })
+    cross = cid[src] != cid[dst]
+    pairs = Counter(zip(np.minimum(cid[src], cid[dst])[cross].tolist(), np.maximum(cid[src], cid[dst])[cross].tolist()))
+    edges = [{"src": f"c{a}", "dst": f"c{b}", "weight": w} for (a, b), w in pairs.items()]
+    return out, edges
+
+# ─────────────────────────────  CACHE  ─────────────────────────────────
+class Layout:
+    """A computed layout for one graph version; the next version warm-starts from it."""
+
+    def __init__(self, version: int, ids: List[str], P: np.ndarray, labels: np.ndarray, result: Dict):
+        self.version, self.ids, self.P, self.labels, self.result = version, ids, P, labels, result
+
+_layouts: "OrderedDict[str, Layout]" = OrderedDict()
+_layouts_lock = threading.Lock()
+_user_locks: Dict[str, threading.Lock] = {}
+_stats = {"hit": 0, "incremental": 0, "full": 0}
+
+collected("mindmap_layout_total", "Layout requests by how they were served",
+          lambda: [((k,), v) for k, v in _stats.items()], kind="counter", labels=["result"])
+
+def _remember(user_id: str, lay: Layout) -> None:
+    with _layouts_lock:
+        _layouts[user_id] = lay
+        _layouts.move_to_end(user_id)
+        while len(_layouts) > LAYOUT_CACHE_USERS:
+            _layouts.popitem(last=False)
+
+def _edges(rows: List[Dict], index: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+    # RELATED_TO is stored both ways; keep each undirected edge once
+    n = len(rows)
+    a = np.fromiter((i for i, r in enumerate(rows) for _ in r.get("links") or ()), dtype=np.int64)
+    b = np.fromiter((index.get(x, -1) for r in rows for x in r.get("links") or ()), dtype=np.int64)
+    ok = (b >= 0) & (a != b)
+    e = np.unique(np.minimum(a, b)[ok] * n + np.maximum(a, b)[ok])
+    return e // max(n, 1), e % max(n, 1)
+
+def _warm_start(prev: Layout, ids: List[str], src: np.ndarray, dst: np.ndarray,
+                seed: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Previous coordinates/labels for surviving nodes; new ones start at their neighbours' mean."""
+    old = {i: k for k, i in enumerate(prev.ids)}
+    pos = np.asarray([old.get(i, -1) for i in ids])
+    known = pos >= 0
+    n_changed = int((~known).sum()) + len(prev.ids) - int(known.sum())
+    if n_changed > LAYOUT_INCR_MAX * max(len(ids), 1):
+        return None
+    P = np.zeros((len(ids), 2))
+    P[known] = prev.P[pos[known]]
+    labels = np.full(len(ids), -1, dtype=np.int64)
+    labels[known] = prev.labels[pos[known]]
+    new = np.flatnonzero(~known)
+    if len(new):
+        nb_sum = np.zeros((len(ids), 2))
+        nb_cnt = np.zeros(len(ids))
+        for a, b in ((src, dst), (dst, src)):
+            k = known[b]
+            np.add.at(nb_sum, a[k], P[b[k]])
+            np.add.at(nb_cnt, a[k], 1)
+        rng = np.random.default_rng(seed)
+        placed = nb_cnt[new] > 0
+        P[new] = np.where(placed[:, None], nb_sum[new] / np.maximum(nb_cnt[new], 1)[:, None],
+                          rng.uniform(-1, 1, (len(new), 2)) * max(np.sqrt(len(ids)), 1.0) / 2)
+        P[new] += rng.normal(0, 0.5, (len(new), 2))
+        labels[new] = labels.max(initial=-1) + 1 + np.arange(len(new))
+    return P, labels
+
+def compute(user_id: str, rows: List[Dict], version: int, prev: Optional[Layout] = None) -> Layout:
+    ids = [r["id"] for r in rows]
+    index = {i: k for k, i in enumerate(ids)}
+    src, dst = _edges(rows, index)
+    n = len(ids)
+    warm = _warm_start(prev, ids, src, dst, version) if prev is not None else None
+    if warm is None:
+        mode = "full"
+        P = force_layout(n, src, dst, seed=version)
+        labels = communities(n, src, dst, seed=version)
+    else:
+        mode = "incremental"
+        P0, L0 = warm
+        P = force_layout(n, src, dst, P0=P0, iters=LAYOUT_ITERS_INCR, temp=1.0, seed=version)
+        labels = communities(n, src, dst, labels=L0, seed=version)
+    _stats[mode] += 1
+    labels = rank_clusters(labels)
+    degree = np.bincount(np.concatenate([src, dst]), minlength=n)
+    clusters, cluster_edges = summarize(rows, P, labels, degree, src, dst)
+    result = {
+        "version": version,
+        "nodes": [{"id": i, "x": round(float(x), 2), "y": round(float(y), 2), "cluster": f"c{c}"}
+                  for i, (x, y), c in zip(ids, P.tolist(), labels.tolist())],
+        "clusters": clusters,
+        "cluster_edges": cluster_edges,
+        "mode": mode,
+    }
+    return Layout(version, ids, P, labels, result)
+
+def get_layout(user_id: str, driver=None) -> Dict:
+    """
+    Layout of the user's graph at its current version: cached per
+    (user_id, graph version); after writes it is recomputed from the
+    previous version's coordinates and communities unless more than
+    LAYOUT_INCR_MAX of the nodes changed.
+    """
+    t0 = time.perf_counter()
+    driver = driver or get_driver(user_id)
+    version = graph_version(user_id, driver)   # shared by every worker: stored next to the graph
+    with _layouts_lock:
+        prev = _layouts.get(user_id)
+        lock = _user_locks.setdefault(user_id, threading.Lock())
+    if prev is not None and prev.version == version:
+        _stats["hit"] += 1
+        return {**prev.result, "cached": True}
+    with lock:   # one computation per user; concurrent callers wait for it
+        with _layouts_lock:
+            prev = _layouts.get(user_id)
+        if prev is not None and prev.version == version:
+            _stats["hit"] += 1
+            return {**prev.result, "cached": True}
+        rows = fetch_graph(driver, user_id)
+        with STAGE_SECONDS.time(stage="layout"):
+            lay = compute(user_id, rows, version, prev)
+        _remember(user_id, lay)
+    log("LAYOUT", f"user={user_id} v{version} {lay.result['mode']}: {len(rows)} nodes, "
+                  f"{len(lay.result['clusters'])} clusters in {(time.perf_counter() - t0) * 1e3:.0f} ms")
+    return {**lay.result, "cached": False}
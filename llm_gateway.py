@@ -0,0 +1,227 @@
+# llm_gateway.py — one process-wide OpenAI gateway: pooled clients, rate limits, retries, latency
+import asyncio, os, random, threading, time
+from bisect import bisect_left
+from typing import Any, Dict, Iterator, List, Optional
+
+from metrics import EXTERNAL_CALLS, EXTERNAL_SECONDS, TOKENS, histogram
+from resources import resource
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None          # point at a mock server in benches
+OPENAI_TIMEOUT_S = float(os.getenv("OPENAI_TIMEOUT_S", "60"))
+OPENAI_CONNECT_TIMEOUT_S = float(os.getenv("OPENAI_CONNECT_TIMEOUT_S", "5"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))                 # per model
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "200000"))              # per model
+OPENAI_RETRIES = int(os.getenv("OPENAI_RETRIES", "4"))
+
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+# per model, successful calls only (retries and failures are in mindmap_external_call_seconds)
+MODEL_SECONDS = histogram("mindmap_openai_model_seconds", "Latency of successful OpenAI calls per model",
+                          ["model", "op"], buckets=tuple(b / 1e3 for b in LATENCY_BUCKETS_MS))
+
+# ─────────────────────────  RATE LIMITING  ─────────────────────────────
+class TokenBucket:
+    """`per_min` units refill continuously; capacity is one minute's worth."""
+
+    def __init__(self, per_min: float):
+        self.rate = per_min / 60.0
+        self.capacity = float(per_min)
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, n: float) -> float:
+        """Takes n units (possibly going negative) and returns how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= min(n, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self, n: float = 1) -> None:
+        wait = self._reserve(n)
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self, n: float = 1) -> None:
+        wait = self._reserve(n)
+        if wait:
+            await asyncio.sleep(wait)
+
+# ───────────────────────────  METRICS  ─────────────────────────────────
+class LatencyHistogram:
+    def __init__(self, bounds: List[float] = LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total_ms = 0.0
+        self.n = 0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect_left(self.bounds, ms)] += 1
+        self.total_ms += ms
+        self.n += 1
+
+    def snapshot(self) -> Dict:
+        return {"buckets_ms": self.bounds, "counts": list(self.counts),
+                "count": self.n, "sum_ms": round(self.total_ms, 3)}
+
+# ─────────────────────────────  HELPERS  ───────────────────────────────
+def estimate_tokens(payload: Any) -> int:
+    """~4 characters per token; good enough for budgeting TPM."""
+    if isinstance(payload, str):
+        return max(1, len(payload) // 4)
+    if isinstance(payload, dict):
+        return sum(estimate_tokens(v) for v in payload.values())
+    if isinstance(payload, (list, tuple)):
+        return sum(estimate_tokens(v) for v in payload)
+    return 0
+
+def _retry_delay(exc: Exception, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying, or None if exc isn't transient."""
+    import openai   # already loaded by the client that raised
+    if isinstance(exc, openai.APIStatusError):
+        if exc.status_code != 429 and exc.status_code < 500:
+            return None
+        after = exc.response.headers.get("retry-after") if exc.response is not None else None
+        if after:
+            try:
+                return float(after) + random.uniform(0, 0.25)
+            except ValueError:
+                pass
+    elif not isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+        return None
+    return random.uniform(0, min(20.0, 0.5 * 2 ** attempt))   # full jitter
+
+# ─────────────────────────────  GATEWAY  ───────────────────────────────
+class LLMGateway:
+    """
+    Shared by algo.py and openai_utils.py. One keep-alive connection pool
+    per flavour (sync / async), per-model RPM + TPM buckets, jittered
+    retries on 429/5xx/connection errors, latency histogram per model.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = OPENAI_BASE_URL,
+                 rpm: int = OPENAI_RPM, tpm: int = OPENAI_TPM, retries: int = OPENAI_RETRIES):
+        key = api_key or os.getenv("OPENAI_API_KEY")
+        if not key:
+            raise RuntimeError("OPENAI_API_KEY is not set.")
+        import httpx   # the SDK is ~0.6 s of imports; pay it on first use, not at app import
+        from openai import AsyncOpenAI, OpenAI
+        timeout = httpx.Timeout(OPENAI_TIMEOUT_S, connect=OPENAI_CONNECT_TIMEOUT_S)
+        limits = httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                              max_keepalive_connections=OPENAI_MAX_CONNECTIONS, keepalive_expiry=60)
+        # SDK retries off: _call owns retry policy so rate limits see every attempt
+        self.client = OpenAI(api_key=key, base_url=base_url, max_retries=0, timeout=timeout,
+                             http_client=httpx.Client(timeout=timeout, limits=limits))
+        self.aclient = AsyncOpenAI(api_key=key, base_url=base_url, max_retries=0, timeout=timeout,
+                                   http_client=httpx.AsyncClient(timeout=timeout, limits=limits))
+        self.rpm, self.tpm, self.retries = rpm, tpm, retries
+        self._buckets: Dict[str, tuple] = {}
+        self._hist: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "errors": 0}
+
+    def _limits(self, model: str) -> tuple:
+        with self._lock:
+            if model not in self._buckets:
+                self._buckets[model] = (TokenBucket(self.rpm), TokenBucket(self.tpm))
+                self._hist[model] = LatencyHistogram()
+            return self._buckets[model]
+
+    def _observe(self, model: str, op: str, started: float, out=None, outcome: str = "ok") -> None:
+        elapsed = time.perf_counter() - started
+        EXTERNAL_SECONDS.observe(elapsed, service="openai", op=op)
+        EXTERNAL_CALLS.inc(service="openai", op=op, outcome=outcome)
+        if out is None:
+            return
+        self._tokens(model, getattr(out, "usage", None))
+        MODEL_SECONDS.observe(elapsed, model=model, op=op)
+        with self._lock:
+            self._hist[model].observe(elapsed * 1e3)
+            self.stats["calls"] += 1
+
+    def _tokens(self, model: str, usage) -> None:
+        for kind in ("prompt", "completion"):
+            n = getattr(usage, f"{kind}_tokens", 0) or 0
+            if n:
+                TOKENS.inc(n, model=model, kind=kind)
+
+    def _call(self, fn, op: str, model: str, tokens: int, **kw):
+        req_b, tok_b = self._limits(model)
+        for attempt in range(self.retries + 1):
+            req_b.acquire(1)
+            tok_b.acquire(tokens)
+            started = time.perf_counter()
+            try:
+                out = fn(model=model, **kw)
+                self._observe(model, op, started, out)
+                return out
+            except Exception as exc:
+                self._observe(model, op, started, outcome=type(exc).__name__)
+                delay = _retry_delay(exc, attempt)
+                if delay is None or attempt == self.retries:
+                    self.stats["errors"] += 1
+                    raise
+                self.stats["retries"] += 1
+                time.sleep(delay)
+
+    async def _acall(self, fn, op: str, model: str, tokens: int, **kw):
+        req_b, tok_b = self._limits(model)
+        for attempt in range(self.retries + 1):
+            await req_b.acquire_async(1)
+            await tok_b.acquire_async(tokens)
+            started = time.perf_counter()
+            try:
+                out = await fn(model=model, **kw)
+                self._observe(model, op, started, out)
+                return out
+            except Exception as exc:
+                self._observe(model, op, started, outcome=type(exc).__name__)
+                delay = _retry_delay(exc, attempt)
+                if delay is None or attempt == self.retries:
+                    self.stats["errors"] += 1
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(delay)
+
+    # ── sync ───────────────────────────────────────────────────────
+    def chat(self, model: str, **kw):
+        tokens = estimate_tokens(kw.get("messages", [])) + int(kw.get("max_tokens") or 0)
+        return self._call(self.client.chat.completions.create, "chat", model, tokens, **kw)
+
+    def chat_stream(self, model: str, **kw) -> Iterator:
+        """
+        Completion chunks as the model emits them. Rate limits and retries
+        cover opening the stream (the recorded latency is time to first
+        byte); an error after chunks have flowed is raised to the caller.
+        """
+        tokens = estimate_tokens(kw.get("messages", [])) + int(kw.get("max_tokens") or 0)
+        stream = self._call(self.client.chat.completions.create, "chat_stream", model, tokens,
+                            stream=True, stream_options={"include_usage": True}, **kw)
+        with stream:
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    self._tokens(model, chunk.usage)
+                yield chunk
+
+    def embed(self, model: str, input, **kw):
+        return self._call(self.client.embeddings.create, "embed", model, estimate_tokens(input), input=input, **kw)
+
+    # ── async ──────────────────────────────────────────────────────
+    async def achat(self, model: str, **kw):
+        tokens = estimate_tokens(kw.get("messages", [])) + int(kw.get("max_tokens") or 0)
+        return await self._acall(self.aclient.chat.completions.create, "chat", model, tokens, **kw)
+
+    async def aembed(self, model: str, input, **kw):
+        return await self._acall(self.aclient.embeddings.create, "embed", model, estimate_tokens(input), input=input, **kw)
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {"latency_ms": {m: h.snapshot() for m, h in self._hist.items()}, **self.stats}
+
+GATEWAY = resource("openai", LLMGateway, close=lambda g: g.client.close(), check=lambda g: dict(g.stats))
+
+def get_gateway() -> LLMGateway:
+    return GATEWAY.get()
@@ -0,0 +1,198 @@
+# local_chunker.py — deterministic millisecond chunker (sentence split + TF-IDF topic shifts)
+import math, os, re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+CHUNK_ROUTE = os.getenv("CHUNK_ROUTE", "auto")                     # auto | local | gpt
+LOCAL_MAX_WORDS = int(os.getenv("LOCAL_CHUNK_MAX_WORDS", "300"))    # longer inputs go to GPT
+MESSY_T = float(os.getenv("LOCAL_CHUNK_MESSY_T", "0.15"))
+
+MIN_WORDS, MAX_WORDS = 40, 150   # upper bound matches the GPT prompt
+BLOCK = 3                        # widest sentence window when scoring a gap
+CUT_T = 0.97                     # cut only where cohesion across the gap is ≤ ~0.03
+PARA_BONUS = 0.5                 # a blank line is strong evidence of a new topic
+MAX_TAGS = 4
+
+_SENT_RE = re.compile(r"(?<=[.!?…])[\"'”’)\]]*\s+(?=[\"'“‘(\[]?[A-Z0-9])")
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9'’-]*")
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each even every few for from
+further had has have having he her here hers herself him himself his how i if in into is it its
+itself just let like made make many may me might more most much must my myself no nor not now of
+off often on once one only or other our ours ourselves out over own rather really same say says
+she should so some still such than that the their theirs them themselves then there these they
+thing things this those through to too under until up upon us use used using very was way we well
+were what when where which while who whom why will with within without would yes yet you your
+yours yourself yourselves it's that's there's don't can't isn't doesn't i'm we're they're you're
+already around get gets getting go goes going take takes taking lot lots maybe want wants need needs
+""".split())
+FILLERS = frozenset("um uh erm hmm like basically actually literally kinda sorta okay ok yeah".split())
+
+# ──────────────────────────  TEXT HELPERS  ─────────────────────────────
+def split_sentences(text: str) -> List[str]:
+    text = re.sub(r"\s+", " ", text).strip()
+    return [s.strip() for s in _SENT_RE.split(text) if s.strip()] if text else []
+
+def tokens(text: str) -> List[str]:
+    return [w.strip("'’-") for w in _WORD_RE.findall(text.lower())]
+
+def content_terms(text: str) -> List[str]:
+    return [w for w in tokens(text) if len(w) > 2 and w not in STOPWORDS and not w.isdigit()]
+
+_SUFFIXES = ("ations", "ation", "ings", "ing", "edly", "ed", "ies", "es", "ly", "ment", "ness", "s")
+
+def stem(word: str) -> str:
+    """Crude suffix strip – just enough for run/runs/running to share a column."""
+    for suf in _SUFFIXES:
+        if word.endswith(suf) and len(word) - len(suf) >= 3:
+            return word[: -len(suf)] + ("y" if suf == "ies" else "")
+    return word
+
+def tfidf(sentences: List[str], stemmed: bool = False) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """Row-normalized sentence × term TF-IDF matrix, vocab, idf."""
+    norm = stem if stemmed else (lambda w: w)
+    bags = [Counter(norm(t) for t in content_terms(s)) for s in sentences]
+    vocab = sorted({t for b in bags for t in b})
+    index = {t: i for i, t in enumerate(vocab)}
+    M = np.zeros((len(sentences), len(vocab)), dtype=np.float32)
+    for r, bag in enumerate(bags):
+        for t, c in bag.items():
+            M[r, index[t]] = 1.0 + math.log(c)
+    df = (M > 0).sum(axis=0)
+    idf = (np.log((1 + len(sentences)) / (1 + df)) + 1.0).astype(np.float32)
+    M *= idf
+    M /= np.maximum(np.linalg.norm(M, axis=1, keepdims=True), 1e-9)
+    return M, vocab, idf
+
+# ────────────────────────  BOUNDARY DETECTION  ─────────────────────────
+def block_similarity(M: np.ndarray, block: int) -> np.ndarray:
+    """Cosine between the `block` sentences before and after every gap."""
+    n = len(M)
+    csum = np.vstack([np.zeros((1, M.shape[1]), M.dtype), np.cumsum(M, axis=0)])
+    gaps = np.arange(1, n)
+    lo, hi = np.maximum(gaps - block, 0), np.minimum(gaps + block, n)
+    left, right = csum[gaps] - csum[lo], csum[hi] - csum[gaps]
+    den = np.linalg.norm(left, axis=1) * np.linalg.norm(right, axis=1)
+    return (left * right).sum(axis=1) / np.maximum(den, 1e-9)
+
+def gap_scores(M: np.ndarray, breaks: np.ndarray) -> np.ndarray:
+    """
+    Topic-shift strength for the gap after each sentence: 1 − lexical
+    cohesion averaged over 1..BLOCK sentence windows, plus a bonus where
+    the writer already started a new paragraph.
+    """
+    if len(M) < 2:
+        return np.zeros(0, dtype=np.float32)
+    sim = np.mean([block_similarity(M, b) for b in range(1, BLOCK + 1)], axis=0)
+    return (1.0 - sim) + PARA_BONUS * breaks
+
+def _best_split(seg: List[int], lens: List[int], scores: np.ndarray, min_words: int) -> Optional[int]:
+    best, best_s, words = None, -1.0, 0
+    total = sum(lens[i] for i in seg)
+    for i in seg[:-1]:
+        words += lens[i]
+        if min(words, total - words) >= min(min_words, total // 2) and scores[i] > best_s:
+            best, best_s = i, scores[i]
+    return best
+
+def segment(sentences: List[str], scores: np.ndarray,
+            min_words: int = MIN_WORDS, max_words: int = MAX_WORDS) -> List[List[int]]:
+    """
+    Greedily cut at the strongest gaps first while every piece keeps
+    ≥ min_words, then split anything still over max_words at its
+    strongest internal gap (if one leaves both sides ≥ min_words).
+    """
+    lens = [len(s.split()) for s in sentences]
+    if sum(lens) < 2 * min_words or len(sentences) < 2:
+        return [list(range(len(sentences)))]
+    prefix = np.cumsum([0] + lens)
+    cuts: List[int] = []
+    for g in np.argsort(-scores, kind="stable"):
+        if scores[g] < CUT_T:
+            break
+        trial = sorted(cuts + [int(g)])
+        edges = [0] + [c + 1 for c in trial] + [len(sentences)]
+        if all(prefix[b] - prefix[a] >= min_words for a, b in zip(edges, edges[1:])):
+            cuts = trial
+    edges = [0] + [c + 1 for c in cuts] + [len(sentences)]
+    segs = [list(range(a, b)) for a, b in zip(edges, edges[1:])]
+
+    out: List[List[int]] = []
+    while segs:
+        seg = segs.pop(0)
+        if sum(lens[i] for i in seg) > max_words and len(seg) > 1:
+            cut = _best_split(seg, lens, scores, min_words)
+            if cut is not None:
+                k = seg.index(cut) + 1
+                segs[:0] = [seg[:k], seg[k:]]
+                continue
+        # within max_words, or one sentence carries most of the words and no
+        # gap leaves both sides ≥ min_words: kept whole rather than shedding a stub
+        out.append(seg)
+    return out
+
+# ──────────────────────────  TITLES / TAGS  ────────────────────────────
+def _salience(term: str, tf_seg: int, tf_doc: int, idf: float) -> float:
+    # repeated terms beat merely rare ones, and a term concentrated in this
+    # segment beats one spread over the whole entry; adverbs / past-tense
+    # verbs make poor topic labels
+    pos = 0.5 if term.endswith(("ly", "ed")) else 1.0
+    share = tf_seg / max(tf_doc, tf_seg)
+    return (1 + math.log(tf_seg)) * (1 + math.log(tf_doc)) * math.sqrt(share * idf) * pos
+
+def keywords(text: str, doc_tf: Counter, idf: Dict[str, float], k: int = MAX_TAGS) -> List[str]:
+    tf = Counter(content_terms(text))
+    scored = sorted(tf.items(), key=lambda kv: (-_salience(kv[0], kv[1], doc_tf[kv[0]], idf.get(kv[0], 1.0)), kv[0]))
+    return [t for t, _ in scored[:k]]
+
+def make_title(kws: List[str], fallback: str) -> str:
+    if not kws:
+        return " ".join(fallback.split()[:8])
+    words = [w.capitalize() for w in kws[:3]]
+    return words[0] if len(words) == 1 else ", ".join(words[:-1]) + " & " + words[-1]
+
+# ─────────────────────────────  ENGINE  ────────────────────────────────
+def chunk_local(raw_text: str) -> List[Dict]:
+    """Same shape as algo.chunk_raw_text: [{title, content, tags}]."""
+    sentences, breaks = [], []
+    for para in re.split(r"\n\s*\n", raw_text):
+        ss = split_sentences(para)
+        sentences += ss
+        breaks += [0.0] * (len(ss) - 1) + [1.0] if ss else []
+    if not sentences:
+        return []
+    M, _, _ = tfidf(sentences, stemmed=True)
+    _, vocab, idf = tfidf(sentences)
+    idf_map = dict(zip(vocab, idf.tolist()))
+    doc_tf = Counter(content_terms(raw_text))
+    scores = gap_scores(M, np.asarray(breaks[:-1], dtype=np.float32))
+    nodes = []
+    for seg in segment(sentences, scores):
+        content = " ".join(sentences[i] for i in seg)
+        kws = keywords(content, doc_tf, idf_map)
+        nodes.append({"title": make_title(kws, content), "content": content, "tags": kws})
+    return nodes
+
+# ─────────────────────────────  ROUTER  ────────────────────────────────
+def messiness(raw_text: str) -> float:
+    """0 = clean prose; grows with fillers, missing punctuation and run-on sentences."""
+    words = tokens(raw_text)
+    if not words:
+        return 0.0
+    fillers = sum(w in FILLERS for w in words) / len(words)
+    sents = split_sentences(raw_text)
+    run_on = sum(len(s.split()) > 45 for s in sents) / max(len(sents), 1)
+    unpunctuated = 1.0 if len(words) > 40 and not re.search(r"[.!?]", raw_text) else 0.0
+    return fillers + 0.5 * run_on + unpunctuated
+
+def route(raw_text: str) -> str:
+    """'local' for short, clean inputs; 'gpt' for long or messy ones."""
+    if CHUNK_ROUTE in ("local", "gpt"):
+        return CHUNK_ROUTE
+    if len(raw_text.split()) > LOCAL_MAX_WORDS:
+        return "gpt"
+    return "gpt" if messiness(raw_text) > MESSY_T else "local"
@@ -43,60 +43,10 @@
 #     }
 
 
-# logic.py
-import uuid
-from datetime import datetime
-from typing import List, Dict
-
-from openai_utils import (
-    gpt_batch_segments,
-    get_embedding
-)
-from db.chroma import add_to_chroma, query_chroma
-from db.neo4j  import create_thought_node
-
-# ───────────────────────────────────────────
-def _persist_segment(seg: Dict, user_id: str) -> Dict:
-    """
-    seg = {title, tags, text}
-    Builds full Thought node dict, stores to Chroma & Neo4j, returns node.
-    """
-    embedding = get_embedding(seg["text"])
-
-    # similarity search
-    sim = query_chroma(embedding, user_id=user_id, top_k=5)
-    related_ids = [
-        rid for rid, dist in zip(sim["ids"][0], sim["distances"][0])
-        if dist < 0.40
-    ]
-
-    now     = datetime.utcnow().isoformat()
-    node_id = str(uuid.uuid4())
-
-    node = {
-        "id": node_id,
-        "title": seg["title"],
-        "content": seg["text"],
-        "embedding_source": "openai",
-        "embedding_used": "text-embedding-3-small",
-        "created_at": now,
-        "updated_at": now,
-        "history_titles": [],
-        "tags": seg.get("tags", []),
-        "origin_input": seg["text"],
-        "user_id": user_id,
-        "related_ids": related_ids
-    }
-
-    add_to_chroma(user_id, node_id, embedding, node)
-    create_thought_node(**node)
-    return node
-
-# ───────────────────────────────────────────
 # logic.py
 from algo import ingest_entry  # your actual pipeline
 
-def process_text_into_graph(user_id: str, raw_text: str):
+def process_text_into_graph(user_id: str, raw_text: str, on_stage=None):
     # created_nodes = ingest_entry(raw_text, user_id)
     # return created_nodes
-    return ingest_entry(raw_text, user_id)
\ No newline at end of file
+    return ingest_entry(raw_text, user_id, on_stage=on_stage)
\ No newline at end of file
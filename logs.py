@@ -0,0 +1,46 @@
+# logs.py — leveled logging, buffered through a queue so callers never wait on stdout
+import atexit, logging, os, queue, sys
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_BUFFER = int(os.getenv("LOG_BUFFER", "10000"))   # records held before new ones are dropped
+
+logger = logging.getLogger("mindmap")
+dropped = 0
+
+class _BufferedHandler(QueueHandler):
+    def prepare(self, record):
+        # formatting happens on the listener thread, not the caller's
+        return record
+
+    def enqueue(self, record):
+        global dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped += 1   # never block the pipeline on a slow terminal
+
+def _setup() -> QueueListener:
+    buf: "queue.Queue" = queue.Queue(LOG_BUFFER)
+    out = logging.StreamHandler(sys.stdout)
+    out.setFormatter(logging.Formatter("[%(asctime)s.%(msecs)03d] [%(section)-7s] %(message)s", "%Y-%m-%d %H:%M:%S"))
+    logger.addHandler(_BufferedHandler(buf))
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    listener = QueueListener(buf, out, respect_handler_level=False)
+    listener.start()
+    atexit.register(listener.stop)   # flush what's buffered on exit
+    return listener
+
+_listener = _setup()
+
+def log(section: str, msg: str, level: int = logging.INFO) -> None:
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, extra={"section": section.upper()})
+
+def debug(section: str, msg: str) -> None:
+    log(section, msg, logging.DEBUG)
+
+def debug_enabled() -> bool:
+    """Guard for debug lines that are expensive to build (per-node / per-link dumps)."""
+    return logger.isEnabledFor(logging.DEBUG)
@@ -0,0 +1,122 @@
+# long_chunker.py — map-reduce chunking for transcripts too long for one GPT call
+import logging, os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+from local_chunker import content_terms, split_sentences
+from logs import log
+
+WINDOW_WORDS = int(os.getenv("CHUNK_WINDOW_WORDS", "2500"))
+OVERLAP_WORDS = int(os.getenv("CHUNK_OVERLAP_WORDS", "200"))
+CHUNK_CONCURRENCY = int(os.getenv("CHUNK_CONCURRENCY", "8"))
+DEDUPE_T = 0.5       # content-term Jaccard above which two seam segments are the same thought
+INSIDE_SLACK = 0.2   # share of a seam segment's terms allowed outside the previous window (paraphrase)
+MIN_COVERAGE = float(os.getenv("CHUNK_MIN_COVERAGE", "0.9"))   # warn below this share of input terms kept
+
+# ───────────────────────────  WINDOWS  ─────────────────────────────────
+def _word_runs(sentence: str, window_words: int, overlap_words: int) -> List[str]:
+    """The sentence itself, or runs of window_words words overlapping by overlap_words."""
+    words = sentence.split()
+    if len(words) <= window_words:
+        return [sentence]
+    step = max(1, window_words - overlap_words)
+    runs = []
+    for i in range(0, len(words), step):
+        runs.append(" ".join(words[i:i + window_words]))
+        if i + window_words >= len(words):
+            break
+    return runs
+
+def sentence_windows(text: str, window_words: int = WINDOW_WORDS,
+                     overlap_words: int = OVERLAP_WORDS) -> List[str]:
+    """
+    Windows of ~window_words that start and end on sentence boundaries;
+    each repeats the last ~overlap_words of the previous one so no thought
+    is cut in half at a seam. Every sentence lands in at least one window.
+    A sentence longer than a window (unpunctuated speech-to-text) is first
+    cut into overlapping word runs, so no window exceeds window_words.
+    """
+    sentences = [p for s in split_sentences(text) for p in _word_runs(s, window_words, overlap_words)]
+    lens = [len(s.split()) for s in sentences]
+    windows, start = [], 0
+    while start < len(sentences):
+        end, words = start, 0
+        while end < len(sentences) and (words + lens[end] <= window_words or end == start):
+            words += lens[end]
+            end += 1
+        windows.append(" ".join(sentences[start:end]))
+        if end >= len(sentences):
+            break
+        back, nxt = 0, end
+        while nxt - 1 > start + 1 and back + lens[nxt - 1] <= overlap_words:
+            nxt -= 1
+            back += lens[nxt]
+        start = nxt
+    return windows
+
+# ────────────────────────────  MAP  ────────────────────────────────────
+def map_windows(windows: Sequence[str], chunk_fn: Callable[[str], List[Dict]],
+                concurrency: int = CHUNK_CONCURRENCY) -> List[List[Dict]]:
+    """
+    Runs chunk_fn on every window concurrently; results keep window order.
+    No retries here: the gateway has already retried transient errors.
+    """
+    if not windows:
+        return []
+    if len(windows) == 1:
+        return [chunk_fn(windows[0])]
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(windows)), thread_name_prefix="chunk") as pool:
+        futures = [pool.submit(chunk_fn, w) for w in windows]
+        return [f.result() for f in futures]
+
+# ───────────────────────────  REDUCE  ──────────────────────────────────
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+def _inside(bag: set, terms: set) -> bool:
+    return bool(bag) and len(bag - terms) <= INSIDE_SLACK * len(bag)
+
+def merge_segments(per_window: List[List[Dict]], text_key: str = "content", seam: int = 4,
+                   windows: Optional[Sequence[str]] = None) -> List[Dict]:
+    """
+    Concatenates window outputs in order, dropping a segment at the head
+    of a window when it repeats one of the last `seam` segments of the
+    previous window (the overlap region chunked twice). Given the window
+    texts, a head segment is only dropped if its content also lies inside
+    the previous window, so one that runs past the overlap is kept.
+    """
+    merged: List[Dict] = []
+    prev_tail: List[set] = []
+    prev_terms: Optional[set] = None
+    for w, segs in enumerate(per_window):
+        bags = [set(content_terms(s.get(text_key, ""))) for s in segs]
+        for i, (seg, bag) in enumerate(zip(segs, bags)):
+            if (i < seam and any(_jaccard(bag, p) >= DEDUPE_T for p in prev_tail)
+                    and (prev_terms is None or _inside(bag, prev_terms))):
+                continue
+            merged.append(seg)
+        prev_tail = bags[-seam:]
+        prev_terms = set(content_terms(windows[w])) if windows is not None else None
+    return merged
+
+def coverage(text: str, segments: List[Dict], text_key: str = "content") -> float:
+    """Share of the input's distinct content terms that made it into some segment."""
+    want = set(content_terms(text))
+    if not want:
+        return 1.0
+    got = set()
+    for s in segments:
+        got.update(content_terms(s.get(text_key, "")))
+    return len(want & got) / len(want)
+
+def check_coverage(text: str, segments: List[Dict], text_key: str = "content") -> None:
+    cov = coverage(text, segments, text_key)
+    if cov < MIN_COVERAGE:
+        log("CHUNK", f"segments cover only {cov:.0%} of the input's content terms "
+                     f"({len(segments)} segments)", logging.WARNING)
+
+def map_reduce_chunk(text: str, chunk_fn: Callable[[str], List[Dict]], text_key: str = "content") -> List[Dict]:
+    windows = sentence_windows(text)
+    merged = merge_segments(map_windows(windows, chunk_fn), text_key, windows=windows)
+    check_coverage(text, merged, text_key)
+    return merged
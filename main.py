@@ -2,14 +2,72 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from api import router as api_router  # Your actual router file with endpoints
+from api import router as api_router, submit_import, submit_move  # Your actual router file with endpoints
+from algo import CHUNK_MODEL, EMBED_MODEL
+from bulk_import import get_import_log
+from jobs import get_maintenance_queue
+from logs import log
+from relink import full_relink, get_checkpoints
+from metrics import render as render_metrics
+from outbox import OUTBOX_DB, get_outbox
+from resources import PREWARM, close_all, warm
+from shards import get_shard_map, sharded
+from snapshot import SNAPSHOT_RESTORE, load_snapshot
+
+def resume_relinks():
+    # full re-links cut short by a restart pick up from their checkpoint
+    for user_id in get_checkpoints().unfinished():
+        get_maintenance_queue().submit(user_id, lambda publish, u=user_id: full_relink(u, publish),
+                                       key=f"relink:{user_id}", reuse_finished=False)
+
+def resume_imports():
+    # bulk imports interrupted by a restart continue from their last checkpointed batch
+    for import_id, user_id, path in get_import_log().unfinished():
+        if os.path.exists(path):
+            submit_import(import_id, user_id, path)
+
+def resume_moves():
+    # shard moves cut short by a restart run again (every step is idempotent)
+    if sharded():
+        for user_id, _, dst in get_shard_map().moving():
+            submit_move(user_id, dst)
+
+def resume_outbox():
+    # writes logged before a restart but not yet applied drain in the background
+    if os.path.exists(OUTBOX_DB):
+        get_outbox()
+
+def restore_snapshot():
+    # warm start: an in-memory vector index comes back from the snapshot, not from re-embedding
+    if SNAPSHOT_RESTORE:
+        get_maintenance_queue().submit("*", lambda publish: load_snapshot(SNAPSHOT_RESTORE, publish=publish),
+                                       key=f"snapshot-load:{SNAPSHOT_RESTORE}", reuse_finished=False)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # nothing heavy at import: Neo4j / OpenAI / vectors (and Whisper if listed in
+    # PREWARM) build in the background here, or on first use otherwise
+    log("INIT", f"chunk={CHUNK_MODEL}, embed={EMBED_MODEL}, prewarm={','.join(PREWARM) or '-'}")
+    warm(PREWARM)
+    resume_relinks()
+    resume_imports()
+    resume_outbox()
+    resume_moves()
+    restore_snapshot()
+    yield
+    close_all()
 
 app = FastAPI(
     title="Voice Knowledge Graph API",
     version="1.0.0",
-    description="Takes in user voice or text, chunks it into thought nodes, and builds an evolving mind map."
+    description="Takes in user voice or text, chunks it into thought nodes, and builds an evolving mind map.",
+    lifespan=lifespan,
 )
 
 # CORS CONFIGURATION
@@ -32,6 +90,11 @@ app.add_middleware(
 # ROUTES
 app.include_router(api_router, prefix="/api/v1")
 
+@app.get("/api/v1/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text exposition; scrape this
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     return {"message": "API is running! Visit /docs for interactive documentation."}
@@ -0,0 +1,142 @@
+# metrics.py — in-process counters / histograms rendered in Prometheus text format
+import threading, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _labels(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{n}="{esc(v)}"' for n, v in zip(names, values)) + "}"
+
+def _num(v: float) -> str:
+    # exact: {:g} keeps 6 significant digits, so a byte counter past 1e6 stops moving between scrapes
+    if isinstance(v, int):
+        return str(int(v))   # bools from stats dicts too
+    v = float(v)
+    if v != v:
+        return "NaN"
+    if v in (float("inf"), float("-inf")):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(v)
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, n: float = 1, **labels) -> None:
+        key = tuple(labels.get(l, "") for l in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"] + [
+            f"{self.name}{_labels(self.labels, k)} {_num(v)}" for k, v in items
+        ]
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, tuple(labels), tuple(buckets)
+        self._series: Dict[Tuple, List] = {}   # key → [bucket counts…, +Inf], sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(l, "") for l in self.labels)
+        with self._lock:
+            counts, total = self._series.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect_left(self.buckets, value)] += 1
+            self._series[key] = [counts, total + value]
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def totals(self) -> Dict[Tuple, Tuple[int, float]]:
+        """(count, sum) per label set — for benchmarks that diff before/after."""
+        with self._lock:
+            return {k: (sum(c), s) for k, (c, s) in self._series.items()}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._series.items())
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in items:
+            cum = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cum += c
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                out.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + (le,))} {cum}")
+            out.append(f"{self.name}_sum{_labels(self.labels, key)} {_num(total)}")
+            out.append(f"{self.name}_count{_labels(self.labels, key)} {cum}")
+        return out
+
+class Collected:
+    """Values read at scrape time from another component's own stats dict."""
+
+    def __init__(self, name: str, help: str, kind: str, labels: Iterable[str],
+                 fn: Callable[[], Iterable[Tuple[Tuple, float]]]):
+        self.name, self.help, self.kind, self.labels, self.fn = name, help, kind, tuple(labels), fn
+
+    def render(self) -> List[str]:
+        try:
+            items = list(self.fn())
+        except Exception:
+            return []   # component not started (e.g. Whisper pool in a text-only process)
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + [
+            f"{self.name}{_labels(self.labels, k)} {_num(v)}" for k, v in items
+        ]
+
+# ──────────────────────────  REGISTRY  ─────────────────────────────────
+_registry: Dict[str, object] = {}
+_registry_lock = threading.Lock()
+
+def _register(metric):
+    with _registry_lock:
+        return _registry.setdefault(metric.name, metric)
+
+def counter(name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+    return _register(Counter(name, help, labels))
+
+def histogram(name: str, help: str, labels: Iterable[str] = (), buckets: Tuple = LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help, labels, buckets))
+
+def collected(name: str, help: str, fn: Callable, kind: str = "gauge", labels: Iterable[str] = ()) -> Collected:
+    return _register(Collected(name, help, kind, labels, fn))
+
+def render() -> str:
+    with _registry_lock:
+        metrics = [_registry[k] for k in sorted(_registry)]
+    return "\n".join(line for m in metrics for line in m.render()) + "\n"
+
+# ───────────────────────  SHARED INSTRUMENTS  ──────────────────────────
+STAGE_SECONDS = histogram("mindmap_stage_seconds", "Latency of one pipeline stage", ["stage"])
+EXTERNAL_CALLS = counter("mindmap_external_calls_total", "Calls to external services", ["service", "op", "outcome"])
+EXTERNAL_SECONDS = histogram("mindmap_external_call_seconds", "Latency of external service calls", ["service", "op"])
+TOKENS = counter("mindmap_tokens_total", "OpenAI tokens reported by the API", ["model", "kind"])
+BYTES = counter("mindmap_bytes_total", "Payload bytes through the pipeline", ["kind"])
+ITEMS = counter("mindmap_items_total", "Things produced by the pipeline", ["kind"])
+
+@contextmanager
+def external(service: str, op: str):
+    """Times one external call and counts it by outcome."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        EXTERNAL_CALLS.inc(service=service, op=op, outcome="error")
+        raise
+    else:
+        EXTERNAL_CALLS.inc(service=service, op=op, outcome="ok")
+    finally:
+        EXTERNAL_SECONDS.observe(time.perf_counter() - t0, service=service, op=op)
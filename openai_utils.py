@@ -28,32 +28,37 @@
 
 
 # openai_utils.py
-import os, json
-from typing import List, Dict
-from openai import OpenAI
+import json, logging
+from typing import TYPE_CHECKING, List, Dict
+
+from embed_cache import get_cache
+from llm_gateway import get_gateway
+from logs import log
+from long_chunker import check_coverage, map_windows, merge_segments, sentence_windows
+
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 # ───────────────────────────────────────────
 #  OpenAI client helper
 # ───────────────────────────────────────────
-def get_openai_client() -> OpenAI:
-    key = os.getenv("OPENAI_API_KEY")
-    if not key:
-        raise RuntimeError("OPENAI_API_KEY is not set.")
-    return OpenAI(api_key=key)
+def get_openai_client() -> "OpenAI":
+    """The gateway's shared keep-alive client (raises if OPENAI_API_KEY is unset)."""
+    return get_gateway().client
 
 # ───────────────────────────────────────────
 #  Embedding helper
 # ───────────────────────────────────────────
-def get_embedding(text: str) -> List[float]:
-    client = get_openai_client()
-    resp = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text
-    )
-    return resp.data[0].embedding
+def get_embedding(text: str, model: str = "text-embedding-3-small") -> List[float]:
+    def fetch(texts: List[str]) -> List[List[float]]:
+        resp = get_gateway().embed(model, texts)
+        return [d.embedding for d in resp.data]
+
+    vectors, _ = get_cache().embed(model, [text], fetch)
+    return vectors[0]
 
 # ───────────────────────────────────────────
-#  Batch semantic chunk + meta   (ONE call)
+#  Batch semantic chunk + meta   (ONE call per window)
 #  Returns List[ Dict{ title,tags,text } ]
 # ───────────────────────────────────────────
 _SEGMENT_FN = {
@@ -86,42 +91,51 @@ _SEGMENT_FN = {
     }
 }
 
+def _gpt_segments(raw_text: str, target_max: int) -> List[Dict]:
+    resp = get_gateway().chat(
+        model="gpt-4o-mini",
+        messages=[
+            {
+                "role": "system",
+                "content": (
+                    "Split the transcript into 50-80 coherent chunks, "
+                    "each ≤150 words. Call the function."
+                )
+            },
+            {"role": "user", "content": raw_text}
+        ],
+        functions=[_SEGMENT_FN],
+        function_call={"name": "return_segments"},
+        temperature=0.2,
+        max_tokens=8192
+    )
+    segments_json = resp.choices[0].message.function_call.arguments
+    segments = json.loads(segments_json)["segments"]
+    if len(segments) > target_max:
+        # kept: cutting them would drop the end of the window
+        log("CHUNK", f"GPT returned {len(segments)} segments for one window (asked for ≤{target_max})",
+            logging.WARNING)
+    return segments
+
 def gpt_batch_segments(raw_text: str, target_max=80) -> List[Dict]:
     """
     Returns a list of {title,tags,text} dicts.
-    Falls back to naive word-chunk if GPT fails.
+    Long transcripts are split into overlapping sentence windows that are
+    segmented in parallel and merged (long_chunker) – nothing is clipped.
+    A window falls back to naive word-chunks if GPT keeps failing
+    (the gateway has already retried transient errors by then).
     """
-    client = get_openai_client()
-
-    # *Very* big transcripts? clip to first 12k words to stay < 16k tokens
-    words = raw_text.split()
-    if len(words) > 12000:
-        raw_text = " ".join(words[:12000])
+    def segment_window(text: str) -> List[Dict]:
+        try:
+            return _gpt_segments(text, target_max)
+        except Exception as e:
+            log("CHUNK", f"GPT segmenter failed, fallback to word windows: {e}", logging.WARNING)
+            return _fallback_word_segments(text)
 
-    try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "Split the transcript into 50-80 coherent chunks, "
-                        "each ≤150 words. Call the function."
-                    )
-                },
-                {"role": "user", "content": raw_text}
-            ],
-            functions=[_SEGMENT_FN],
-            function_call={"name": "return_segments"},
-            temperature=0.2,
-            max_tokens=8192
-        )
-        segments_json = resp.choices[0].message.function_call.arguments
-        segments = json.loads(segments_json)["segments"]
-        return segments[:target_max]          # strong safety cap
-    except Exception as e:
-        print("GPT segmenter failed, fallback to word windows:", e)
-        return _fallback_word_segments(raw_text)
+    windows = sentence_windows(raw_text)
+    segments = merge_segments(map_windows(windows, segment_window), text_key="text", windows=windows)
+    check_coverage(raw_text, segments, text_key="text")
+    return segments
 
 # ───────────────────────────────────────────
 #  Fallback deterministic chunker
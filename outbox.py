@@ -0,0 +1,271 @@
+# outbox.py — write-ahead log for the vector-store + Neo4j writes, drained by background appliers
+import json, logging, os, sqlite3, threading, time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from embed_repr import reduce
+from graph_store import get_driver, write_thoughts
+from logs import log
+from metrics import STAGE_SECONDS, collected, counter, external
+from resources import resource
+from vector_store import add_many
+
+OUTBOX_DB = os.getenv("OUTBOX_DB", "outbox.sqlite3")
+OUTBOX_BATCH_NODES = int(os.getenv("OUTBOX_BATCH_NODES", "2000"))   # nodes per applied store call
+OUTBOX_POLL_S = float(os.getenv("OUTBOX_POLL_S", "1.0"))
+OUTBOX_WAIT_S = float(os.getenv("OUTBOX_WAIT_S", "10.0"))   # longest a read-your-writes caller waits
+OUTBOX_MAX_BACKOFF_S = 30.0
+STORES = ("vectors", "neo4j")
+
+OUTBOX_APPLIED = counter("mindmap_outbox_applied_total", "Outbox records applied per store", ["store"])
+OUTBOX_FAILURES = counter("mindmap_outbox_failures_total", "Failed outbox apply attempts per store", ["store"])
+
+class OutboxLagging(RuntimeError):
+    """A logged write is durable but not yet in the stores a caller is about to read."""
+
+# ─────────────────────────────  LOG  ───────────────────────────────────
+class Outbox:
+    """
+    Durable log of node writes. append() commits one record (nodes, their
+    full embeddings, vector metadata) and returns; one applier thread per
+    store replays records in seq order, many per store call, and advances
+    that store's cursor only after the call succeeds. Records behind
+    every cursor are deleted.
+
+    Writes that bypass the log (edits, deletes, dedupe merges) fence()
+    the nodes they touch first: an applier skips a node whose
+    fence is newer than the record, so a record still pending from before
+    the edit cannot overwrite it, and one from before a delete or merge
+    cannot bring the node back (nor an edge to it). Fences go once no
+    pending record predates them. The same check makes the replay after
+    a crash (cursor not yet advanced) safe. Relinking only replaces edges,
+    so it settle()s instead: it reads the graph once the log is applied.
+    """
+
+    def __init__(self, path: str = OUTBOX_DB, start: bool = True):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, n INTEGER, nodes TEXT, metas TEXT,"
+            " dim INTEGER, vectors BLOB, created_at REAL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS outbox_cursors (store TEXT PRIMARY KEY, seq INTEGER)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox_fences ("
+            " user_id TEXT, id TEXT, at REAL, gone INTEGER, PRIMARY KEY (user_id, id))"
+        )
+        self._db.executemany("INSERT OR IGNORE INTO outbox_cursors VALUES (?, 0)", [(s,) for s in STORES])
+        self._db.commit()
+        self._cursors = {s: self.cursor(s) for s in STORES}
+        self._applied = threading.Condition()
+        self._wake = {s: threading.Event() for s in STORES}
+        self._applying = {s: threading.Lock() for s in STORES}   # held from reading fences to the store call
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        if start:
+            self.start()
+
+    def start(self) -> None:
+        for store in STORES:
+            t = threading.Thread(target=self._run, args=(store,), name=f"outbox-{store}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        for e in self._wake.values():
+            e.set()
+        for t in self._threads:
+            t.join(timeout)
+        with self._lock:
+            self._db.close()
+
+    def append(self, user_id: str, nodes: List[Dict], vectors: List[List[float]], metas: List[Dict]) -> int:
+        """Logs one write durably; returns its seq. The stores see it once the appliers catch up."""
+        V = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO outbox (user_id, n, nodes, metas, dim, vectors, created_at) VALUES (?,?,?,?,?,?,?)",
+                (user_id, len(nodes), json.dumps(nodes), json.dumps(metas),
+                 V.shape[1] if V.ndim == 2 else 0, V.tobytes(), time.time()),
+            )
+            self._db.commit()
+        for e in self._wake.values():
+            e.set()
+        return cur.lastrowid
+
+    def fence(self, user_id: str, ids: List[str], gone: bool = False) -> None:
+        """
+        Call BEFORE a write that bypasses the log: pending records older
+        than now no longer touch `ids` in either store. gone=True (deleted
+        or merged away) also drops links to them from those records.
+        """
+        if not ids:
+            return
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM outbox LIMIT 1").fetchone() is None:
+                return   # nothing pending; every later record is newer than the write
+            now = time.time()
+            self._db.executemany(
+                "INSERT INTO outbox_fences VALUES (?,?,?,?) ON CONFLICT (user_id, id)"
+                " DO UPDATE SET at=excluded.at, gone=max(gone, excluded.gone)",
+                [(user_id, i, now, int(gone)) for i in ids],
+            )
+            self._db.commit()
+        # a batch already past its fence check finishes before the caller writes
+        for lock in self._applying.values():
+            with lock:
+                pass
+
+    # ── reading ────────────────────────────────────────────────────
+    def cursor(self, store: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT seq FROM outbox_cursors WHERE store=?", (store,)).fetchone()[0]
+
+    def head(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT coalesce(max(seq), 0) FROM outbox").fetchone()[0]
+
+    def pending(self, store: str) -> Tuple[int, int]:
+        """(records, nodes) not yet applied to `store`."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT count(*), coalesce(sum(n), 0) FROM outbox"
+                " WHERE seq > (SELECT seq FROM outbox_cursors WHERE store=?)", (store,),
+            ).fetchone()
+        return row[0], row[1]
+
+    def _read(self, after: int, max_nodes: int) -> List[Tuple]:
+        # whole records only, at least one, until max_nodes is reached
+        out, total = [], 0
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, user_id, n, nodes, metas, dim, vectors, created_at FROM outbox"
+                " WHERE seq > ? ORDER BY seq LIMIT ?",
+                (after, max(1, max_nodes)),
+            ).fetchall()
+        for row in rows:
+            if out and total + row[2] > max_nodes:
+                break
+            out.append(row)
+            total += row[2]
+        return out
+
+    def _advance(self, store: str, seq: int) -> None:
+        with self._lock:
+            self._db.execute("UPDATE outbox_cursors SET seq=? WHERE store=?", (seq, store))
+            # everything every store has applied is no longer needed
+            self._db.execute("DELETE FROM outbox WHERE seq <= (SELECT min(seq) FROM outbox_cursors)")
+            self._db.execute("DELETE FROM outbox_fences WHERE at < coalesce((SELECT min(created_at) FROM outbox), ?)",
+                             (time.time(),))
+            self._db.commit()
+        with self._applied:
+            self._cursors[store] = seq
+            self._applied.notify_all()
+
+    # ── applying ───────────────────────────────────────────────────
+    def _fences(self, user_ids: List[str]) -> Dict[Tuple[str, str], Tuple[float, bool]]:
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT user_id, id, at, gone FROM outbox_fences WHERE user_id IN ({','.join('?' * len(user_ids))})",
+                user_ids,
+            ).fetchall()
+        return {(u, i): (at, bool(gone)) for u, i, at, gone in rows}
+
+    def _unfenced(self, rows: List[Tuple]):
+        """(row, nodes, keep mask) per record, minus nodes written directly since the record was logged."""
+        fences = self._fences(sorted({r[1] for r in rows}))
+        for r in rows:
+            user_id, created_at, nodes = r[1], r[7], json.loads(r[3])
+            if not fences:
+                yield r, nodes, [True] * len(nodes)
+                continue
+            newer = {i for (u, i), (at, _) in fences.items() if u == user_id and at >= created_at}
+            gone = {i for (u, i), (at, g) in fences.items() if u == user_id and g and at >= created_at}
+            mask = [n["id"] not in newer for n in nodes]
+            for n in nodes:
+                if gone and n.get("related_ids"):
+                    n["related_ids"] = [i for i in n["related_ids"] if i not in gone]
+            yield r, nodes, mask
+
+    def _apply(self, store: str, rows: List[Tuple]) -> None:
+        if store == "neo4j":
+            per_user: Dict[str, List[Dict]] = {}
+            for r, nodes, mask in self._unfenced(rows):
+                per_user.setdefault(r[1], []).extend(n for n, keep in zip(nodes, mask) if keep)
+            # one tx per user: each goes to that user's shard
+            with STAGE_SECONDS.time(stage="neo4j_write"), external("neo4j", "write_thoughts"):
+                for user_id, nodes in per_user.items():
+                    if nodes:
+                        write_thoughts(get_driver(user_id), nodes)
+            return
+        by_user: Dict[str, Dict[str, Tuple]] = {}
+        for (_, user_id, n, _, metas, dim, blob, _), nodes, mask in self._unfenced(rows):
+            V = np.frombuffer(blob, dtype=np.float32).reshape(n, dim) if n else np.zeros((0, 0), np.float32)
+            # later records win: an existing node can be rewritten (merged into) more than once
+            for node, meta, v, keep in zip(nodes, json.loads(metas), V, mask):
+                if keep:
+                    by_user.setdefault(user_id, {})[node["id"]] = (meta, v)
+        with STAGE_SECONDS.time(stage="vector_write"):
+            for user_id, items in by_user.items():
+                V = np.stack([v for _, v in items.values()])
+                add_many(user_id, list(items), reduce(V).tolist(), [m for m, _ in items.values()], full=V)
+
+    def _run(self, store: str) -> None:
+        backoff = 0.0
+        after = self._cursors[store]
+        while not self._stop.is_set():
+            self._wake[store].clear()
+            rows = self._read(after, OUTBOX_BATCH_NODES)
+            if not rows:
+                self._wake[store].wait(OUTBOX_POLL_S)
+                continue
+            try:
+                with self._applying[store]:
+                    self._apply(store, rows)
+            except Exception as exc:
+                OUTBOX_FAILURES.inc(store=store)
+                backoff = min(OUTBOX_MAX_BACKOFF_S, max(0.5, backoff * 2))
+                log("OUTBOX", f"{store}: applying seq {rows[0][0]}..{rows[-1][0]} failed ({exc}); "
+                              f"retrying in {backoff:.1f}s", logging.WARNING)
+                self._stop.wait(backoff)
+                continue
+            backoff = 0.0
+            after = rows[-1][0]
+            self._advance(store, after)
+            OUTBOX_APPLIED.inc(len(rows), store=store)
+
+    def wait(self, seq: int, stores: Tuple[str, ...] = STORES, timeout: float = OUTBOX_WAIT_S) -> bool:
+        """Blocks until `stores` have applied `seq` (read-your-writes callers, tests)."""
+        with self._applied:
+            return self._applied.wait_for(lambda: min(self._cursors[s] for s in stores) >= seq, timeout)
+
+    def status(self) -> Dict:
+        return {"pending": {s: self.pending(s)[1] for s in STORES}, "head": self.head()}
+
+OUTBOX = resource("outbox", Outbox, close=lambda o: o.close(), check=lambda o: o.status())
+
+def get_outbox() -> Outbox:
+    return OUTBOX.get()
+
+def fence(user_id: str, ids: List[str], gone: bool = False) -> None:
+    """Outbox.fence for direct writers; free when this deployment never logged anything."""
+    if OUTBOX.peek() is None and not os.path.exists(OUTBOX_DB):
+        return
+    get_outbox().fence(user_id, ids, gone)
+
+def settle(stores: Tuple[str, ...] = STORES, timeout: float = OUTBOX_WAIT_S) -> bool:
+    """Waits until `stores` hold everything logged so far; False on timeout."""
+    if OUTBOX.peek() is None and not os.path.exists(OUTBOX_DB):
+        return True
+    box = get_outbox()
+    return box.wait(box.head(), stores, timeout)
+
+def _lag():
+    box = OUTBOX.peek()
+    return [((s,), box.pending(s)[1]) for s in STORES] if box is not None else []
+
+collected("mindmap_outbox_pending_nodes", "Logged nodes not yet applied, per store", _lag, labels=["store"])
@@ -0,0 +1,106 @@
+# rebalance.py — moving a user between shards online, and per-shard stats
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from algo import batch_embed, vector_meta
+from embed_repr import reduce
+from graph_store import (NEO4J_SHARD_DATABASES, bump_version, delete_nodes, fetch_graph, fetch_page,
+                         purge_user, scan_nodes, shard_driver, write_thoughts)
+from logs import log
+from outbox import settle
+from relink import RELINK_BATCH
+from shards import SHARD_SECONDS, get_shard_map
+from vector_store import get_store
+
+# everything scan_nodes returns, for the catch-up pass through fetch_page
+COPY_FIELDS = ["user_id", "title", "content", "tags", "content_hash", "origin_input", "created_at",
+               "history_titles", "related_ids"]
+
+def _copy(user_id: str, nodes: List[Dict], dst: str, graph: bool) -> None:
+    for n in nodes:
+        n["tags"] = n.get("tags") or []
+        n["related_ids"] = n.get("related_ids") or []
+    if graph:
+        write_thoughts(shard_driver(dst), nodes)
+    V = batch_embed(nodes)   # from the embedding cache: the text was embedded when it was stored
+    get_store().backend(dst).add_many(user_id, [n["id"] for n in nodes], reduce(V).tolist(),
+                                      [vector_meta(n) for n in nodes], full=V)
+
+def _ids(shard: str, user_id: str) -> set:
+    return {r["id"] for r in fetch_graph(shard_driver(shard), user_id)}
+
+def move_user(user_id: str, dst: str, publish: Optional[Callable[[str, Dict], None]] = None,
+              batch: int = RELINK_BATCH) -> Dict:
+    """
+    Moves a user's vectors and graph to shard `dst` while they keep
+    reading and writing:
+      1. writes start going to both shards (reads stay on the source)
+      2. every node is copied across, `batch` per page; vectors come from
+         the embedding cache
+      3. catch-up: nodes updated since the copy began are copied again and
+         nodes deleted meanwhile are deleted on the target
+      4. reads flip to the target, then the source copy is purged
+    Every step is an upsert or a delete, so an interrupted move simply
+    runs again (main.py resubmits unfinished ones at startup).
+    """
+    publish = publish or (lambda stage, info: None)
+    smap = get_shard_map()
+    src = smap.begin_move(user_id, dst)
+    # writes logged before dual writes began were routed to the source only: land them before copying
+    if not settle():
+        log("SHARDS", f"user={user_id}: outbox still applying older writes; the catch-up pass copies them")
+    # shards sharing a Neo4j database already share the graph: only vectors move
+    graph = NEO4J_SHARD_DATABASES.get(src) != NEO4J_SHARD_DATABASES.get(dst)
+    started = datetime.now(timezone.utc).isoformat()
+    log("SHARDS", f"user={user_id} moving {src} → {dst} (graph={'copy' if graph else 'shared'})")
+
+    copied, after = set(), ""
+    while True:
+        page = scan_nodes(shard_driver(src), user_id, after, batch)
+        if not page:
+            break
+        _copy(user_id, page, dst, graph)
+        copied.update(n["id"] for n in page)
+        after = page[-1]["id"]
+        publish("copied", {"nodes": len(copied)})
+
+    recopied, cursor = 0, None
+    while True:
+        page = fetch_page(shard_driver(src), user_id, COPY_FIELDS, batch, cursor, updated_since=started)
+        if page["items"]:
+            _copy(user_id, page["items"], dst, graph)
+            recopied += len(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    # anything else on the target arrived through dual writes, which deletes reach too
+    stale = sorted(copied - _ids(src, user_id))
+    if stale:
+        if graph:
+            delete_nodes(shard_driver(dst), user_id, stale)
+        get_store().backend(dst).delete_many(user_id, stale)
+    publish("reconciled", {"recopied": recopied, "deleted": len(stale)})
+
+    smap.finish_move(user_id)
+    bump_version(user_id)   # cached search / layout results were read from the source
+    old = sorted(_ids(src, user_id))
+    if graph:
+        purge_user(shard_driver(src), user_id)
+    get_store().backend(src).delete_many(user_id, old)
+    log("SHARDS", f"user={user_id} moved {src} → {dst}: {len(copied)} nodes, {recopied} re-copied, "
+                  f"{len(stale)} deleted, {len(old)} purged from {src}")
+    return {"from": src, "to": dst, "copied": len(copied), "recopied": recopied, "purged": len(old)}
+
+# ─────────────────────────────  STATS  ─────────────────────────────────
+def shard_stats() -> Dict:
+    """Per shard: users placed, backend size figures, and call count / mean latency per store op."""
+    smap = get_shard_map()
+    usage = get_store().usage()
+    out = {s: {"users": n, "vectors": usage.get(s, {}), "moving_in": 0, "latency": {}}
+           for s, n in smap.users_per_shard().items()}
+    for _, _, dst in smap.moving():
+        out.setdefault(dst, {"users": 0, "vectors": {}, "moving_in": 0, "latency": {}})["moving_in"] += 1
+    for (shard, store, op), (count, total) in SHARD_SECONDS.totals().items():
+        if shard in out and count:
+            out[shard]["latency"][f"{store}.{op}"] = {"calls": count, "mean_ms": round(total / count * 1e3, 2)}
+    return out
@@ -0,0 +1,149 @@
+# relink.py — incremental re-linking: dirty nodes, changed-content re-embeds, edges both ways
+import os, sqlite3, threading, time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from algo import _split_links, batch_embed, content_hash, vector_meta
+from logs import log
+from outbox import settle
+from embed_repr import reduce
+from graph_store import bump_version, fetch_dirty, get_driver, replace_links, scan_nodes
+from vector_store import add_many, query_many
+
+RELINK_DB = os.getenv("RELINK_DB", "relink.sqlite3")
+RELINK_BATCH = int(os.getenv("RELINK_BATCH", "200"))   # nodes per neighbour query / write tx
+RELINK_TOP_K = 10                                        # same k as decide_links_batch
+
+# ─────────────────────────────  CORE  ──────────────────────────────────
+def relink_nodes(user_id: str, nodes: List[Dict], driver=None, k: int = RELINK_TOP_K) -> Dict:
+    """
+    Recomputes the neighbours of `nodes` (dicts as returned by
+    graph_store.fetch_nodes) against the user's whole graph:
+      • nodes whose content_hash changed are re-embedded and upserted;
+        unchanged text comes back from the embedding cache
+      • ONE batched neighbour query for all of them
+      • ONE write tx replacing their edges in both directions
+    """
+    driver = driver or get_driver(user_id)
+    if not nodes:
+        return {"relinked": 0, "reembedded": 0, "touched": []}
+    for n in nodes:
+        n["tags"] = n.get("tags") or []
+    hashes = {n["id"]: content_hash(n) for n in nodes}
+    V = np.asarray(batch_embed(nodes), dtype=np.float32)
+
+    changed = [i for i, n in enumerate(nodes) if n.get("content_hash") != hashes[n["id"]]]
+    if changed:
+        add_many(user_id, [nodes[i]["id"] for i in changed], reduce(V[changed]).tolist(),
+                 [vector_meta(nodes[i]) for i in changed], full=V[changed])
+
+    q = query_many(reduce(V).tolist(), user_id=user_id, top_k=k + 1, full=V)
+    links: Dict[str, List[str]] = {}
+    for n, hit_ids, dists in zip(nodes, q["ids"], q["distances"]):
+        hits = [(i, d) for i, d in zip(hit_ids, dists) if i != n["id"]][:k]
+        sims = 1.0 - np.asarray([d for _, d in hits], dtype=np.float32)
+        direct, fuzzy = _split_links([i for i, _ in hits], sims)
+        links[n["id"]] = direct + fuzzy
+
+    touched = replace_links(driver, links, hashes)
+    bump_version(user_id, driver)
+    log("RELINK", f"user={user_id} relinked={len(nodes)} re-embedded={len(changed)} "
+                  f"edges={sum(map(len, links.values()))} touched={len(touched)}")
+    return {"relinked": len(nodes), "reembedded": len(changed), "touched": touched}
+
+def relink_dirty(user_id: str, driver=None, batch: int = RELINK_BATCH) -> Dict:
+    """Drains the user's dirty set (edited nodes not yet re-linked)."""
+    driver = driver or get_driver(user_id)
+    total = {"relinked": 0, "reembedded": 0}
+    while True:
+        settle(("neo4j",))   # read what ingest already logged, so its replay can't undo these links
+        nodes = fetch_dirty(driver, user_id, batch)
+        if not nodes:
+            return total
+        out = relink_nodes(user_id, nodes, driver)
+        total["relinked"] += out["relinked"]
+        total["reembedded"] += out["reembedded"]
+
+# ──────────────────────────  CHECKPOINTS  ──────────────────────────────
+class CheckpointStore:
+    """Per-user progress of the full re-link scan (last node id done)."""
+
+    def __init__(self, path: str = RELINK_DB):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS relink_checkpoints ("
+            " user_id TEXT PRIMARY KEY, after TEXT, relinked INTEGER, started_at REAL, finished_at REAL)"
+        )
+        self._db.commit()
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT after, relinked, started_at, finished_at FROM relink_checkpoints WHERE user_id=?",
+                (user_id,),
+            ).fetchone()
+        return dict(zip(("after", "relinked", "started_at", "finished_at"), row)) if row else None
+
+    def save(self, user_id: str, after: str, relinked: int, finished: bool = False) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO relink_checkpoints VALUES (?,?,?,?,?) ON CONFLICT(user_id) DO UPDATE SET"
+                " after=excluded.after, relinked=excluded.relinked, finished_at=excluded.finished_at",
+                (user_id, after, relinked, time.time(), time.time() if finished else None),
+            )
+            self._db.commit()
+
+    def start(self, user_id: str) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO relink_checkpoints VALUES (?,?,?,?,?)",
+                             (user_id, "", 0, time.time(), None))
+            self._db.commit()
+
+    def unfinished(self) -> List[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT user_id FROM relink_checkpoints WHERE finished_at IS NULL").fetchall()
+        return [r[0] for r in rows]
+
+_checkpoints: Optional[CheckpointStore] = None
+_checkpoints_lock = threading.Lock()
+
+def get_checkpoints() -> CheckpointStore:
+    global _checkpoints
+    with _checkpoints_lock:
+        if _checkpoints is None:
+            _checkpoints = CheckpointStore()
+        return _checkpoints
+
+# ─────────────────────────  FULL RE-LINK  ──────────────────────────────
+def full_relink(user_id: str, publish: Optional[Callable[[str, Dict], None]] = None,
+                driver=None, batch: int = RELINK_BATCH, restart: bool = False) -> Dict:
+    """
+    Re-links every node of a user in id order, `batch` at a time, saving
+    a checkpoint after each batch. An interrupted run resumes where it
+    stopped unless restart=True.
+    """
+    driver = driver or get_driver(user_id)
+    publish = publish or (lambda stage, info: None)
+    cp = get_checkpoints()
+    state = cp.get(user_id)
+    if restart or state is None or state["finished_at"]:
+        cp.start(user_id)
+        after, relinked = "", 0
+    else:
+        after, relinked = state["after"], state["relinked"]
+        log("RELINK", f"user={user_id} resuming after {after} ({relinked} done)")
+    reembedded = 0
+    while True:
+        settle(("neo4j",))
+        nodes = scan_nodes(driver, user_id, after, batch)
+        if not nodes:
+            break
+        out = relink_nodes(user_id, nodes, driver)
+        after, relinked = nodes[-1]["id"], relinked + len(nodes)
+        reembedded += out["reembedded"]
+        cp.save(user_id, after, relinked)
+        publish("relinked", {"relinked": relinked, "checkpoint": after})
+    cp.save(user_id, after, relinked, finished=True)
+    return {"relinked": relinked, "reembedded": reembedded}
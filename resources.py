@@ -0,0 +1,118 @@
+# resources.py — process-wide heavy resources: built on first use or pre-warmed, reported by /health
+import logging, os, threading, time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from logs import log
+
+# warmed in the background at startup; add "whisper" on deployments that transcribe audio
+PREWARM = [n.strip() for n in os.getenv("PREWARM", "neo4j,openai,vectors").split(",") if n.strip()]
+
+class Resource:
+    """
+    One lazily built singleton. get() builds it on first call (concurrent
+    callers wait for that build); a failed build is retried on the next
+    get(). `check(value)` is a cheap probe for /health: it raises when the
+    resource is unhealthy and may return extra fields to report.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any],
+                 close: Optional[Callable[[Any], None]] = None,
+                 check: Optional[Callable[[Any], Optional[Dict]]] = None):
+        self.name, self.factory, self.closer, self.check = name, factory, close, check
+        self.state = "idle"   # idle | starting | ready | failed
+        self.error: Optional[str] = None
+        self.startup_ms: Optional[float] = None
+        self._value: Any = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        value = self._value
+        if value is not None:
+            return value
+        with self._lock:
+            if self._value is None:
+                self.state, t0 = "starting", time.perf_counter()
+                try:
+                    value = self.factory()
+                except Exception as exc:
+                    self.state, self.error = "failed", f"{type(exc).__name__}: {exc}"
+                    raise
+                self.startup_ms = (time.perf_counter() - t0) * 1e3
+                self._value, self.state, self.error = value, "ready", None
+                log("INIT", f"{self.name} ready in {self.startup_ms:.0f} ms")
+            return self._value
+
+    def peek(self) -> Any:
+        """The value if already built, else None (never builds)."""
+        return self._value
+
+    def set(self, value: Any) -> None:
+        """Swap in a ready-made value (benchmarks, tests, migrations)."""
+        with self._lock:
+            self._value, self.error = value, None
+            self.state = "idle" if value is None else "ready"
+
+    def warm(self) -> threading.Thread:
+        t = threading.Thread(target=self._warm, name=f"warm-{self.name}", daemon=True)
+        t.start()
+        return t
+
+    def _warm(self) -> None:
+        try:
+            self.get()
+        except Exception as exc:
+            log("INIT", f"{self.name} failed to start: {exc}", logging.WARNING)
+
+    def status(self) -> Dict:
+        out: Dict[str, Any] = {"state": self.state}
+        if self.startup_ms is not None:
+            out["startup_ms"] = round(self.startup_ms, 1)
+        if self.error:
+            out["error"] = self.error
+        value = self._value
+        if value is not None and self.check:
+            try:
+                out.update(self.check(value) or {})
+            except Exception as exc:
+                out.update(state="unhealthy", error=f"{type(exc).__name__}: {exc}")
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            value, self._value, self.state = self._value, None, "idle"
+        if value is not None and self.closer:
+            self.closer(value)
+
+# ──────────────────────────  REGISTRY  ─────────────────────────────────
+_resources: Dict[str, Resource] = {}
+_resources_lock = threading.Lock()
+
+def resource(name: str, factory: Callable[[], Any], close: Optional[Callable[[Any], None]] = None,
+             check: Optional[Callable[[Any], Optional[Dict]]] = None) -> Resource:
+    with _resources_lock:
+        return _resources.setdefault(name, Resource(name, factory, close, check))
+
+def status() -> Dict[str, Dict]:
+    with _resources_lock:
+        items = list(_resources.items())
+    return {name: r.status() for name, r in items}
+
+def warm(names: Iterable[str] = PREWARM) -> List[threading.Thread]:
+    """Starts building `names` in the background; returns at once."""
+    threads = []
+    for name in names:
+        r = _resources.get(name)
+        if r is None:
+            log("INIT", f"PREWARM: unknown resource {name!r}", logging.WARNING)
+            continue
+        threads.append(r.warm())
+    return threads
+
+def close_all() -> None:
+    with _resources_lock:
+        items = list(_resources.values())
+    for r in reversed(items):
+        try:
+            r.close()
+        except Exception as exc:
+            log("INIT", f"closing {r.name}: {exc}", logging.WARNING)
@@ -0,0 +1,121 @@
+# search.py — semantic search over a user's mind map: vector top-k seeds + k-hop graph neighbourhood
+import hashlib, os, threading, time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+import numpy as np
+
+from algo import embed_texts
+from embed_repr import reduce
+from graph_store import get_driver, graph_version, neighbourhood
+from metrics import STAGE_SECONDS, collected
+from vector_store import query_many
+
+SEARCH_TOP_K = int(os.getenv("SEARCH_TOP_K", "10"))            # vector seeds
+SEARCH_HOPS = int(os.getenv("SEARCH_HOPS", "2"))
+SEARCH_MAX_HOPS = 3                                             # variable-length paths blow up past this
+SEARCH_PER_SEED = int(os.getenv("SEARCH_PER_SEED", "25"))       # neighbours kept per seed
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "50"))             # nodes returned
+SEARCH_BUDGET_MS = float(os.getenv("SEARCH_BUDGET_MS", "100"))
+SEARCH_CACHE_ITEMS = int(os.getenv("SEARCH_CACHE_ITEMS", "1024"))
+HOP_DECAY = float(os.getenv("SEARCH_HOP_DECAY", "0.6"))         # score = seed similarity × decay^hops
+SNIPPET_CHARS = 200
+
+class ResultCache:
+    """LRU of finished responses. Keys carry the user's graph version, so a write makes old entries unreachable."""
+
+    def __init__(self, max_items: int = SEARCH_CACHE_ITEMS):
+        self.max_items = max_items
+        self._items: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        with self._lock:
+            out = self._items.get(key)
+            if out is None:
+                self.stats["misses"] += 1
+                return None
+            self._items.move_to_end(key)
+            self.stats["hits"] += 1
+            return out
+
+    def put(self, key: Hashable, value: Dict) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+_cache = ResultCache()
+
+collected("mindmap_search_cache_total", "Search result cache lookups",
+          lambda: [((k,), v) for k, v in _cache.stats.items()], kind="counter", labels=["result"])
+
+def search(user_id: str, query: str, top_k: int = SEARCH_TOP_K, hops: int = SEARCH_HOPS,
+           limit: int = SEARCH_LIMIT, budget_ms: float = SEARCH_BUDGET_MS) -> Dict:
+    """
+    1. embed the query (embedding cache, so repeats cost nothing)
+    2. ONE vector query for the top_k seeds, scoped to user_id
+    3. ONE Cypher read for the seeds' `hops`-neighbourhood and its edges
+    4. rank by seed similarity × HOP_DECAY^hops, keep `limit` nodes
+    When steps 1–2 eat most of budget_ms the expansion is cut to fewer
+    hops ("degraded": true). Complete responses are cached per graph
+    version; degraded ones are not, so the next call tries the full depth.
+    """
+    t0 = time.perf_counter()
+    text = " ".join(query.split())
+    hops = max(0, min(hops, SEARCH_MAX_HOPS))
+    driver = get_driver(user_id)
+    key = (user_id, hashlib.sha256(text.encode("utf-8")).hexdigest(), top_k, hops, limit,
+           graph_version(user_id, driver))
+    hit = _cache.get(key)
+    if hit is not None:
+        return {**hit, "cached": True, "timings_ms": {"total": round((time.perf_counter() - t0) * 1e3, 2)}}
+
+    timings: Dict[str, float] = {}
+    lap = t0
+
+    def tick(name: str) -> None:
+        nonlocal lap
+        now = time.perf_counter()
+        timings[name] = round((now - lap) * 1e3, 2)
+        lap = now
+
+    V = np.asarray(embed_texts([text]), dtype=np.float32)
+    tick("embed")
+    q = query_many(reduce(V).tolist(), user_id=user_id, top_k=top_k, full=V)
+    sims = {i: 1.0 - float(d) for i, d in zip(q["ids"][0], q["distances"][0])}
+    tick("vector")
+
+    left = budget_ms - (time.perf_counter() - t0) * 1e3
+    used = hops if left > budget_ms / 2 else min(hops, 1) if left > 0 else 0
+    rows = neighbourhood(driver, user_id, list(sims), used, SEARCH_PER_SEED, SNIPPET_CHARS)
+    tick("graph")
+
+    scored = []
+    for row in rows:
+        node, via = row["node"], row["via"]
+        node["score"] = round(max(sims.get(v["seed"], 0.0) * HOP_DECAY ** v["hop"] for v in via), 4)
+        node["hop"] = min(v["hop"] for v in via)
+        if node["id"] in sims:
+            node["similarity"] = round(sims[node["id"]], 4)
+        scored.append((node, row["links"]))
+    scored.sort(key=lambda x: -x[0]["score"])
+    scored = scored[:limit]
+    keep = {n["id"] for n, _ in scored}
+    out = {
+        "query": text,
+        "nodes": [n for n, _ in scored],
+        "edges": [{"src": n["id"], "dst": d} for n, links in scored for d in links if d in keep],
+        "hops": used,
+        "degraded": used < hops,
+        "version": key[-1],
+    }
+    if not out["degraded"]:
+        _cache.put(key, out)
+    tick("rank")
+    total = time.perf_counter() - t0
+    STAGE_SECONDS.observe(total, stage="search")
+    timings["total"] = round(total * 1e3, 2)
+    return {**out, "cached": False, "timings_ms": timings}
@@ -0,0 +1,430 @@
+# segment_store.py — first-party vector backend: per-user mmap segments + IVF index
+import hashlib, json, os, threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from vector_store import VectorStore
+
+VECTOR_PATH = os.getenv("VECTOR_STORE_PATH", "vector_data")
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float32")             # float32 | float16 | int8
+SEGMENT_ROWS = int(os.getenv("VECTOR_SEGMENT_ROWS", "50000"))     # rows per segment file
+IVF_MIN_ROWS = int(os.getenv("VECTOR_IVF_MIN_ROWS", "4096"))      # below this, exact scan
+IVF_NPROBE = int(os.getenv("VECTOR_NPROBE", "12"))
+VECTOR_RERANK = int(os.getenv("VECTOR_RERANK", "0"))              # candidates rescored at full precision; 0 = off
+SCAN_ROWS = 8192      # rows dequantized at a time during an exact scan
+KMEANS_ITERS = 10
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# ──────────────────────────  QUANTIZATION  ─────────────────────────────
+def normalize(X: np.ndarray) -> np.ndarray:
+    X = np.asarray(X, dtype=np.float32)
+    return X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+
+def encode(X: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """float32 rows → stored rows (+ per-row scale for int8)."""
+    if dtype == "int8":
+        scale = np.maximum(np.abs(X).max(axis=1), 1e-12) / 127.0
+        return np.round(X / scale[:, None]).astype(np.int8), scale.astype(np.float32)
+    return X.astype(DTYPES[dtype]), None
+
+def decode(rows: np.ndarray, scale: Optional[np.ndarray]) -> np.ndarray:
+    out = rows.astype(np.float32)
+    return out * scale[:, None] if scale is not None else out
+
+# ─────────────────────────────  K-MEANS  ───────────────────────────────
+def spherical_kmeans(X: np.ndarray, k: int, iters: int = KMEANS_ITERS, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    C = X[rng.choice(len(X), k, replace=False)].copy()
+    for _ in range(iters):
+        assign = (X @ C.T).argmax(axis=1)
+        order = np.argsort(assign, kind="stable")
+        used, starts = np.unique(assign[order], return_index=True)
+        sums = np.zeros_like(C)
+        sums[used] = np.add.reduceat(X[order], starts, axis=0)
+        empty = ~sums.any(axis=1)
+        sums[empty] = X[rng.choice(len(X), int(empty.sum()))]   # reseed dead centroids
+        C = normalize(sums)
+    return C
+
+# ──────────────────────────  PER-USER INDEX  ───────────────────────────
+class UserIndex:
+    """
+    One directory per user:
+      seg-00000.vec …   append-only rows (dtype), SEGMENT_ROWS per file, mmapped
+      seg-00000.scl …   float32 row scales (int8 only)
+      seg-00000.full …  float32 un-reduced rows (rerank only; paged in per candidate)
+      ids.txt           row → id; "<id>\\t-" marks a tombstone
+      meta.jsonl        metadata as written (not read on the query path)
+      ivf.npy           IVF centroids;  assign.i32  row → inverted list
+    Re-adding an id appends a new row and retires the old one, so files
+    are never rewritten except assign.i32 when the IVF is retrained.
+    Training runs on a background thread (rows are immutable once
+    written); adds and searches keep using the previous centroids, or the
+    exact scan, until the new ones are swapped in under the lock.
+    """
+
+    def __init__(self, path: str, dim: int, dtype: str, full_dim: int = 0):
+        self.path, self.dim, self.dtype, self.full_dim = path, dim, dtype, full_dim
+        self.lock = threading.RLock()
+        self._trainer: Optional[threading.Thread] = None
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # ── files ──────────────────────────────────────────────────────
+    def _seg_path(self, s: int, ext: str) -> str:
+        return os.path.join(self.path, f"seg-{s:05d}.{ext}")
+
+    def _row_bytes(self) -> int:
+        return self.dim * np.dtype(DTYPES[self.dtype]).itemsize
+
+    def _map(self, s: int, rows: int) -> None:
+        while len(self.segs) <= s:
+            self.segs.append(None)
+            self.scales.append(None)
+            self.fulls.append(None)
+        if rows == 0:
+            return
+        self.segs[s] = np.memmap(self._seg_path(s, "vec"), dtype=DTYPES[self.dtype], mode="r",
+                                 shape=(rows, self.dim))
+        if self.dtype == "int8":
+            self.scales[s] = np.memmap(self._seg_path(s, "scl"), dtype=np.float32, mode="r", shape=(rows,))
+        if self.full_dim:
+            self.fulls[s] = np.memmap(self._seg_path(s, "full"), dtype=np.float32, mode="r",
+                                      shape=(rows, self.full_dim))
+
+    def _load(self) -> None:
+        ids_path = os.path.join(self.path, "ids.txt")
+        lines = open(ids_path, encoding="utf-8").read().splitlines() if os.path.exists(ids_path) else []
+        stored, s = 0, 0
+        while os.path.exists(self._seg_path(s, "vec")):
+            rows = os.path.getsize(self._seg_path(s, "vec")) // self._row_bytes()
+            if self.full_dim:
+                full = self._seg_path(s, "full")
+                rows = min(rows, os.path.getsize(full) // (4 * self.full_dim) if os.path.exists(full) else 0)
+            stored += rows
+            s += 1
+        n = min(len(lines), stored)   # a crash mid-append leaves one side longer; drop the tail
+        self._truncate(n, lines)
+
+        self.ids: List[str] = []
+        self.live = np.zeros(max(n, 1024), dtype=bool)
+        self.row_of: Dict[str, int] = {}
+        for row, line in enumerate(lines[:n]):
+            rid, _, flag = line.partition("\t")
+            self.ids.append(rid)
+            old = self.row_of.pop(rid, None)
+            if old is not None:
+                self.live[old] = False
+            if flag != "-":
+                self.row_of[rid] = row
+                self.live[row] = True
+        self.n = n
+
+        self.segs: List = []
+        self.scales: List = []
+        self.fulls: List = []
+        for s in range((n + SEGMENT_ROWS - 1) // SEGMENT_ROWS):
+            self._map(s, min(SEGMENT_ROWS, n - s * SEGMENT_ROWS))
+
+        self.centroids: Optional[np.ndarray] = None
+        self.assign = np.zeros(0, dtype=np.int32)
+        self.trained_live = 0
+        ivf = os.path.join(self.path, "ivf.npy")
+        if os.path.exists(ivf):
+            self.centroids = np.load(ivf)
+            with open(os.path.join(self.path, "ivf.json")) as f:
+                self.trained_live = json.load(f)["trained_live"]
+            self.assign = np.fromfile(os.path.join(self.path, "assign.i32"), dtype=np.int32)[:n]
+            if len(self.assign) < n:   # assignments lost in a crash: assign the tail again
+                self._append_assign(self._assign_rows(len(self.assign), n))
+        self._lists = None
+
+    def _truncate(self, n: int, lines: List[str]) -> None:
+        if len(lines) > n:
+            with open(os.path.join(self.path, "ids.txt"), "w", encoding="utf-8") as f:
+                f.write("".join(l + "\n" for l in lines[:n]))
+        s = 0
+        while os.path.exists(self._seg_path(s, "vec")):
+            keep = max(0, min(SEGMENT_ROWS, n - s * SEGMENT_ROWS))
+            for ext, width in (("vec", self._row_bytes()), ("scl", 4), ("full", 4 * self.full_dim)):
+                p = self._seg_path(s, ext)
+                if os.path.exists(p) and os.path.getsize(p) > keep * width:
+                    os.truncate(p, keep * width)
+            s += 1
+
+    # ── rows ───────────────────────────────────────────────────────
+    @staticmethod
+    def blocks(a: int, b: int):
+        """(lo, hi) spans of ≤ SCAN_ROWS covering a..b, never crossing a segment edge."""
+        lo = a
+        while lo < b:
+            hi = min(b, lo + SCAN_ROWS, (lo // SEGMENT_ROWS + 1) * SEGMENT_ROWS)
+            yield lo, hi
+            lo = hi
+
+    def rows(self, a: int, b: int) -> np.ndarray:
+        """Dequantized rows a..b (within one segment)."""
+        s, lo = divmod(a, SEGMENT_ROWS)
+        hi = lo + (b - a)
+        scale = self.scales[s][lo:hi] if self.dtype == "int8" else None
+        return decode(self.segs[s][lo:hi], scale)
+
+    def gather(self, idx: np.ndarray, full: bool = False) -> np.ndarray:
+        """Rows by index; full=True reads the un-reduced float32 sidecar."""
+        out = np.empty((len(idx), self.full_dim if full else self.dim), dtype=np.float32)
+        seg = idx // SEGMENT_ROWS
+        for s in np.unique(seg):
+            sel = np.nonzero(seg == s)[0]
+            local = idx[sel] - s * SEGMENT_ROWS
+            if full:
+                out[sel] = self.fulls[s][local]
+                continue
+            scale = self.scales[s][local] if self.dtype == "int8" else None
+            out[sel] = decode(self.segs[s][local], scale)
+        return out
+
+    def _append(self, ids: List[str], X: np.ndarray, F: Optional[np.ndarray] = None,
+                tombstone: bool = False) -> None:
+        q, scale = encode(X, self.dtype)
+        start, done = self.n, 0
+        while done < len(ids):
+            s, off = divmod(start + done, SEGMENT_ROWS)
+            take = min(SEGMENT_ROWS - off, len(ids) - done)
+            with open(self._seg_path(s, "vec"), "ab") as f:
+                f.write(q[done:done + take].tobytes())
+            if scale is not None:
+                with open(self._seg_path(s, "scl"), "ab") as f:
+                    f.write(scale[done:done + take].tobytes())
+            if self.full_dim:
+                with open(self._seg_path(s, "full"), "ab") as f:
+                    f.write(F[done:done + take].astype(np.float32).tobytes())
+            self._map(s, off + take)
+            done += take
+        # ids last: a row only exists once its id line is durable
+        with open(os.path.join(self.path, "ids.txt"), "a", encoding="utf-8") as f:
+            f.write("".join(f"{i}\t-\n" if tombstone else f"{i}\n" for i in ids))
+        if len(self.live) < start + len(ids):
+            self.live = np.concatenate([self.live, np.zeros(max(len(self.live), len(ids)), dtype=bool)])
+        for row, rid in enumerate(ids, start):
+            self.ids.append(rid)
+            old = self.row_of.pop(rid, None)
+            if old is not None:
+                self.live[old] = False
+            if not tombstone:
+                self.row_of[rid] = row
+                self.live[row] = True
+        self.n = start + len(ids)
+
+    def add(self, ids: List[str], X: np.ndarray, metas: List[Dict], F: Optional[np.ndarray] = None) -> None:
+        with self.lock:
+            start = self.n
+            self._append(ids, X, F)
+            with open(os.path.join(self.path, "meta.jsonl"), "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps({"id": i, "meta": m}) + "\n" for i, m in zip(ids, metas)))
+            if self.centroids is not None:
+                self._append_assign(self._assign_rows(start, self.n))
+            self._maybe_train()
+
+    def delete(self, ids: List[str]) -> None:
+        with self.lock:
+            ids = [i for i in ids if i in self.row_of]
+            if ids:
+                start = self.n
+                self._append(ids, np.zeros((len(ids), self.dim), dtype=np.float32),
+                             np.zeros((len(ids), self.full_dim), dtype=np.float32), tombstone=True)
+                if self.centroids is not None:
+                    self._append_assign(np.zeros(self.n - start, dtype=np.int32))
+
+    # ── IVF ────────────────────────────────────────────────────────
+    def _assign_rows(self, a: int, b: int) -> np.ndarray:
+        out = np.empty(b - a, dtype=np.int32)
+        for lo, hi in self.blocks(a, b):
+            out[lo - a:hi - a] = (self.rows(lo, hi) @ self.centroids.T).argmax(axis=1)
+        return out
+
+    def _append_assign(self, a: np.ndarray) -> None:
+        with open(os.path.join(self.path, "assign.i32"), "ab") as f:
+            f.write(a.astype(np.int32).tobytes())
+        self.assign = np.concatenate([self.assign, a.astype(np.int32)])
+        self._lists = None
+
+    def _maybe_train(self) -> None:
+        # (re)train when the live set first reaches IVF_MIN_ROWS and each time it doubles; caller holds the lock
+        n_live = len(self.row_of)
+        if n_live < max(IVF_MIN_ROWS, 2 * self.trained_live) or self._trainer is not None:
+            return
+        nlist = int(4 * np.sqrt(n_live))
+        live_rows = np.fromiter(self.row_of.values(), dtype=np.int64)
+        rng = np.random.default_rng(n_live)
+        sample = np.sort(rng.choice(live_rows, min(len(live_rows), nlist * 32), replace=False))
+        self._trainer = threading.Thread(target=self._train, args=(self.gather(sample), nlist, n_live, self.n),
+                                         name="ivf-train", daemon=True)
+        self._trainer.start()
+
+    def _train(self, sample: np.ndarray, nlist: int, n_live: int, n: int) -> None:
+        try:
+            centroids = spherical_kmeans(sample, nlist)
+            # rows [0, n) existed at the start and never change: assign them without the lock
+            assign = np.empty(n, dtype=np.int32)
+            for lo, hi in self.blocks(0, n):
+                assign[lo:hi] = (self.rows(lo, hi) @ centroids.T).argmax(axis=1)
+            with self.lock:
+                tail = np.empty(self.n - n, dtype=np.int32)
+                for lo, hi in self.blocks(n, self.n):
+                    tail[lo - n:hi - n] = (self.rows(lo, hi) @ centroids.T).argmax(axis=1)
+                assign = np.concatenate([assign, tail])
+                for name, write in (("assign.i32", assign.tofile), ("ivf.npy", lambda f: np.save(f, centroids))):
+                    with open(os.path.join(self.path, name + ".tmp"), "wb") as f:
+                        write(f)
+                    os.replace(os.path.join(self.path, name + ".tmp"), os.path.join(self.path, name))
+                with open(os.path.join(self.path, "ivf.json"), "w") as f:
+                    json.dump({"trained_live": n_live}, f)
+                self.centroids, self.assign, self.trained_live = centroids, assign, n_live
+                self._lists = None
+        finally:
+            with self.lock:
+                self._trainer = None
+
+    def wait_trained(self, timeout: Optional[float] = None) -> None:
+        """Blocks until a background IVF training (if any) has been swapped in."""
+        t = self._trainer
+        if t is not None:
+            t.join(timeout)
+
+    def _inverted(self) -> List[np.ndarray]:
+        if self._lists is None:
+            order = np.argsort(self.assign, kind="stable")
+            bounds = np.searchsorted(self.assign[order], np.arange(len(self.centroids) + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+        return self._lists
+
+    # ── search ─────────────────────────────────────────────────────
+    def _top(self, rows: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        keep = self.live[rows]
+        rows, scores = rows[keep], scores[keep]
+        if len(rows) > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[part], scores[part]
+        order = np.argsort(-scores, kind="stable")
+        return rows[order], scores[order]
+
+    def search(self, Q: np.ndarray, k: int, exact: bool = False, Qfull: Optional[np.ndarray] = None,
+               rerank: int = 0) -> Tuple[List[List[str]], List[List[float]]]:
+        """
+        Top-k by cosine. With Qfull and a full-precision sidecar, the best
+        max(k, rerank) candidates from the compact index are rescored at
+        full width and the distances returned are the full-width ones.
+        """
+        fine = Qfull is not None and self.full_dim and rerank > 0
+        kk = max(k, rerank) if fine else k
+        with self.lock:
+            n = self.n
+            if self.centroids is None or exact:
+                scores = np.empty((len(Q), n), dtype=np.float32)
+                for lo, hi in self.blocks(0, n):
+                    scores[:, lo:hi] = (self.rows(lo, hi) @ Q.T).T
+                rows = np.arange(n)
+                out = [self._top(rows, s, kk) for s in scores]
+            else:
+                lists = self._inverted()
+                probes = np.argsort(-(Q @ self.centroids.T), axis=1)[:, :IVF_NPROBE]
+                out = []
+                for q, probe in zip(Q, probes):
+                    cand = np.sort(np.concatenate([lists[p] for p in probe]))
+                    out.append(self._top(cand, self.gather(cand) @ q, kk))
+            if fine:
+                out = [self._top(rows, self.gather(rows, full=True) @ qf, k) for (rows, _), qf in zip(out, Qfull)]
+            ids = [[self.ids[r] for r in rows] for rows, _ in out]
+        return ids, [(1.0 - scores).tolist() for _, scores in out]
+
+    @property
+    def count(self) -> int:
+        return len(self.row_of)
+
+# ───────────────────────────  STORE  ───────────────────────────────────
+class SegmentStore(VectorStore):
+    """VectorStore backend over one UserIndex per user, opened lazily."""
+
+    def __init__(self, root: str = VECTOR_PATH, dtype: str = VECTOR_DTYPE, rerank: int = VECTOR_RERANK):
+        if dtype not in DTYPES:
+            raise ValueError(f"VECTOR_DTYPE must be one of {sorted(DTYPES)}")
+        self.root, self.dtype, self.rerank = root, dtype, rerank
+        self._users: Dict[str, UserIndex] = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, user_id: str) -> str:
+        return os.path.join(self.root, hashlib.sha1(user_id.encode()).hexdigest()[:20])
+
+    def _open(self, user_id: str, dim: Optional[int] = None, full_dim: int = 0) -> Optional[UserIndex]:
+        with self._lock:
+            idx = self._users.get(user_id)
+            if idx is not None:
+                if dim is not None and dim != idx.dim:
+                    raise ValueError(f"vector dim {dim} != index dim {idx.dim}")
+                return idx
+            path = self._dir(user_id)
+            info = os.path.join(path, "store.json")
+            if os.path.exists(info):
+                with open(info) as f:
+                    spec = json.load(f)
+                if dim is not None and dim != spec["dim"]:
+                    raise ValueError(f"vector dim {dim} != index dim {spec['dim']}")
+            elif dim is None:
+                return None
+            else:
+                # the full-precision sidecar is fixed at creation: rerank on → kept for every row
+                spec = {"user_id": user_id, "dim": dim, "dtype": self.dtype, "full_dim": full_dim}
+                os.makedirs(path, exist_ok=True)
+                with open(info, "w") as f:
+                    json.dump(spec, f)
+            idx = self._users[user_id] = UserIndex(path, spec["dim"], spec["dtype"], spec.get("full_dim", 0))
+            return idx
+
+    def add_many(self, user_id: str, ids: List[str], vectors: List[List[float]], metas: List[Dict],
+                 full: Optional[List[List[float]]] = None) -> None:
+        if not ids:
+            return
+        X = normalize(vectors)
+        F = normalize(full if full is not None else vectors) if self.rerank else None
+        idx = self._open(user_id, X.shape[1], F.shape[1] if F is not None else 0)
+        if idx.full_dim and (F is None or F.shape[1] != idx.full_dim):
+            F = normalize(full if full is not None else vectors)
+            if F.shape[1] != idx.full_dim:
+                raise ValueError(f"full vector dim {F.shape[1]} != index full dim {idx.full_dim}")
+        idx.add(list(ids), X, metas, F)
+
+    def query_many(self, vectors: List[List[float]], user_id: str, top_k: int = 10,
+                   full: Optional[List[List[float]]] = None) -> Dict:
+        idx = self._open(user_id) if len(vectors) else None
+        if idx is None or idx.count == 0:
+            return {"ids": [[] for _ in vectors], "distances": [[] for _ in vectors]}
+        Qfull = normalize(full) if full is not None and idx.full_dim else None
+        ids, dists = idx.search(normalize(vectors), min(top_k, idx.count), Qfull=Qfull,
+                                rerank=min(self.rerank, idx.count))
+        return {"ids": ids, "distances": dists}
+
+    def delete_many(self, user_id: str, ids: List[str]) -> None:
+        idx = self._open(user_id)
+        if idx is not None:
+            idx.delete(list(ids))
+
+    def count(self, user_id: str) -> int:
+        idx = self._open(user_id)
+        return idx.count if idx else 0
+
+    def wait_trained(self) -> None:
+        with self._lock:
+            users = list(self._users.values())
+        for idx in users:
+            idx.wait_trained()
+
+    def usage(self) -> Dict:
+        # one directory per user (shard-* subdirectories of the default root are other shards)
+        users, size = 0, 0
+        for entry in os.scandir(self.root) if os.path.isdir(self.root) else ():
+            if entry.is_dir() and os.path.exists(os.path.join(entry.path, "store.json")):
+                users += 1
+                size += sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+        return {"users": users, "bytes": size}
@@ -0,0 +1,156 @@
+# shards.py — per-user storage partitions: consistent-hash placement, a durable shard map, online moves
+import hashlib, os, sqlite3, threading, time
+from bisect import bisect
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import collected, histogram
+from resources import resource
+
+# partition names, e.g. "default,s1,s2,s3"; empty = everything in one unsharded store.
+# "default" is the pre-sharding location (the "thoughts" collection / VECTOR_STORE_PATH / default database)
+SHARDS = [s.strip() for s in os.getenv("SHARDS", "").split(",") if s.strip()]
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "128"))   # ring points per shard
+SHARD_DB = os.getenv("SHARD_DB", "shards.sqlite3")
+DEFAULT_SHARD = "default"
+
+SHARD_SECONDS = histogram("mindmap_shard_seconds", "Storage latency per shard", ["shard", "store", "op"])
+
+def sharded() -> bool:
+    return bool(SHARDS)
+
+# ─────────────────────────────  RING  ──────────────────────────────────
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+class HashRing:
+    """SHARD_VNODES points per shard; a key belongs to the first point clockwise of its hash."""
+
+    def __init__(self, shards: List[str], vnodes: int = SHARD_VNODES):
+        if not shards:
+            raise ValueError("a hash ring needs at least one shard")
+        ring = sorted((_point(f"{s}#{v}"), s) for s in shards for v in range(vnodes))
+        self._points = [p for p, _ in ring]
+        self._owners = [s for _, s in ring]
+
+    def lookup(self, key: str) -> str:
+        return self._owners[bisect(self._points, _point(key)) % len(self._points)]
+
+# ───────────────────────────  SHARD MAP  ───────────────────────────────
+class ShardMap:
+    """
+    Where each user's vectors and graph live. The ring only decides where
+    a user starts: the first lookup pins the user, so adding shards never
+    strands existing data, and moves are explicit. A user with data in the
+    pre-sharding store (`probe`) is pinned to "default" instead.
+
+    During a move reads stay on the source while writes go to both
+    source and target; finish_move() flips reads to the target.
+
+    Every lookup reads SQLite (a primary-key hit in a WAL database), so a
+    move made by any worker process is seen by all of them at once.
+    """
+
+    def __init__(self, shards: List[str] = SHARDS, path: str = SHARD_DB,
+                 probe: Optional[Callable[[str], bool]] = None, vnodes: int = SHARD_VNODES):
+        self.shards = list(shards)
+        self.ring = HashRing(self.shards, vnodes)
+        self.probe = probe
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS shard_users ("
+            " user_id TEXT PRIMARY KEY, shard TEXT, moving_to TEXT, pinned_at REAL, moved_at REAL)"
+        )
+        self._db.commit()
+
+    def _get(self, user_id: str) -> Optional[Tuple[str, Optional[str]]]:
+        with self._lock:
+            return self._db.execute("SELECT shard, moving_to FROM shard_users WHERE user_id=?",
+                                    (user_id,)).fetchone()
+
+    def _place(self, user_id: str) -> Tuple[str, Optional[str]]:
+        entry = self._get(user_id)
+        if entry is not None:
+            return entry
+        legacy = DEFAULT_SHARD in self.shards and self.probe is not None and self.probe(user_id)
+        shard = DEFAULT_SHARD if legacy else self.ring.lookup(user_id)
+        with self._lock:
+            # another worker may have pinned the user meanwhile: its placement wins
+            self._db.execute("INSERT OR IGNORE INTO shard_users VALUES (?,?,NULL,?,NULL)",
+                             (user_id, shard, time.time()))
+            self._db.commit()
+        return self._get(user_id)
+
+    def read_shard(self, user_id: str) -> str:
+        return self._place(user_id)[0]
+
+    def write_shards(self, user_id: str) -> Tuple[str, ...]:
+        shard, moving_to = self._place(user_id)
+        return (shard, moving_to) if moving_to else (shard,)
+
+    def begin_move(self, user_id: str, dst: str) -> str:
+        """Starts dual writes to `dst`; returns the source. Re-entrant for a resumed move."""
+        if dst not in self.shards:
+            raise ValueError(f"unknown shard {dst!r}")
+        shard, moving_to = self._place(user_id)
+        if moving_to == dst:
+            return shard
+        if moving_to is not None:
+            raise ValueError(f"user {user_id} is already moving to {moving_to}")
+        if shard == dst:
+            raise ValueError(f"user {user_id} is already on {dst}")
+        self._set(user_id, shard, dst)
+        return shard
+
+    def finish_move(self, user_id: str) -> str:
+        shard, moving_to = self._place(user_id)
+        if moving_to is not None:
+            self._set(user_id, moving_to, None, moved=True)
+        return moving_to or shard
+
+    def abort_move(self, user_id: str) -> None:
+        shard, _ = self._place(user_id)
+        self._set(user_id, shard, None)
+
+    def _set(self, user_id: str, shard: str, moving_to: Optional[str], moved: bool = False) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE shard_users SET shard=?, moving_to=?, moved_at=coalesce(?, moved_at) WHERE user_id=?",
+                (shard, moving_to, time.time() if moved else None, user_id),
+            )
+            self._db.commit()
+
+    def moving(self) -> List[Tuple[str, str, str]]:
+        """(user_id, source, target) of every unfinished move."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT user_id, shard, moving_to FROM shard_users WHERE moving_to IS NOT NULL").fetchall()
+
+    def users_per_shard(self) -> Dict[str, int]:
+        counts = {s: 0 for s in self.shards}
+        with self._lock:
+            for s, n in self._db.execute("SELECT shard, count(*) FROM shard_users GROUP BY shard"):
+                counts[s] = n
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+def _open_map() -> ShardMap:
+    if not SHARDS:
+        raise RuntimeError("SHARDS is not set: storage is unsharded")
+    from graph_store import get_driver, has_user   # graph_store routes through this map; import late
+    return ShardMap(probe=lambda user_id: has_user(get_driver(), user_id))
+
+SHARD_MAP = resource("shards", _open_map, close=lambda m: m.close(), check=lambda m: m.users_per_shard())
+
+def get_shard_map() -> ShardMap:
+    return SHARD_MAP.get()
+
+def _users():
+    m = SHARD_MAP.peek()
+    return [((s,), n) for s, n in m.users_per_shard().items()] if m is not None else []
+
+collected("mindmap_shard_users", "Users placed on each shard", _users, labels=["shard"])
@@ -0,0 +1,202 @@
+# snapshot.py — columnar snapshots of thoughts, edges and vectors: streamed export, bulk warm-start load
+import json, os, re, shutil, time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from algo import batch_embed, embed_model_key, vector_meta
+from embed_repr import reduce
+from graph_store import get_driver, list_users, restore_thoughts, scan_nodes, shard_driver
+from logs import log
+from metrics import ITEMS, STAGE_SECONDS
+from shards import SHARDS, sharded
+from vector_store import add_many
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_BATCH = int(os.getenv("SNAPSHOT_BATCH", "2000"))          # rows per page read / store call
+SNAPSHOT_RESTORE = os.getenv("SNAPSHOT_RESTORE", "")               # loaded at startup; "latest" = newest in SNAPSHOT_DIR
+SNAPSHOT_RESTORE_STORES = [s.strip() for s in os.getenv("SNAPSHOT_RESTORE_STORES", "vectors,neo4j").split(",") if s.strip()]
+FORMAT = 1
+NAME_RE = re.compile(r"[\w.-]+")   # bare names only: a snapshot always lives directly under SNAPSHOT_DIR
+
+# ─────────────────────────────  FORMAT  ────────────────────────────────
+# One directory per snapshot; rows are grouped by user, in id order:
+#   nodes.ndjson   one record per row: the node's properties, related_ids = its RELATED_TO edges
+#   offsets.i64    byte offset of each row's record in nodes.ndjson (a user's rows are one seek away)
+#   vectors.f32    rows × dim float32, contiguous: np.memmap(path, np.float32, "r", shape=(rows, dim))
+#   manifest.json  rows, dim, embedding model, per-user row ranges; written last, so it marks a
+#                  complete snapshot (an export in progress lives in <name>.partial)
+# Vectors are the full-width embeddings, so loading re-applies whatever reduction is configured.
+
+class SnapshotWriter:
+    """Appends pages of (nodes, vectors) per user; close() commits the snapshot."""
+
+    def __init__(self, path: str):
+        self.path, self.tmp = path, path + ".partial"
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+        self._nodes = open(os.path.join(self.tmp, "nodes.ndjson"), "wb")
+        self._offsets = open(os.path.join(self.tmp, "offsets.i64"), "wb")
+        self._vectors = open(os.path.join(self.tmp, "vectors.f32"), "wb")
+        self.rows, self.dim = 0, 0
+        self.users: Dict[str, List[int]] = {}
+
+    def add(self, user_id: str, nodes: List[Dict], V: np.ndarray) -> None:
+        if not nodes:
+            return
+        V = np.ascontiguousarray(V, dtype=np.float32)
+        if self.dim and V.shape[1] != self.dim:
+            raise ValueError(f"vector dim {V.shape[1]} != snapshot dim {self.dim}")
+        self.dim = V.shape[1]
+        if user_id in self.users and self.users[user_id][1] != self.rows:
+            raise ValueError(f"rows of user {user_id} must be contiguous")
+        lines = [json.dumps(n, ensure_ascii=False).encode("utf-8") + b"\n" for n in nodes]
+        starts = self._nodes.tell() + np.cumsum([0] + [len(l) for l in lines[:-1]], dtype=np.int64)
+        self._nodes.write(b"".join(lines))
+        self._offsets.write(starts.tobytes())
+        self._vectors.write(V.tobytes())
+        self.users.setdefault(user_id, [self.rows, self.rows])[1] = self.rows + len(nodes)
+        self.rows += len(nodes)
+
+    def close(self, embed_model: str) -> Dict:
+        for f in (self._nodes, self._offsets, self._vectors):
+            f.close()
+        manifest = {"format": FORMAT, "created_at": datetime.now(timezone.utc).isoformat(),
+                    "rows": self.rows, "dim": self.dim, "embed_model": embed_model, "users": self.users}
+        with open(os.path.join(self.tmp, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.tmp, self.path)
+        return manifest
+
+    def abort(self) -> None:
+        for f in (self._nodes, self._offsets, self._vectors):
+            f.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+class Snapshot:
+    """A committed snapshot, memory-mapped: nothing is read until a user's rows are iterated."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "manifest.json")) as f:   # absent → export never finished
+            self.manifest = json.load(f)
+        if self.manifest["format"] != FORMAT:
+            raise ValueError(f"snapshot format {self.manifest['format']} != {FORMAT}")
+        self.path = path
+        rows, dim = self.manifest["rows"], self.manifest["dim"]
+        self.vectors = (np.memmap(os.path.join(path, "vectors.f32"), np.float32, "r", shape=(rows, dim))
+                        if rows else np.zeros((0, dim), np.float32))
+        self.offsets = np.fromfile(os.path.join(path, "offsets.i64"), dtype=np.int64)
+
+    def iter_user(self, user_id: str, batch: int = SNAPSHOT_BATCH) -> Iterator[Tuple[List[Dict], np.ndarray]]:
+        a, b = self.manifest["users"][user_id]
+        if a == b:
+            return
+        with open(os.path.join(self.path, "nodes.ndjson"), "rb") as f:
+            f.seek(int(self.offsets[a]))
+            for i in range(a, b, batch):
+                k = min(batch, b - i)
+                yield [json.loads(f.readline()) for _ in range(k)], np.asarray(self.vectors[i:i + k])
+
+# ─────────────────────────────  EXPORT  ────────────────────────────────
+def snapshot_dir(name: str) -> str:
+    """SNAPSHOT_DIR/<name>; ValueError for anything but a bare name (no separators, no '..')."""
+    if not NAME_RE.fullmatch(name) or name.startswith(".") or ".." in name or name.endswith(".partial"):
+        raise ValueError(f"invalid snapshot name {name!r}")
+    return os.path.join(SNAPSHOT_DIR, name)
+
+def all_users() -> List[str]:
+    if not sharded():
+        return list_users(get_driver())
+    return sorted({u for s in SHARDS for u in list_users(shard_driver(s))})
+
+def export_snapshot(user_ids: Optional[List[str]] = None, name: Optional[str] = None,
+                    publish: Optional[Callable[[str, Dict], None]] = None, batch: int = SNAPSHOT_BATCH) -> Dict:
+    """
+    Writes the users' (default: everyone's) nodes and vectors to
+    SNAPSHOT_DIR/<name>, one page of `batch` nodes at a time, so memory
+    stays flat however large the graph. Vectors come from the embedding
+    cache; only text that was never embedded costs an API call.
+    """
+    publish = publish or (lambda stage, info: None)
+    users = user_ids or all_users()
+    name = name or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = snapshot_dir(name)
+    t0 = time.perf_counter()
+    writer = SnapshotWriter(path)
+    try:
+        for done, user_id in enumerate(users, 1):
+            driver, after = get_driver(user_id), ""
+            while True:
+                page = scan_nodes(driver, user_id, after, batch)
+                if not page:
+                    break
+                for n in page:
+                    n["tags"] = n.get("tags") or []
+                    n["related_ids"] = n.get("related_ids") or []
+                with STAGE_SECONDS.time(stage="snapshot_export"):
+                    writer.add(user_id, page, np.asarray(batch_embed(page), dtype=np.float32))
+                after = page[-1]["id"]
+            publish("exported", {"users": done, "rows": writer.rows})
+        manifest = writer.close(embed_model_key())
+    except BaseException:
+        writer.abort()
+        raise
+    log("SNAPSHOT", f"{name}: {len(users)} users, {manifest['rows']} rows × {manifest['dim']} "
+                    f"in {time.perf_counter() - t0:.1f}s")
+    return {"name": name, "users": len(manifest["users"]), "rows": manifest["rows"], "dim": manifest["dim"]}
+
+# ──────────────────────────────  LOAD  ─────────────────────────────────
+def snapshot_path(name: str) -> str:
+    if name == "latest":
+        snaps = list_snapshots()
+        if not snaps:
+            raise FileNotFoundError(f"no snapshot in {SNAPSHOT_DIR}")
+        name = max(snaps, key=lambda s: s["created_at"])["name"]
+    return snapshot_dir(name)
+
+def list_snapshots() -> List[Dict]:
+    out = []
+    for d in sorted(os.listdir(SNAPSHOT_DIR)) if os.path.isdir(SNAPSHOT_DIR) else []:
+        if d.endswith(".partial"):
+            continue
+        try:
+            m = Snapshot(os.path.join(SNAPSHOT_DIR, d)).manifest
+        except (OSError, ValueError):
+            continue
+        out.append({"name": d, "created_at": m["created_at"], "users": len(m["users"]),
+                    "rows": m["rows"], "dim": m["dim"], "embed_model": m["embed_model"]})
+    return out
+
+def load_snapshot(name: str, stores: List[str] = SNAPSHOT_RESTORE_STORES, user_ids: Optional[List[str]] = None,
+                  publish: Optional[Callable[[str, Dict], None]] = None, batch: int = SNAPSHOT_BATCH) -> Dict:
+    """
+    Bulk-loads a snapshot: per page, one vector-store upsert and one
+    graph transaction. Graph nodes that already exist are left as they
+    are (they may have changed since the snapshot); vectors are upserted,
+    which is what a restarted in-memory index needs.
+    """
+    publish = publish or (lambda stage, info: None)
+    snap = Snapshot(snapshot_path(name))
+    m = snap.manifest
+    if "vectors" in stores and m["embed_model"] != embed_model_key():
+        raise ValueError(f"snapshot vectors are {m['embed_model']}, the index uses {embed_model_key()}")
+    users = [u for u in (user_ids or m["users"]) if u in m["users"]]
+    t0, rows = time.perf_counter(), 0
+    for done, user_id in enumerate(users, 1):
+        driver = get_driver(user_id) if "neo4j" in stores else None
+        for nodes, V in snap.iter_user(user_id, batch):
+            with STAGE_SECONDS.time(stage="snapshot_load"):
+                if driver is not None:
+                    restore_thoughts(driver, nodes)
+                if "vectors" in stores:
+                    # arrays straight through: every backend takes them, and tolist() of a full page
+                    # costs more than the upsert
+                    add_many(user_id, [n["id"] for n in nodes], reduce(V), [vector_meta(n) for n in nodes], full=V)
+            rows += len(nodes)
+        publish("loaded", {"users": done, "rows": rows})
+    ITEMS.inc(rows, kind="snapshot_rows")
+    log("SNAPSHOT", f"loaded {snap.path} into {','.join(stores)}: {len(users)} users, {rows} rows "
+                    f"in {time.perf_counter() - t0:.1f}s")
+    return {"name": os.path.basename(snap.path), "users": len(users), "rows": rows}
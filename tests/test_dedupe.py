@@ -0,0 +1,25 @@
+import numpy as np
+
+from dedupe import clusters, similar_pairs
+
+def _unit(deg: float) -> np.ndarray:
+    return np.array([np.cos(np.radians(deg)), np.sin(np.radians(deg))], dtype=np.float32)
+
+def test_chain_does_not_merge_its_ends():
+    # cos 20° ≈ 0.94 ≥ 0.9 for A~B and B~C, cos 40° ≈ 0.77 for A~C
+    U = np.stack([_unit(0), _unit(20), _unit(40)])
+    assert sorted(similar_pairs(U, 0.9)) == [(0, 1), (1, 2)]
+    groups = clusters(3, similar_pairs(U, 0.9))
+    assert len(groups) == 1
+    assert len(groups[0]) == 2
+    assert {0, 2} - set(groups[0])   # A and C never together
+
+def test_every_two_members_are_similar():
+    U = np.stack([_unit(d) for d in (0, 5, 10, 20, 30, 90, 93)])
+    pairs = list(similar_pairs(U, 0.95, block=2))
+    groups = clusters(len(U), pairs)
+    close = set(pairs)
+    for g in groups:
+        assert all((min(i, j), max(i, j)) in close for i in g for j in g if i != j)
+    assert sorted(i for g in groups for i in g) == sorted(set(i for g in groups for i in g))
+    assert [5, 6] in groups
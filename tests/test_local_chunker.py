@@ -0,0 +1,18 @@
+import local_chunker
+from local_chunker import chunk_local, route
+
+RUN_ON = ("The " + " ".join("garden%d" % i for i in range(160))
+          + ". Then we ate soup. Then we slept well. Then we woke up.")
+
+def test_run_on_sentence_then_short_ones_is_not_split():
+    assert route(RUN_ON) == "local"
+    nodes = chunk_local(RUN_ON)
+    assert len(nodes) == 1
+    assert nodes[0]["content"].split() == RUN_ON.split()
+
+def test_long_segment_still_splits_at_a_gap():
+    text = " ".join(["Gardens need water every day in the dry summer months here."] * 10
+                    + ["Marathon training means long runs on weekend mornings before work."] * 10)
+    nodes = chunk_local(text)
+    assert len(nodes) >= 2
+    assert all(len(n["content"].split()) >= local_chunker.MIN_WORDS for n in nodes)
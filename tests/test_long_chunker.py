@@ -0,0 +1,16 @@
+from long_chunker import sentence_windows
+
+def test_unpunctuated_text_is_windowed():
+    words = ["word%d" % i for i in range(1000)]
+    windows = sentence_windows(" ".join(words), window_words=300, overlap_words=50)
+    assert len(windows) > 1
+    assert all(len(w.split()) <= 300 for w in windows)
+    seen = [x for w in windows for x in w.split()]
+    assert set(seen) == set(words)
+    assert windows[1].split()[0] == "word250"   # each run repeats the previous one's last 50 words
+
+def test_sentences_stay_whole():
+    text = " ".join("Sentence number %d has exactly seven words." % i for i in range(100))
+    windows = sentence_windows(text, window_words=100, overlap_words=20)
+    assert all(w.endswith(".") for w in windows)
+    assert all(len(w.split()) <= 100 for w in windows)
@@ -0,0 +1,148 @@
+# transcribe_stream.py — windowed Whisper transcription straight from the upload stream
+import os, subprocess, threading, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Iterator, List, Tuple
+
+import numpy as np
+
+from metrics import BYTES, STAGE_SECONDS
+
+SAMPLE_RATE = 16000                                             # what Whisper expects
+WINDOW_S = float(os.getenv("TRANSCRIBE_WINDOW_S", "30"))        # Whisper's native context
+SEARCH_S = float(os.getenv("TRANSCRIBE_SEARCH_S", "3"))         # look back this far for a pause
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "1"))
+INGEST_MIN_WORDS = int(os.getenv("TRANSCRIBE_INGEST_MIN_WORDS", "120"))
+READ_CHUNK = 64 * 1024
+
+FRAME = SAMPLE_RATE // 50   # 20 ms energy frames
+STDERR_KEEP = 4096          # tail of ffmpeg's complaints kept for the error message
+
+class AudioDecodeError(ValueError):
+    """ffmpeg could not decode the upload (corrupt, truncated, not audio)."""
+
+# ───────────────────────────  DECODE  ──────────────────────────────────
+def _feed(proc: subprocess.Popen, src: BinaryIO) -> None:
+    try:
+        while True:
+            buf = src.read(READ_CHUNK)
+            if not buf:
+                break
+            BYTES.inc(len(buf), kind="audio_upload")
+            proc.stdin.write(buf)
+    except (BrokenPipeError, ValueError):
+        pass
+    finally:
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+
+def _drain(proc: subprocess.Popen, tail: List[bytes]) -> None:
+    # read stderr as it comes so a chatty ffmpeg never blocks on a full pipe
+    for line in proc.stderr:
+        tail.append(line)
+        while sum(map(len, tail)) > STDERR_KEEP and len(tail) > 1:
+            tail.pop(0)
+    proc.stderr.close()
+
+def pcm_stream(src: BinaryIO) -> Tuple[subprocess.Popen, threading.Thread, List[bytes]]:
+    """ffmpeg decodes any container from stdin to 16 kHz mono s16le on stdout; stderr's tail is collected."""
+    proc = subprocess.Popen(
+        ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+         "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    threading.Thread(target=_feed, args=(proc, src), daemon=True).start()
+    tail: List[bytes] = []
+    errors = threading.Thread(target=_drain, args=(proc, tail), daemon=True)
+    errors.start()
+    return proc, errors, tail
+
+def _check(proc: subprocess.Popen, errors: threading.Thread, tail: List[bytes]) -> None:
+    code = proc.wait()
+    errors.join()
+    if code != 0:
+        msg = b"".join(tail).decode("utf-8", "replace").strip().splitlines()
+        raise AudioDecodeError(f"could not decode audio (ffmpeg exit {code}): {msg[-1] if msg else 'no output'}")
+
+def _quietest_cut(audio: np.ndarray, search: int) -> int:
+    """Index of the lowest-energy 20 ms frame in the last `search` samples."""
+    tail = audio[-search:]
+    n = len(tail) // FRAME
+    if n < 2:
+        return len(audio)
+    rms = np.sqrt((tail[: n * FRAME].reshape(n, FRAME) ** 2).mean(axis=1))
+    return len(audio) - search + int(rms.argmin()) * FRAME + FRAME // 2
+
+def audio_windows(src: BinaryIO, window_s: float = WINDOW_S, search_s: float = SEARCH_S) -> Iterator[np.ndarray]:
+    """
+    Yields float32 windows of at most `window_s` seconds, each cut at the
+    quietest point near its end so words aren't split. Only one window
+    (plus the carried-over remainder) is ever held in memory. Raises
+    AudioDecodeError once ffmpeg fails, or if the upload holds no audio.
+    """
+    proc, errors, tail = pcm_stream(src)
+    want = int(window_s * SAMPLE_RATE) * 2
+    search = int(search_s * SAMPLE_RATE)
+    carry = np.zeros(0, dtype=np.float32)
+    decoded = False
+    try:
+        while True:
+            raw = proc.stdout.read(want - carry.size * 2)
+            eof = len(raw) < want - carry.size * 2
+            audio = np.concatenate([carry, np.frombuffer(raw[: len(raw) // 2 * 2], np.int16).astype(np.float32) / 32768.0])
+            if eof:
+                proc.stdout.close()
+                _check(proc, errors, tail)
+                if audio.size:
+                    yield audio
+                elif not decoded:
+                    raise AudioDecodeError("no audio in upload")
+                return
+            decoded = True
+            cut = _quietest_cut(audio, search)
+            carry = audio[cut:].copy()
+            yield audio[:cut]
+    finally:
+        proc.stdout.close()
+        proc.wait()
+
+# ─────────────────────────  TRANSCRIBE  ────────────────────────────────
+def transcribe_windows(model, windows: Iterator[np.ndarray], workers: int = TRANSCRIBE_WORKERS) -> Iterator[str]:
+    """
+    Transcribes windows on a thread pool, yielding text in order. At most
+    workers + 1 windows are in flight, which bounds memory for long files.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="whisper") as pool:
+        pending: deque = deque()
+        for w in windows:
+            pending.append(pool.submit(model.transcribe, w, fp16=False))
+            if len(pending) > workers:
+                yield pending.popleft().result()["text"].strip()
+        while pending:
+            yield pending.popleft().result()["text"].strip()
+
+def transcribe_incremental(model, src: BinaryIO, on_text: Callable[[str], None],
+                           min_words: int = INGEST_MIN_WORDS) -> str:
+    """
+    Streams `src` through Whisper and hands finished text to on_text() in
+    pieces of ≥ min_words ending on a sentence boundary, so chunking can
+    start before the whole recording is transcribed. Returns the full text.
+    """
+    t0 = time.perf_counter()
+    done: List[str] = []
+    buf: List[str] = []
+    for text in transcribe_windows(model, audio_windows(src)):
+        if not text:
+            continue
+        done.append(text)
+        buf.append(text)
+        joined = " ".join(buf)
+        if len(joined.split()) >= min_words and joined.rstrip()[-1:] in ".!?":
+            on_text(joined)
+            buf = []
+    if buf:
+        on_text(" ".join(buf))
+    STAGE_SECONDS.observe(time.perf_counter() - t0, stage="transcribe")
+    return " ".join(done)
@@ -0,0 +1,149 @@
+# vector_store.py — pluggable vector backend behind add_many / query_many
+import os, threading
+from typing import Dict, List, Optional
+
+from metrics import external
+from resources import resource
+from shards import DEFAULT_SHARD, SHARD_SECONDS, get_shard_map, sharded
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")   # chroma | segments
+COLLECTION = "thoughts"
+
+class VectorStore:
+    """
+    What algo.py needs from a vector backend. Vectors are compared by
+    cosine; query_many returns Chroma's shape:
+    {"ids": [[...] * N], "distances": [[...] * N]} with distance = 1 − cos.
+    `full` carries the un-reduced embeddings (embed_repr) for backends
+    that can rerank at full precision; others ignore it.
+    """
+
+    def add_many(self, user_id: str, ids: List[str], vectors: List[List[float]], metas: List[Dict],
+                 full: Optional[List[List[float]]] = None) -> None:
+        raise NotImplementedError
+
+    def query_many(self, vectors: List[List[float]], user_id: str, top_k: int = 10,
+                   full: Optional[List[List[float]]] = None) -> Dict:
+        raise NotImplementedError
+
+    def delete_many(self, user_id: str, ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def usage(self) -> Dict:
+        """Cheap size figures for /shards; backends report what they can count."""
+        return {}
+
+# ─────────────────────────────  CHROMA  ────────────────────────────────
+class ChromaStore(VectorStore):
+    """One in-memory collection (lost on restart); "thoughts" unless sharded."""
+
+    def __init__(self, collection: str = COLLECTION):
+        import chromadb
+        # chromadb.Client() in the same process shares one in-memory system,
+        # so this is the same collection seechroma.py sees
+        self.col = chromadb.Client().get_or_create_collection(
+            collection, metadata={"hnsw:space": "cosine"}
+        )
+
+    def add_many(self, user_id, ids, vectors, metas, full=None):
+        if not ids:
+            return
+        # upsert: relink.py re-adds edited nodes under their existing ids
+        self.col.upsert(
+            ids=ids,
+            embeddings=vectors,
+            metadatas=[{**m, "user_id": user_id} for m in metas],
+        )
+
+    def query_many(self, vectors, user_id, top_k=10, full=None):
+        # ONE Chroma call for N query vectors
+        if not vectors or self.col.count() == 0:
+            return {"ids": [[] for _ in vectors], "distances": [[] for _ in vectors]}
+        return self.col.query(
+            query_embeddings=vectors,
+            n_results=min(top_k, self.col.count()),
+            where={"user_id": user_id},
+            include=["distances"],
+        )
+
+    def delete_many(self, user_id, ids):
+        if ids:
+            self.col.delete(ids=list(ids))
+
+    def usage(self):
+        return {"vectors": self.col.count()}
+
+# ────────────────────────────  SHARDED  ────────────────────────────────
+class ShardedStore(VectorStore):
+    """
+    One backend per shard (its own collection / directory), opened on
+    first use. Queries go to the user's shard; writes go to every shard
+    the map lists, i.e. source and target while the user is moving.
+    """
+
+    def __init__(self, open_backend=None):
+        self.open_backend = open_backend or _open_backend
+        self._backends: Dict[str, VectorStore] = {}
+        self._lock = threading.Lock()
+
+    def backend(self, shard: str) -> VectorStore:
+        with self._lock:
+            if shard not in self._backends:
+                self._backends[shard] = self.open_backend(shard)
+            return self._backends[shard]
+
+    def add_many(self, user_id, ids, vectors, metas, full=None):
+        for shard in get_shard_map().write_shards(user_id):
+            with SHARD_SECONDS.time(shard=shard, store="vectors", op="add"):
+                self.backend(shard).add_many(user_id, ids, vectors, metas, full)
+
+    def query_many(self, vectors, user_id, top_k=10, full=None):
+        shard = get_shard_map().read_shard(user_id)
+        with SHARD_SECONDS.time(shard=shard, store="vectors", op="query"):
+            return self.backend(shard).query_many(vectors, user_id, top_k, full)
+
+    def delete_many(self, user_id, ids):
+        for shard in get_shard_map().write_shards(user_id):
+            with SHARD_SECONDS.time(shard=shard, store="vectors", op="delete"):
+                self.backend(shard).delete_many(user_id, ids)
+
+    def usage(self):
+        with self._lock:
+            opened = dict(self._backends)
+        return {shard: b.usage() for shard, b in opened.items()}
+
+# ─────────────────────────────  BACKEND  ───────────────────────────────
+def _open_backend(shard: str = DEFAULT_SHARD) -> VectorStore:
+    # "default" keeps the pre-sharding collection / directory
+    if VECTOR_BACKEND == "segments":
+        from segment_store import VECTOR_PATH, SegmentStore
+        return SegmentStore(VECTOR_PATH if shard == DEFAULT_SHARD else os.path.join(VECTOR_PATH, f"shard-{shard}"))
+    if VECTOR_BACKEND == "chroma":
+        return ChromaStore(COLLECTION if shard == DEFAULT_SHARD else f"{COLLECTION}_{shard}")
+    raise ValueError(f"unknown VECTOR_BACKEND {VECTOR_BACKEND!r}")
+
+def _open_store() -> VectorStore:
+    return ShardedStore() if sharded() else _open_backend()
+
+STORE = resource("vectors", _open_store, check=lambda s: {"backend": type(s).__name__})
+
+def get_store() -> VectorStore:
+    return STORE.get()
+
+def set_store(store: VectorStore) -> None:
+    """Swap the backend (benchmarks, tests, migrations)."""
+    STORE.set(store)
+
+def add_many(user_id: str, ids: List[str], vectors: List[List[float]], metas: List[Dict],
+             full: Optional[List[List[float]]] = None) -> None:
+    with external(VECTOR_BACKEND, "add"):
+        get_store().add_many(user_id, ids, vectors, metas, full)
+
+def query_many(vectors: List[List[float]], user_id: str, top_k: int = 10,
+               full: Optional[List[List[float]]] = None) -> Dict:
+    with external(VECTOR_BACKEND, "query"):
+        return get_store().query_many(vectors, user_id, top_k, full)
+
+def delete_many(user_id: str, ids: List[str]) -> None:
+    with external(VECTOR_BACKEND, "delete"):
+        get_store().delete_many(user_id, ids)
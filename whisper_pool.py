@@ -0,0 +1,287 @@
+# whisper_pool.py — process pool of pre-warmed Whisper models with micro-batching
+import multiprocessing as mp
+import os, queue, threading, time, uuid
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Deque, Dict, List, Optional
+
+import numpy as np
+
+from metrics import STAGE_SECONDS, collected, counter
+from resources import resource
+
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "tiny")                   # tiny / base / small / …
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", "1"))
+WHISPER_QUEUE_MAX = int(os.getenv("WHISPER_QUEUE_MAX", "64"))          # backpressure past this
+WHISPER_BATCH_WAIT_S = float(os.getenv("WHISPER_BATCH_WAIT_MS", "50")) / 1000
+WHISPER_SHORT_CLIP_S = float(os.getenv("WHISPER_SHORT_CLIP_S", "8"))
+WHISPER_BATCH_MAX_S = float(os.getenv("WHISPER_BATCH_MAX_S", "28"))    # stay inside one 30 s context
+WHISPER_TIMEOUT_S = float(os.getenv("WHISPER_TIMEOUT_S", "300"))       # one batch's inference; past it the pool restarts
+WATCH_S = 1.0
+
+SAMPLE_RATE = 16000
+GAP = np.zeros(SAMPLE_RATE // 2, dtype=np.float32)   # 0.5 s silence between batched clips
+
+class PoolBusy(Exception):
+    pass
+
+class WorkerFailed(RuntimeError):
+    """A worker died or hung with this request in flight; the pool has been rebuilt."""
+
+# ──────────────────────────  WORKER PROCESS  ───────────────────────────
+def _worker_main(model_name: str, req_q, res_q) -> None:
+    import whisper   # only worker processes pay for torch + weights
+
+    model = whisper.load_model(model_name)
+    model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), fp16=False)   # warm kernels
+    res_q.put(("__ready__", os.getpid(), None))
+    while True:
+        item = req_q.get()
+        if item is None:
+            break
+        bid, audio, kw = item
+        try:
+            out = model.transcribe(audio, **kw)
+            segs = [{"start": s["start"], "end": s["end"], "text": s["text"]} for s in out.get("segments", [])]
+            res_q.put((bid, {"text": out["text"], "segments": segs}, None))
+        except Exception as exc:
+            res_q.put((bid, None, repr(exc)))
+
+AUDIO_SECONDS = counter("mindmap_audio_seconds_total", "Seconds of audio transcribed")
+
+# ─────────────────────────────  POOL  ──────────────────────────────────
+class _Request:
+    __slots__ = ("audio", "kw", "future", "queued_at", "sent_at")
+
+    def __init__(self, audio: np.ndarray, kw: Dict):
+        self.audio, self.kw = audio, kw
+        self.future: Future = Future()
+        self.queued_at = time.perf_counter()
+        self.sent_at = 0.0
+
+class WhisperPool:
+    """
+    N worker processes, each holding one warm model. Callers use
+    .transcribe(audio) exactly like a whisper model; short clips that
+    arrive together are concatenated into one inference and split back
+    by segment timestamps.
+
+    A watchdog rebuilds the pool (fresh queues and processes) when a
+    worker exits or a batch runs past WHISPER_TIMEOUT_S: the batches in
+    flight fail with WorkerFailed and their slots are released, queued
+    requests go to the new workers.
+    """
+
+    def __init__(self, model_name: str = WHISPER_MODEL, workers: int = WHISPER_WORKERS,
+                 queue_max: int = WHISPER_QUEUE_MAX):
+        self.model_name, self.workers = model_name, workers
+        self._inbox: "queue.Queue[_Request]" = queue.Queue(maxsize=queue_max)
+        self._slots = threading.Semaphore(workers * 2)   # batches in flight across processes
+        self._batches: Dict[str, List] = {}
+        self._procs: List[mp.Process] = []
+        self._ready = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._latency: Deque[float] = deque(maxlen=2000)
+        self.stats = {"requests": 0, "batches": 0, "batched_clips": 0, "rejected": 0, "errors": 0, "restarts": 0}
+
+    # ── lifecycle ──────────────────────────────────────────────────
+    def start(self) -> "WhisperPool":
+        if self._procs:
+            return self
+        self._spawn()
+        threading.Thread(target=self._dispatch, name="whisper-dispatch", daemon=True).start()
+        threading.Thread(target=self._collect, name="whisper-collect", daemon=True).start()
+        threading.Thread(target=self._watch, name="whisper-watch", daemon=True).start()
+        return self
+
+    def _spawn(self) -> None:
+        ctx = mp.get_context("spawn")
+        self._req_q, self._res_q = ctx.Queue(), ctx.Queue()
+        self._ready = 0
+        self._procs = []
+        for _ in range(self.workers):
+            p = ctx.Process(target=_worker_main, args=(self.model_name, self._req_q, self._res_q), daemon=True)
+            p.start()
+            self._procs.append(p)
+
+    def close(self) -> None:
+        self._stop.set()
+        for _ in self._procs:
+            self._req_q.put(None)
+        for p in self._procs:
+            p.join(timeout=5)
+        self._procs = []
+
+    # ── watchdog: dead or hung workers ─────────────────────────────
+    def _watch(self) -> None:
+        while not self._stop.wait(WATCH_S):
+            dead = [p for p in self._procs if not p.is_alive()]
+            now = time.perf_counter()
+            with self._lock:
+                hung = any(now - members[0][0].sent_at > WHISPER_TIMEOUT_S for members in self._batches.values())
+            if dead:
+                self._rebuild(f"whisper worker pid {dead[0].pid} exited with code {dead[0].exitcode}")
+            elif hung:
+                self._rebuild(f"whisper batch ran longer than {WHISPER_TIMEOUT_S:.0f}s")
+
+    def _rebuild(self, reason: str) -> None:
+        with self._lock:
+            old, self._procs = self._procs, []
+            inflight, self._batches = self._batches, {}
+            self._spawn()
+            self.stats["restarts"] += 1
+        for p in old:
+            p.kill()
+        for members in inflight.values():
+            self._slots.release()
+            for req, _ in members:
+                self.stats["errors"] += 1
+                req.future.set_exception(WorkerFailed(reason))
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._procs) and self._ready >= len(self._procs)
+
+    # ── client side ────────────────────────────────────────────────
+    def submit(self, audio: np.ndarray, **kw) -> Future:
+        req = _Request(np.asarray(audio, dtype=np.float32), kw)
+        try:
+            self._inbox.put_nowait(req)
+        except queue.Full:
+            self.stats["rejected"] += 1
+            raise PoolBusy(f"transcription queue full ({self._inbox.maxsize})")
+        self.stats["requests"] += 1
+        return req.future
+
+    def transcribe(self, audio: np.ndarray, timeout: Optional[float] = None, **kw) -> Dict:
+        # queueing + inference; the watchdog fails a stuck batch well before this unless the queue is long
+        timeout = timeout if timeout is not None else 2 * WHISPER_TIMEOUT_S
+        try:
+            return self.submit(audio, **kw).result(timeout)
+        except FutureTimeout:
+            raise PoolBusy(f"no transcription after {timeout:.0f}s") from None
+
+    # ── dispatcher: micro-batch short clips ────────────────────────
+    @staticmethod
+    def _seconds(req: _Request) -> float:
+        return len(req.audio) / SAMPLE_RATE
+
+    def _gather(self, first: _Request) -> List[_Request]:
+        batch, total = [first], self._seconds(first)
+        if total >= WHISPER_SHORT_CLIP_S:
+            return batch
+        deadline = time.perf_counter() + WHISPER_BATCH_WAIT_S
+        while total < WHISPER_BATCH_MAX_S:
+            left = deadline - time.perf_counter()
+            if left <= 0:
+                break
+            try:
+                nxt = self._inbox.get(timeout=left)
+            except queue.Empty:
+                break
+            if (self._seconds(nxt) >= WHISPER_SHORT_CLIP_S or nxt.kw != first.kw
+                    or total + self._seconds(nxt) > WHISPER_BATCH_MAX_S):
+                self._send([nxt])   # doesn't fit this batch; ship it on its own
+                continue
+            batch.append(nxt)
+            total += self._seconds(nxt)
+        return batch
+
+    def _send(self, batch: List[_Request]) -> None:
+        self._slots.acquire()
+        bid = uuid.uuid4().hex
+        offsets, parts, t = [], [], 0.0
+        for r in batch:
+            offsets.append((t, t + self._seconds(r)))
+            parts += [r.audio, GAP]
+            t += self._seconds(r) + len(GAP) / SAMPLE_RATE
+            r.sent_at = time.perf_counter()
+        audio = batch[0].audio if len(batch) == 1 else np.concatenate(parts[:-1])
+        try:
+            with self._lock:
+                self._batches[bid] = list(zip(batch, offsets))
+                self._req_q.put((bid, audio, {"fp16": False, **batch[0].kw}))
+        except Exception as exc:
+            with self._lock:
+                self._batches.pop(bid, None)
+            self._slots.release()
+            for r in batch:
+                r.future.set_exception(exc)
+            return
+        self.stats["batches"] += 1
+        if len(batch) > 1:
+            self.stats["batched_clips"] += len(batch)
+
+    def _dispatch(self) -> None:
+        while True:
+            self._send(self._gather(self._inbox.get()))
+
+    # ── collector: resolve futures, record latency ─────────────────
+    def _collect(self) -> None:
+        while not self._stop.is_set():
+            res_q = self._res_q   # replaced by _rebuild
+            try:
+                bid, out, err = res_q.get(timeout=WATCH_S)
+            except queue.Empty:
+                continue
+            if bid == "__ready__":
+                if res_q is self._res_q:
+                    self._ready += 1
+                continue
+            with self._lock:
+                members = self._batches.pop(bid, None)
+            if members is None:
+                continue   # failed by a rebuild; its slot is already back
+            try:
+                self._resolve(members, out, err)
+            finally:
+                self._slots.release()
+
+    def _resolve(self, members: List, out: Dict, err: str) -> None:
+        now = time.perf_counter()
+        for req, (start, end) in members:
+            if err:
+                self.stats["errors"] += 1
+                req.future.set_exception(RuntimeError(err))
+                continue
+            if len(members) == 1:
+                res = out
+            else:
+                segs = [{**s, "start": s["start"] - start, "end": s["end"] - start}
+                        for s in out["segments"] if start <= (s["start"] + s["end"]) / 2 < end + 0.25]
+                res = {"text": "".join(s["text"] for s in segs), "segments": segs}
+            self._latency.append(now - req.queued_at)
+            STAGE_SECONDS.observe(now - req.queued_at, stage="whisper")
+            STAGE_SECONDS.observe(req.sent_at - req.queued_at, stage="whisper_queue")
+            AUDIO_SECONDS.inc(self._seconds(req))
+            res["latency"] = {"queued_ms": (req.sent_at - req.queued_at) * 1e3,
+                              "total_ms": (now - req.queued_at) * 1e3}
+            req.future.set_result(res)
+
+    def latency_stats(self) -> Dict:
+        lat = sorted(self._latency)
+        if not lat:
+            return {"count": 0}
+        pick = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] * 1e3
+        return {"count": len(lat), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+                "queue_depth": self._inbox.qsize(), "ready_workers": self._ready, **self.stats}
+
+def _pool_health(pool: WhisperPool) -> Dict:
+    # workers load their model after spawn; "loading" until all of them report in
+    return {"state": "ready" if pool.ready else "loading", "ready_workers": pool._ready, "workers": pool.workers}
+
+POOL = resource("whisper", lambda: WhisperPool().start(), close=lambda p: p.close(), check=_pool_health)
+
+def get_pool() -> WhisperPool:
+    return POOL.get()
+
+def _pool_stats():
+    pool = POOL.peek()
+    if pool is None:
+        return []
+    return [((k,), v) for k, v in {**pool.stats, "queue_depth": pool._inbox.qsize(),
+                                   "ready_workers": pool._ready}.items()]
+
+collected("mindmap_whisper_pool", "Whisper pool counters, queue depth and ready workers",
+          _pool_stats, labels=["stat"])